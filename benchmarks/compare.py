@@ -0,0 +1,64 @@
+import argparse
+import json
+import sys
+from typing import Any, Dict, List
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], threshold: float = 0.1) -> List[Dict[str, Any]]:
+    # Only measurements present in both runs are compared; change is positive when things got better
+    previous = {(record["name"], record["metric"]): record for record in baseline["results"]}
+    rows = []
+    for record in current["results"]:
+        before = previous.get((record["name"], record["metric"]))
+        if before is None or not before["value"]:
+            continue
+        
+        ratio = record["value"] / before["value"]
+        change = ratio - 1 if record["better"] == "higher" else 1 - ratio
+        rows.append({
+            "name": record["name"],
+            "metric": record["metric"],
+            "before": before["value"],
+            "after": record["value"],
+            "unit": record["unit"],
+            "change": round(change, 4),
+            "regression": change < -threshold
+        })
+    return rows
+
+
+def print_comparison(rows: List[Dict[str, Any]]) -> None:
+    print("\n📊 Compared with baseline:")
+    for row in rows:
+        flag = "❌" if row["regression"] else "  "
+        print(f"{flag} {row['name']:<32} {row['metric']:<18} {row['before']:>12.3f} -> {row['after']:>12.3f} "
+              f"{row['unit']:<11} {row['change']:+.1%}")
+    regressions = sum(row["regression"] for row in rows)
+    print(f"\n{regressions} regression(s) in {len(rows)} measurements")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files")
+    parser.add_argument("baseline", help="Results from the earlier commit")
+    parser.add_argument("current", help="Results from the later commit")
+    parser.add_argument("--threshold", type=float, default=0.1,
+                        help="Relative slowdown reported as a regression (default: 0.1)")
+    args = parser.parse_args()
+    
+    try:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        with open(args.current, "r", encoding="utf-8") as f:
+            current = json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"❌ Error: {e}")
+        sys.exit(1)
+    
+    rows = compare(baseline, current, args.threshold)
+    print_comparison(rows)
+    if any(row["regression"] for row in rows):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,286 @@
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List
+import faiss
+import numpy as np
+from smartqa.chunker import Chunk, TextChunker
+from smartqa.embedder import Embedder
+from smartqa.llm import LLMResponseGenerator
+from smartqa.logger import QALogger
+from smartqa.mock_ollama import MockOllama
+from smartqa.pipeline import QAPipeline
+from smartqa.retriever import Retriever
+from .compare import compare, print_comparison
+from .synthetic import SyntheticEmbedder, generate_questions, generate_text
+
+BENCHMARKS = ("chunking", "encode", "index", "qa")
+QUICK = {
+    "paragraphs": [200],
+    "encode_chunks": 64,
+    "batch_sizes": [8, 32],
+    "index_sizes": [1000],
+    "queries": 20,
+    "questions": 5,
+    "repeats": 2
+}
+
+
+class Results:
+
+    def __init__(self):
+        self.records: List[Dict[str, Any]] = []
+    
+    def add(self, name: str, metric: str, value: float, unit: str, better: str) -> None:
+        # better is "higher" or "lower", so a comparison knows which way is a regression
+        self.records.append({"name": name, "metric": metric, "value": round(value, 4), "unit": unit, "better": better})
+        print(f"   {name:<32} {metric:<18} {value:>12.3f} {unit}")
+
+
+def measure(func: Callable[[], Any], repeats: int, warmup: int = 1) -> List[float]:
+    for _ in range(warmup):
+        func()
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def percentile(values: List[float], q: float) -> float:
+    return float(np.percentile(values, q))
+
+
+def bench_chunking(results: Results, paragraphs: List[int], repeats: int, seed: int) -> None:
+    chunker = TextChunker()
+    for num_paragraphs in paragraphs:
+        text = generate_text(num_paragraphs, seed)
+        num_chunks = len(chunker.create_chunks(text))
+        seconds = statistics.median(measure(lambda: chunker.create_chunks(text), repeats))
+        name = f"chunking/paragraphs={num_paragraphs}"
+        results.add(name, "mb_per_sec", len(text) / 1e6 / seconds, "MB/s", "higher")
+        results.add(name, "chunks_per_sec", num_chunks / seconds, "chunks/s", "higher")
+
+
+def bench_encode(results: Results, embedder, num_chunks: int, batch_sizes: List[int], repeats: int, seed: int) -> None:
+    # Each paragraph stands in for one chunk
+    texts = generate_text(num_chunks, seed).split("\n\n")
+    for batch_size in batch_sizes:
+        def encode():
+            for start in range(0, len(texts), batch_size):
+                embedder.encode_texts(texts[start:start + batch_size])
+        
+        seconds = statistics.median(measure(encode, repeats))
+        results.add(f"encode/batch={batch_size}", "chunks_per_sec", len(texts) / seconds, "chunks/s", "higher")
+
+
+def bench_parallel_encode(results: Results, model_name: str, num_chunks: int, workers: List[int], batch_size: int,
+                          repeats: int, seed: int) -> None:
+    # The whole set goes to encode_texts at once, as an ingest batch does, and the pool splits it
+    texts = generate_text(num_chunks, seed).split("\n\n")
+    for count in workers:
+        with Embedder(model_name, workers=count, batch_size=batch_size) as embedder:
+            seconds = statistics.median(measure(lambda: embedder.encode_texts(texts), repeats))
+        results.add(f"encode/workers={count}/batch={batch_size}", "chunks_per_sec", len(texts) / seconds, "chunks/s",
+                    "higher")
+
+
+def bench_index(results: Results, index_types: List[str], sizes: List[int], num_queries: int, k: int,
+                seed: int) -> None:
+    embedder = SyntheticEmbedder()
+    texts = generate_text(max(sizes), seed, min_sentences=3).split("\n\n")
+    chunks = [Chunk(f"chunk_{i:07d}", text) for i, text in enumerate(texts)]
+    queries = generate_questions(num_queries, seed)
+    # Vectors are computed up front so the timings below only cover the retriever
+    embedder.encode_texts(texts + queries)
+    
+    for index_type in index_types:
+        for size in sizes:
+            retriever = Retriever(embedder, index_type=index_type, train_size=size)
+            start = time.perf_counter()
+            retriever.add_chunks(chunks[:size])
+            retriever.build_index()
+            add_seconds = time.perf_counter() - start
+            
+            retriever.search(queries[0], k)
+            latencies = []
+            for query in queries:
+                start = time.perf_counter()
+                retriever.search(query, k)
+                latencies.append((time.perf_counter() - start) * 1000)
+            
+            start = time.perf_counter()
+            retriever.search_batch(queries, k)
+            batch_seconds = time.perf_counter() - start
+            
+            name = f"index/{index_type}/size={size}"
+            results.add(name, "add_chunks_per_sec", size / add_seconds, "chunks/s", "higher")
+            results.add(name, "search_p50_ms", percentile(latencies, 50), "ms", "lower")
+            results.add(name, "search_p95_ms", percentile(latencies, 95), "ms", "lower")
+            results.add(name, "batch_queries_per_sec", len(queries) / batch_seconds, "queries/s", "higher")
+
+
+def bench_qa(results: Results, embedder, num_paragraphs: int, num_questions: int, delay_ms: float,
+             token_delay_ms: float, concurrency: int, seed: int) -> None:
+    questions = generate_questions(num_questions, seed)
+    with MockOllama(prompt_delay_ms=delay_ms, token_delay_ms=token_delay_ms) as server, \
+            tempfile.TemporaryDirectory() as tmp:
+        retriever = Retriever(embedder)
+        retriever.add_chunks(TextChunker().create_chunks(generate_text(num_paragraphs, seed)))
+        llm = LLMResponseGenerator(base_url=server.url, logger=QALogger(os.path.join(tmp, "history.jsonl")),
+                                   pool_size=concurrency, max_retries=0)
+        pipeline = QAPipeline(retriever, llm, concurrency=concurrency)
+        
+        with llm:
+            answer = pipeline.answer(questions[0])["response"]["answer"]
+            if answer.startswith("Error"):
+                raise RuntimeError(f"The mock Ollama server failed: {answer}")
+            
+            latencies = []
+            for question in questions:
+                start = time.perf_counter()
+                pipeline.answer(question)
+                latencies.append((time.perf_counter() - start) * 1000)
+            
+            start = time.perf_counter()
+            asyncio.run(pipeline.answer_many(questions))
+            batch_seconds = time.perf_counter() - start
+    
+    # The mock's delays are part of the name, so the overhead on top of them is visible
+    name = f"qa/llm_delay={delay_ms:g}ms"
+    if token_delay_ms:
+        name += f"/token_delay={token_delay_ms:g}ms"
+    results.add(name, "answer_p50_ms", percentile(latencies, 50), "ms", "lower")
+    results.add(name, "answer_p95_ms", percentile(latencies, 95), "ms", "lower")
+    results.add(f"{name}/concurrency={concurrency}", "questions_per_sec", len(questions) / batch_seconds,
+                "questions/s", "higher")
+
+
+def environment() -> Dict[str, Any]:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                check=True).stdout.strip()
+        dirty = bool(subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True,
+                                    text=True, check=True).stdout.strip())
+    except (OSError, subprocess.CalledProcessError):
+        commit, dirty = None, None
+    
+    return {
+        "commit": commit,
+        "dirty": dirty,
+        "timestamp": datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+        "faiss": faiss.__version__
+    }
+
+
+def parse_ints(value: str) -> List[int]:
+    return [int(part) for part in value.split(",") if part]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark chunking, embedding, indexing and end-to-end QA",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  python -m benchmarks.run --quick
+  python -m benchmarks.run --only index --index-sizes 10000,100000 --output after.json
+  python -m benchmarks.run --compare before.json
+        """
+    )
+    parser.add_argument("--only", help=f"Comma-separated benchmarks to run ({', '.join(BENCHMARKS)})")
+    parser.add_argument("--quick", action="store_true", help="Small sizes, for a smoke run")
+    parser.add_argument("--output", default="benchmark_results.json", help="Where to write the JSON results")
+    parser.add_argument("--compare", help="Baseline results to compare against")
+    parser.add_argument("--threshold", type=float, default=0.1,
+                        help="Relative slowdown reported as a regression (default: 0.1)")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for the synthetic corpus")
+    parser.add_argument("--repeats", type=int, default=5, help="Timed runs per throughput measurement")
+    parser.add_argument("--paragraphs", type=parse_ints, default=[1000, 10000],
+                        help="Corpus sizes for the chunking benchmark, in paragraphs")
+    parser.add_argument("--model", help="Embedding model (default: EMBEDDING_MODEL)")
+    parser.add_argument("--synthetic-embeddings", action="store_true",
+                        help="Use hash-based vectors instead of the model for QA, and skip the encode benchmark")
+    parser.add_argument("--encode-chunks", type=int, default=512, help="Chunks encoded per batch size")
+    parser.add_argument("--batch-sizes", type=parse_ints, default=[1, 8, 32, 128], help="Encode batch sizes")
+    parser.add_argument("--embedding-workers", type=parse_ints, default=[],
+                        help="Worker process counts to compare for parallel encoding, e.g. 1,2,4")
+    parser.add_argument("--index-types", default="flat,ivf,hnsw,ivfpq", help="FAISS index types to compare")
+    parser.add_argument("--index-sizes", type=parse_ints, default=[1000, 10000, 50000],
+                        help="Index sizes, in chunks")
+    parser.add_argument("--queries", type=int, default=100, help="Queries per index search measurement")
+    parser.add_argument("--questions", type=int, default=20, help="Questions for the end-to-end benchmark")
+    parser.add_argument("--llm-delay-ms", type=float, default=20.0,
+                        help="Time to the first token from the mock Ollama server")
+    parser.add_argument("--llm-token-delay-ms", type=float, default=0.0,
+                        help="Time per generated token from the mock Ollama server")
+    parser.add_argument("--concurrency", type=int, default=4, help="Concurrent questions in the batch QA run")
+    
+    args = parser.parse_args()
+    if args.quick:
+        for option, value in QUICK.items():
+            setattr(args, option, value)
+    
+    selected = args.only.split(",") if args.only else list(BENCHMARKS)
+    unknown = [name for name in selected if name not in BENCHMARKS]
+    if unknown:
+        print(f"❌ Error: Unknown benchmark(s) {', '.join(unknown)}, expected {', '.join(BENCHMARKS)}")
+        sys.exit(1)
+    if args.synthetic_embeddings and "encode" in selected:
+        selected.remove("encode")
+    
+    embedder = None
+    if {"encode", "qa"} & set(selected):
+        if args.synthetic_embeddings:
+            embedder = SyntheticEmbedder()
+        else:
+            embedder = Embedder(args.model)
+            embedder.warm_up()
+    
+    results = Results()
+    print("⏱️  Running benchmarks...")
+    if "chunking" in selected:
+        bench_chunking(results, args.paragraphs, args.repeats, args.seed)
+    if "encode" in selected:
+        bench_encode(results, embedder, args.encode_chunks, args.batch_sizes, args.repeats, args.seed)
+        if args.embedding_workers:
+            bench_parallel_encode(results, embedder.model_name, args.encode_chunks, args.embedding_workers,
+                                  max(args.batch_sizes), args.repeats, args.seed)
+    if "index" in selected:
+        bench_index(results, args.index_types.split(","), args.index_sizes, args.queries, 5, args.seed)
+    if "qa" in selected:
+        bench_qa(results, embedder, args.paragraphs[0], args.questions, args.llm_delay_ms, args.llm_token_delay_ms,
+                 args.concurrency, args.seed)
+    
+    config = {key: value for key, value in vars(args).items() if key not in ("output", "compare", "threshold")}
+    if embedder is not None:
+        config["model"] = embedder.model_name
+    report = {"environment": environment(), "config": config, "results": results.records}
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"💾 Results saved to: {args.output}")
+    
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        rows = compare(baseline, report, args.threshold)
+        print_comparison(rows)
+        if any(row["regression"] for row in rows):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
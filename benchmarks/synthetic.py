@@ -0,0 +1,75 @@
+import hashlib
+import random
+from typing import Dict, List
+import numpy as np
+
+TOPICS = [
+    "machine learning", "neural networks", "vector search", "information retrieval", "language models",
+    "data pipelines", "distributed systems", "query latency", "index compression", "document ranking"
+]
+VERBS = ["improves", "reduces", "depends on", "replaces", "measures", "combines", "limits", "speeds up"]
+NOUNS = [
+    "throughput", "recall", "memory use", "training data", "batch size", "the cache", "tail latency",
+    "the embedding model", "the inverted index", "each shard", "the scheduler", "query volume"
+]
+QUALIFIERS = [
+    "in most deployments", "under heavy load", "for long documents", "on CPU-only nodes", "after warm up",
+    "when the corpus grows", "with a small budget", "at the cost of accuracy"
+]
+
+
+def generate_sentence(rng: random.Random) -> str:
+    return (f"{rng.choice(TOPICS).capitalize()} {rng.choice(VERBS)} {rng.choice(NOUNS)} "
+            f"{rng.choice(QUALIFIERS)}.")
+
+
+def generate_text(num_paragraphs: int, seed: int = 0, min_sentences: int = 2, max_sentences: int = 12) -> str:
+    # Paragraph lengths vary so the chunker exercises both merging and sentence splitting
+    rng = random.Random(seed)
+    paragraphs = []
+    for _ in range(num_paragraphs):
+        count = rng.randint(min_sentences, max_sentences)
+        paragraphs.append(" ".join(generate_sentence(rng) for _ in range(count)))
+    return "\n\n".join(paragraphs)
+
+
+def generate_questions(num_questions: int, seed: int = 0) -> List[str]:
+    rng = random.Random(seed + 1)
+    return [f"How does {rng.choice(TOPICS)} affect {rng.choice(NOUNS)}?" for _ in range(num_questions)]
+
+
+class SyntheticEmbedder:
+    # Hash-seeded unit vectors in place of a model, so index benchmarks measure
+    # FAISS and bookkeeping rather than encoding; the same text always gets the same vector
+    
+    def __init__(self, dimension: int = 384):
+        self.model_name = f"synthetic-{dimension}"
+        self.dimension = dimension
+        self.normalize = True
+        # Encoding a text again is a lookup, so vectors can be made before the timed section
+        self._vectors: Dict[str, np.ndarray] = {}
+    
+    @property
+    def cache_namespace(self) -> str:
+        return self.model_name
+    
+    def warm_up(self) -> None:
+        pass
+    
+    def encode_single(self, text):
+        return self.encode_texts([text])
+    
+    def encode_queries(self, queries):
+        return self.encode_texts(queries)
+    
+    def encode_texts(self, texts):
+        embeddings = np.empty((len(texts), self.dimension), dtype=np.float32)
+        for i, text in enumerate(texts):
+            vector = self._vectors.get(text)
+            if vector is None:
+                seed = int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little")
+                vector = np.random.default_rng(seed).standard_normal(self.dimension).astype(np.float32)
+                vector /= np.linalg.norm(vector)
+                self._vectors[text] = vector
+            embeddings[i] = vector
+        return embeddings
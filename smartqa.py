@@ -5,16 +5,26 @@ Usage: python3 smartqa.py --input <txt_file> [--ask "question"]
 """
 
 import argparse
+import asyncio
+import glob
 import sys
 from pathlib import Path
+from typing import TextIO
 from smartqa import TextChunker, Embedder, Retriever, LLMResponseGenerator
-from smartqa.logger import QALogger
+from smartqa import tracing
+from smartqa.answer_cache import create_answer_cache
+from smartqa.corpus import Corpus, document_id, document_root, find_documents
+from smartqa.embedding_cache import create_embedding_cache
+from smartqa.retriever import FUSION_METHODS, INDEX_TYPES
+from smartqa.logger import QALogger, create_logger
+from smartqa.pipeline import QAPipeline
+from smartqa.reranker import DEFAULT_RERANK_MODEL, Reranker, create_reranker
+from smartqa.response_cache import create_response_cache
 
 
-def load_text_file(file_path: str) -> str:
+def open_text_file(file_path: str) -> TextIO:
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            return f.read()
+        return open(file_path, 'r', encoding='utf-8')
     except FileNotFoundError:
         print(f"❌ Error: File '{file_path}' not found")
         sys.exit(1)
@@ -23,28 +33,171 @@ def load_text_file(file_path: str) -> str:
         sys.exit(1)
 
 
-def setup_qa_system(text: str):
+@tracing.traced
+def setup_qa_system(source: TextIO, index_dir: str = None, input_file: str = "unknown", cache_dir: str = None,
+                    chunker: TextChunker = None, batch_size: int = 256, index_options: dict = None,
+                    embedding_workers: int = None):
     print("🔧 Setting up QA system...")
-    
-    print("📄 Dividing text into chunks...")
-    chunker = TextChunker()
-    chunks = chunker.create_chunks(text)
-    print(f"   ✅ Created {len(chunks)} chunks")
+    chunker = chunker or TextChunker()
     
     print("🔢 Setting up embeddings and search...")
-    embedder = Embedder()
-    retriever = Retriever(embedder)
-    retriever.add_chunks(chunks)
+    embedder = Embedder(workers=embedding_workers)
+    cache = create_embedding_cache(embedder, cache_dir)
+    retriever = Retriever(embedder, cache, **(index_options or {}))
+    
+    print("📄 Streaming chunks into the index...")
+    try:
+        total = retriever.add_chunks_stream(chunker.iter_chunks(source), batch_size)
+    except UnicodeDecodeError as e:
+        print(f"❌ Error reading file: {e}")
+        sys.exit(1)
+    finally:
+        # Questions are encoded in-process, so the workers aren't needed after ingestion
+        embedder.close()
+    print(f"   ✅ Created {total} chunks")
+    print_ingestion_stages()
     print("   ✅ System configured")
     
+    if cache is not None:
+        cache_stats = cache.get_stats()
+        print(f"   ✅ Embedding cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses")
+    
+    if index_dir and total:
+        retriever.save(index_dir, {"chunker": chunker.get_config(), "input_file": input_file})
+        print(f"💾 Index saved to: {index_dir}")
+    
+    return retriever
+
+
+@tracing.traced
+def setup_corpus(paths: list, root: Path = None, index_dir: str = None, input_file: str = "unknown", cache_dir: str = None,
+                 chunker: TextChunker = None, batch_size: int = 256, index_options: dict = None,
+                 embedding_workers: int = None):
+    print(f"🔧 Setting up QA system for {len(paths)} documents...")
+    embedder = Embedder(workers=embedding_workers)
+    cache = create_embedding_cache(embedder, cache_dir)
+    corpus = Corpus(embedder, cache, chunker, index_options)
+    
+    for path in paths:
+        doc_id = document_id(path, root)
+        with open_text_file(str(path)) as source:
+            try:
+                total = corpus.add_document(doc_id, source, batch_size, str(path))
+            except UnicodeDecodeError as e:
+                print(f"❌ Error reading file '{path}': {e}")
+                sys.exit(1)
+            except ValueError as e:
+                print(f"❌ Error: {e}")
+                sys.exit(1)
+        print(f"   ✅ {doc_id}: {total} chunks")
+    embedder.close()
+    print_ingestion_stages()
+    
+    if cache is not None:
+        cache_stats = cache.get_stats()
+        print(f"   ✅ Embedding cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses")
+    
+    if index_dir and corpus.document_ids:
+        corpus.save(index_dir, {"input_file": input_file})
+        print(f"💾 Corpus index saved to: {index_dir}")
+    
+    return corpus
+
+
+def print_ingestion_stages():
+    # The ingestion functions run in their own trace, like a question does
+    spans = tracing.current_trace().snapshot()
+    if spans:
+        print("   🧭 Stages: " + ", ".join(f"{stage} {spans[stage]}ms" for stage in tracing.STAGES if stage in spans))
+
+
+def load_qa_system(index_dir: str, nprobe: int = None, ef_search: int = None, min_score: float = None,
+                   fusion: str = None, lexical_weight: float = None):
+    print(f"📦 Loading saved index: {index_dir}")
+    embedder = Embedder()
+    index_class = Corpus if Corpus.index_exists(index_dir) else Retriever
+    try:
+        retriever = index_class.load(index_dir, embedder, nprobe=nprobe, ef_search=ef_search, min_score=min_score,
+                                     fusion=fusion, lexical_weight=lexical_weight)
+    except Exception as e:
+        print(f"❌ Error loading index: {e}")
+        sys.exit(1)
+    if isinstance(retriever, Corpus):
+        print(f"   ✅ Loaded {len(retriever.document_ids)} documents")
+    print(f"   ✅ Loaded {len(retriever.chunks)} chunks")
+    
+    return retriever
+
+
+@tracing.traced
+def update_qa_system(index_dir: str, input_path: str, cache_dir: str = None, batch_size: int = 256,
+                     nprobe: int = None, ef_search: int = None, min_score: float = None, fusion: str = None,
+                     lexical_weight: float = None, embedding_workers: int = None):
+    print(f"🔄 Updating saved index {index_dir} from {input_path}")
+    embedder = Embedder(workers=embedding_workers)
+    cache = create_embedding_cache(embedder, cache_dir)
+    is_corpus = Corpus.index_exists(index_dir)
+    meta = (Corpus if is_corpus else Retriever).load_metadata(index_dir)
+    try:
+        retriever = (Corpus if is_corpus else Retriever).load(index_dir, embedder, cache, nprobe, ef_search, min_score,
+                                                              fusion, lexical_weight)
+    except Exception as e:
+        print(f"❌ Error loading index: {e}")
+        sys.exit(1)
+    
+    # Chunk the new text exactly like the indexed text so unchanged chunks hash the same
+    chunker = TextChunker(**meta["chunker"]) if meta.get("chunker") else TextChunker()
+    totals = {"added": 0, "removed": 0, "unchanged": 0}
+    
+    if is_corpus:
+        root = document_root(input_path)
+        seen = set()
+        for path in find_documents(input_path):
+            doc_id = document_id(path, root)
+            seen.add(doc_id)
+            with open_text_file(str(path)) as source:
+                stats = retriever.update_document(doc_id, source, batch_size, str(path))
+            for key in totals:
+                totals[key] += stats[key]
+        for doc_id in [doc_id for doc_id in retriever.document_ids if doc_id not in seen]:
+            totals["removed"] += retriever.remove_document(doc_id)
+            print(f"   🗑️  Removed document {doc_id}")
+    else:
+        with open_text_file(input_path) as source:
+            totals = retriever.update_chunks(chunker.iter_chunks(source), batch_size)
+    
+    embedder.close()
+    print(f"   ✅ {totals['added']} chunks embedded, {totals['removed']} removed, {totals['unchanged']} unchanged")
+    print_ingestion_stages()
+    retriever.save(index_dir, {key: value for key, value in meta.items() if key in ("chunker", "input_file")})
+    print(f"💾 Index saved to: {index_dir}")
+    
     return retriever
 
 
-def ask_question(retriever, question: str, input_file: str = "unknown"):
+def print_index_report(retriever):
+    print("\n📈 Recall vs latency against the exact index (k=10):")
+    for row in retriever.recall_report():
+        print(f"   {row['index_type']:<6} recall@10={row['recall_at_k']:.3f}  "
+              f"query={row['avg_query_ms']:.3f}ms  build={row['build_ms']:.0f}ms")
+
+
+@tracing.traced
+def ask_question(retriever, question: str, input_file: str = "unknown", search_results=None, stream: bool = False,
+                 llm: LLMResponseGenerator = None, reranker: Reranker = None):
     print(f"\n❓ Question: {question}")
     print("🔍 Searching for relevant information...")
     
-    search_results = retriever.search(question, k=3)
+    query_embedding = None
+    if search_results is None:
+        # Kept so the answer cache can match near-identical questions
+        query_embedding = retriever.embed_queries([question])[0]
+        k = max(3, reranker.candidates) if reranker else 3
+        search_results = retriever.search_vectors(query_embedding[None, :], k=k, queries=[question])[0]
+        if reranker and search_results:
+            # Fewer, better chunks keep the prompt short
+            print(f"   🎯 Reranking {len(search_results)} candidates...")
+            search_results = reranker.rerank(question, search_results, 3)
     
     if not search_results:
         print("❌ No relevant information found to answer your question.")
@@ -53,27 +206,92 @@ def ask_question(retriever, question: str, input_file: str = "unknown"):
     print(f"   ✅ Found {len(search_results)} relevant chunks")
     
     print("🤖 Generating response...")
-    llm = LLMResponseGenerator()
-    response = llm.generate_response(question, search_results, input_file)
+    llm = llm or LLMResponseGenerator()
+    
+    if stream:
+        print_answer_header()
+        streamed = []
+        
+        def on_token(token):
+            streamed.append(token)
+            print(token, end="", flush=True)
+        
+        response = llm.generate_response(question, search_results, input_file, on_token, retriever.fingerprint,
+                                         query_embedding)
+        print()
+        # Errors and the "no information" fallback replace what was streamed
+        if response["answer"] != "".join(streamed).strip():
+            print(response["answer"])
+    else:
+        response = llm.generate_response(question, search_results, input_file, None, retriever.fingerprint,
+                                         query_embedding)
+        
+        print_answer_header()
+        print(response["answer"])
     
+    print_response_details(response)
+
+
+def print_answer_header():
     print("\n" + "="*60)
     print("📝 ANSWER:")
     print("="*60)
-    print(response["answer"])
+
+
+def print_response_details(response: dict):
+    if response.get("cache_hit") or response.get("response_cache_hit"):
+        print("\n♻️  Answer served from cache")
     print(f"\n🔢 Tokens used: {response['tokens_used']}")
+    if response.get("context_tokens") is not None:
+        print(f"📏 Context size: ~{response['context_tokens']} tokens")
+    if response.get("ttft_ms") is not None:
+        print(f"⚡ First token: {response['ttft_ms']}ms")
     print(f"⏱️  Response time: {response.get('latency_ms', 0)}ms")
+    if response.get("spans"):
+        print("🧭 Stages: " + ", ".join(f"{stage} {ms}ms" for stage, ms in response["spans"].items()))
     
     if response["citations"]:
         print(f"\n📚 Sources ({len(response['citations'])}):")
         for i, citation in enumerate(response["citations"], 1):
-            print(f"   {i}. Chunk {citation['chunk_id']}: {citation['text']}")
+            source = f"{citation['doc_id']} / " if citation.get("doc_id") else ""
+            print(f"   {i}. {source}Chunk {citation['chunk_id']}: {citation['text']}")
             print(f"      Relevance: {citation['relevance_score']}")
 
 
-def interactive_mode(retriever, input_file: str):
+def load_questions(file_path: str) -> list:
+    try:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            return [line.strip() for line in f if line.strip()]
+    except FileNotFoundError:
+        print(f"❌ Error: File '{file_path}' not found")
+        sys.exit(1)
+
+
+def answer_questions(retriever, questions: list, input_file: str, llm: LLMResponseGenerator, concurrency: int = 4,
+                     reranker: Reranker = None):
+    print(f"\n📋 Answering {len(questions)} questions ({concurrency} at a time)...")
+    pipeline = QAPipeline(retriever, llm, k=3, concurrency=concurrency, reranker=reranker)
+    
+    def on_result(index, result):
+        # Printed as each answer completes, so the order can differ from the file
+        print(f"\n❓ Question {index + 1}/{len(questions)}: {result['question']}")
+        if not result["search_results"]:
+            print("❌ No relevant information found to answer your question.")
+            return
+        print_answer_header()
+        print(result["response"]["answer"])
+        print_response_details(result["response"])
+    
+    asyncio.run(pipeline.answer_many(questions, input_file, on_result))
+
+
+def interactive_mode(retriever, input_file: str, stream: bool = False, llm: LLMResponseGenerator = None,
+                     reranker: Reranker = None):
     print("\n" + "="*60)
     print("🎯 INTERACTIVE MODE")
     print("="*60)
+    # Pay the first-encode cost now rather than on the first question
+    retriever.embedder.warm_up()
     print("Type your questions (or 'exit' to quit, 'stats' for statistics):")
     
     while True:
@@ -84,15 +302,16 @@ def interactive_mode(retriever, input_file: str):
                 print("👋 Goodbye!")
                 break
             elif question.lower() == 'stats':
-                logger = QALogger()
+                # The generator's logger flushes its buffered entries before reading
+                logger = llm.logger if llm else QALogger()
                 logger.print_stats()
                 continue
             
             if not question:
                 continue
             
-            ask_question(retriever, question, input_file)
-            
+            ask_question(retriever, question, input_file, stream=stream, llm=llm, reranker=reranker)
+        
         except KeyboardInterrupt:
             print("\n👋 Goodbye!")
             break
@@ -109,13 +328,138 @@ def main():
 Usage examples:
   python3 smartqa.py --input document.txt --ask "What is AI?"
   python3 smartqa.py --input document.txt
+  python3 smartqa.py --input document.txt --index ./document_index
+  python3 smartqa.py --index ./document_index --ask "What is AI?"
+  python3 smartqa.py --input document.txt --questions questions.txt --concurrency 8
+  python3 smartqa.py --input ./docs --index ./docs_index
+  python3 smartqa.py --index ./docs_index --document guide.txt --ask "How do I install it?"
+  python3 smartqa.py --input ./docs --index ./docs_index --update
+  python3 smartqa.py --input document.txt --ask "What is AI?" --stream
+  python3 smartqa.py --input document.txt --ask "What is AI?" --rerank
+  python3 smartqa.py --input document.txt --hybrid rrf --ask "What does ERR_404 mean?"
   python3 smartqa.py --stats
         """
     )
     
     parser.add_argument(
         "--input", 
-        help="Text file to process (required unless --stats)"
+        help="Text file, directory of .txt files or glob pattern to process (required unless --stats or a saved --index)"
+    )
+    
+    parser.add_argument(
+        "--document",
+        action="append",
+        help="Only search this document of a multi-document corpus (repeatable)"
+    )
+    
+    parser.add_argument(
+        "--index",
+        help="Directory of a saved index; loaded if present, otherwise built from --input and saved there"
+    )
+    
+    parser.add_argument(
+        "--update",
+        action="store_true",
+        help="Sync an existing --index with --input, embedding only chunks whose text changed"
+    )
+    
+    parser.add_argument(
+        "--chunk-size",
+        type=int,
+        default=1000,
+        help="Maximum chunk size in characters (default: 1000)"
+    )
+    
+    parser.add_argument(
+        "--chunk-overlap",
+        type=int,
+        default=100,
+        help="Characters shared between consecutive chunks of a split paragraph (default: 100)"
+    )
+    
+    parser.add_argument(
+        "--min-chunk-size",
+        type=int,
+        default=0,
+        help="Merge paragraphs shorter than this into their neighbours (default: 0, disabled)"
+    )
+    
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=256,
+        help="Chunks embedded and indexed per batch while streaming the input (default: 256)"
+    )
+    
+    parser.add_argument(
+        "--embedding-workers",
+        type=int,
+        help="Processes that embed chunks in parallel while indexing (default: $EMBEDDING_WORKERS or 1)"
+    )
+    
+    parser.add_argument(
+        "--index-type",
+        choices=INDEX_TYPES,
+        help="FAISS index: exact flat scan, IVF-Flat, HNSW, compressed IVF-PQ or auto by corpus size (default: $FAISS_INDEX_TYPE or flat)"
+    )
+    
+    parser.add_argument(
+        "--nprobe",
+        type=int,
+        help="IVF lists scanned per query; higher is slower but more accurate (default: $FAISS_NPROBE or 16)"
+    )
+    
+    parser.add_argument(
+        "--ef-search",
+        type=int,
+        help="HNSW candidate list size per query (default: $FAISS_EF_SEARCH or 64)"
+    )
+    
+    parser.add_argument(
+        "--min-score",
+        type=float,
+        help="Drop chunks below this cosine similarity before calling the LLM (default: $MIN_RELEVANCE_SCORE, disabled if unset)"
+    )
+    
+    parser.add_argument(
+        "--hybrid",
+        choices=FUSION_METHODS,
+        help="Fuse vector search with BM25 keyword search by reciprocal rank or weighted score (default: $HYBRID_FUSION, disabled if unset)"
+    )
+    
+    parser.add_argument(
+        "--lexical-weight",
+        type=float,
+        help="Share of the BM25 score in weighted fusion, between 0 and 1 (default: $HYBRID_LEXICAL_WEIGHT or 0.3)"
+    )
+    
+    parser.add_argument(
+        "--rerank",
+        nargs="?",
+        const=DEFAULT_RERANK_MODEL,
+        help=f"Rescore retrieved candidates with a cross-encoder before answering (default model: {DEFAULT_RERANK_MODEL}, or $RERANK_MODEL)"
+    )
+    
+    parser.add_argument(
+        "--rerank-candidates",
+        type=int,
+        help="Chunks retrieved for the cross-encoder to choose the best 3 from (default: $RERANK_CANDIDATES or 20)"
+    )
+    
+    parser.add_argument(
+        "--index-report",
+        action="store_true",
+        help="Print recall and latency of each index type against the exact index, then exit"
+    )
+    
+    parser.add_argument(
+        "--cache-dir",
+        help="Directory for the persistent embedding cache (default: $EMBEDDING_CACHE_DIR, disabled if unset)"
+    )
+    
+    parser.add_argument(
+        "--response-cache",
+        help="SQLite file caching Ollama responses by exact prompt across runs (default: $RESPONSE_CACHE_PATH, disabled if unset)"
     )
     
     parser.add_argument(
@@ -123,6 +467,24 @@ Usage examples:
         help="Specific question to answer (optional, enters interactive mode if not provided)"
     )
     
+    parser.add_argument(
+        "--questions",
+        help="File with one question per line to answer in bulk"
+    )
+    
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=4,
+        help="Questions from --questions answered concurrently; retrieval is batched ahead of generation (default: 4)"
+    )
+    
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Print the answer token by token as the model generates it (--ask and interactive mode)"
+    )
+    
     parser.add_argument(
         "--stats",
         action="store_true",
@@ -136,27 +498,112 @@ Usage examples:
         logger.print_stats()
         return
     
-    if not args.input:
-        print("❌ Error: --input is required (use --stats to see statistics)")
+    if args.lexical_weight is not None and not 0.0 <= args.lexical_weight <= 1.0:
+        print("❌ Error: --lexical-weight must be between 0 and 1")
+        sys.exit(1)
+    if args.embedding_workers is not None and args.embedding_workers <= 0:
+        print("❌ Error: --embedding-workers must be positive")
+        sys.exit(1)
+    if args.stream and args.questions and not args.ask:
+        # Concurrent answers would interleave their tokens
+        print("❌ Error: --stream works with --ask and interactive mode, not --questions")
         sys.exit(1)
     
-    if not Path(args.input).exists():
-        print(f"❌ Error: File '{args.input}' not found")
+    index_found = args.index and (Retriever.index_exists(args.index) or Corpus.index_exists(args.index))
+    if args.update and not (index_found and args.input):
+        print("❌ Error: --update needs --input and an existing --index")
         sys.exit(1)
     
-    print("🚀 Smart Document QA")
-    print("="*60)
+    if index_found:
+        print("🚀 Smart Document QA")
+        print("="*60)
+        
+        if args.update:
+            retriever = update_qa_system(args.index, args.input, args.cache_dir, args.batch_size,
+                                         args.nprobe, args.ef_search, args.min_score, args.hybrid, args.lexical_weight,
+                                         args.embedding_workers)
+        else:
+            retriever = load_qa_system(args.index, args.nprobe, args.ef_search, args.min_score, args.hybrid,
+                                       args.lexical_weight)
+        index_class = Corpus if isinstance(retriever, Corpus) else Retriever
+        input_file = args.input or index_class.load_metadata(args.index).get("input_file", "unknown")
+    else:
+        if not args.input:
+            print("❌ Error: --input is required (use --stats to see statistics)")
+            sys.exit(1)
+        
+        documents = find_documents(args.input)
+        if not documents:
+            if Path(args.input).is_dir() or glob.has_magic(args.input):
+                print(f"❌ Error: No text files found for '{args.input}'")
+            else:
+                print(f"❌ Error: File '{args.input}' not found")
+            sys.exit(1)
+        
+        print("🚀 Smart Document QA")
+        print("="*60)
+        
+        try:
+            chunker = TextChunker(args.chunk_size, args.chunk_overlap, args.min_chunk_size)
+        except ValueError as e:
+            print(f"❌ Error: {e}")
+            sys.exit(1)
+        
+        index_options = {"index_type": args.index_type, "nprobe": args.nprobe, "ef_search": args.ef_search,
+                         "min_score": args.min_score, "fusion": args.hybrid, "lexical_weight": args.lexical_weight}
+        if Path(args.input).is_file():
+            print(f"📖 Loading file: {args.input}")
+            with open_text_file(args.input) as source:
+                retriever = setup_qa_system(source, args.index, args.input, args.cache_dir, chunker, args.batch_size,
+                                            index_options, args.embedding_workers)
+        else:
+            root = document_root(args.input)
+            retriever = setup_corpus(documents, root, args.index, args.input, args.cache_dir, chunker, args.batch_size,
+                                     index_options, args.embedding_workers)
+        input_file = args.input
     
-    print(f"📖 Loading file: {args.input}")
-    text = load_text_file(args.input)
-    print(f"   ✅ File loaded ({len(text)} characters)")
+    if args.document:
+        if not isinstance(retriever, Corpus):
+            print("❌ Error: --document needs a directory or glob --input, or a saved corpus index")
+            sys.exit(1)
+        try:
+            retriever = retriever.select(args.document)
+        except ValueError as e:
+            print(f"❌ Error: {e}")
+            sys.exit(1)
     
-    retriever = setup_qa_system(text)
+    if args.index_report:
+        if isinstance(retriever, Corpus):
+            print("❌ Error: --index-report works on a single document")
+            sys.exit(1)
+        print_index_report(retriever)
+        return
     
-    if args.ask:
-        ask_question(retriever, args.ask, args.input)
-    else:
-        interactive_mode(retriever, args.input)
+    if args.concurrency <= 0:
+        print("❌ Error: --concurrency must be positive")
+        sys.exit(1)
+    
+    try:
+        reranker = create_reranker(args.rerank, args.rerank_candidates)
+    except ValueError as e:
+        print(f"❌ Error: {e}")
+        sys.exit(1)
+    response_cache = create_response_cache(args.response_cache)
+    
+    # One generator for the whole run keeps the Ollama connections alive between questions
+    with LLMResponseGenerator(pool_size=args.concurrency if args.questions else None, logger=create_logger(),
+                              answer_cache=create_answer_cache(), response_cache=response_cache) as llm:
+        if args.ask:
+            ask_question(retriever, args.ask, input_file, stream=args.stream, llm=llm, reranker=reranker)
+        elif args.questions:
+            answer_questions(retriever, load_questions(args.questions), input_file, llm, args.concurrency, reranker)
+        else:
+            interactive_mode(retriever, input_file, args.stream, llm, reranker)
+    
+    if response_cache is not None:
+        cache_stats = response_cache.get_stats()
+        print(f"\n💾 Response cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses")
+        response_cache.close()
     
     print("\n" + "="*60)
     logger = QALogger()
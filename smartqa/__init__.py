@@ -1,12 +1,20 @@
-from .chunker import TextChunker, Chunk
-from .embedder import Embedder
-from .retriever import Retriever
-from .llm import LLMResponseGenerator
-
-__all__ = [
-    'TextChunker',
-    'Chunk', 
-    'Embedder',
-    'Retriever',
-    'LLMResponseGenerator'
-]
+import importlib
+
+# Submodules are imported on first use, so the logger, chunker and mock server
+# can be used without loading the embedding model stack
+_EXPORTS = {
+    'TextChunker': 'chunker',
+    'Chunk': 'chunker',
+    'Embedder': 'embedder',
+    'Retriever': 'retriever',
+    'LLMResponseGenerator': 'llm',
+    'QAPipeline': 'pipeline'
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return getattr(importlib.import_module(f".{_EXPORTS[name]}", __name__), name)
@@ -0,0 +1,146 @@
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+
+
+class AnswerCache:
+
+    def __init__(self, max_entries: int = 1000, ttl_seconds: float = 3600, similarity_threshold: Optional[float] = 0.9):
+        if max_entries <= 0:
+            raise ValueError("max_entries must be positive")
+        if ttl_seconds <= 0:
+            raise ValueError("ttl_seconds must be positive")
+        if similarity_threshold is not None and not -1.0 <= similarity_threshold <= 1.0:
+            raise ValueError("similarity_threshold must be between -1 and 1")
+        
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        # None disables the semantic layer and only normalised exact matches hit
+        self.similarity_threshold = similarity_threshold
+        
+        # (key, normalised query) -> (answer, query embedding, time stored), least recently used first
+        self.entries: "OrderedDict[Tuple[str, str], Tuple[str, Optional[np.ndarray], float]]" = OrderedDict()
+        # key -> normalised queries cached under it, for the semantic lookup
+        self.buckets: Dict[str, List[str]] = {}
+        self.lock = threading.Lock()
+        
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expired = 0
+    
+    @staticmethod
+    def make_key(fingerprint: str, model_name: str, chunk_ids: List[str]) -> str:
+        # The same question over different context can have a different answer,
+        # so entries are only shared when the retrieved chunks are identical
+        raw = "\0".join([fingerprint, model_name, *chunk_ids])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+    
+    @staticmethod
+    def normalize_query(query: str) -> str:
+        return re.sub(r"\s+", " ", re.sub(r"[^\w\s]", " ", query.lower())).strip()
+    
+    def __len__(self) -> int:
+        return len(self.entries)
+    
+    def get(self, key: str, query: str, query_embedding: Optional[np.ndarray] = None) -> Optional[str]:
+        query = self.normalize_query(query)
+        now = time.time()
+        
+        with self.lock:
+            entry = self._get_entry(key, query, now)
+            if entry is not None:
+                self.hits += 1
+                return entry
+            
+            if self.similarity_threshold is not None and query_embedding is not None:
+                best_query = None
+                best_score = self.similarity_threshold
+                for cached_query in list(self.buckets.get(key, [])):
+                    cached = self.entries.get((key, cached_query))
+                    if cached is None or cached[1] is None:
+                        continue
+                    # Query embeddings are L2-normalised, so the dot product is the cosine similarity
+                    score = float(np.dot(cached[1], query_embedding))
+                    if score >= best_score:
+                        best_query, best_score = cached_query, score
+                
+                if best_query is not None:
+                    entry = self._get_entry(key, best_query, now)
+                    if entry is not None:
+                        self.hits += 1
+                        self.semantic_hits += 1
+                        return entry
+            
+            self.misses += 1
+            return None
+    
+    def put(self, key: str, query: str, answer: str, query_embedding: Optional[np.ndarray] = None) -> None:
+        query = self.normalize_query(query)
+        if query_embedding is not None:
+            query_embedding = np.array(query_embedding, dtype=np.float32).reshape(-1)
+        
+        with self.lock:
+            if (key, query) not in self.entries:
+                while len(self.entries) >= self.max_entries:
+                    self._remove(*next(iter(self.entries)))
+                    self.evictions += 1
+                self.buckets.setdefault(key, []).append(query)
+            
+            self.entries[(key, query)] = (answer, query_embedding, time.time())
+            self.entries.move_to_end((key, query))
+    
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+            self.buckets.clear()
+    
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expired": self.expired,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+        }
+    
+    def _get_entry(self, key: str, query: str, now: float) -> Optional[str]:
+        entry = self.entries.get((key, query))
+        if entry is None:
+            return None
+        if now - entry[2] > self.ttl_seconds:
+            self._remove(key, query)
+            self.expired += 1
+            return None
+        self.entries.move_to_end((key, query))
+        return entry[0]
+    
+    def _remove(self, key: str, query: str) -> None:
+        del self.entries[(key, query)]
+        bucket = self.buckets[key]
+        bucket.remove(query)
+        if not bucket:
+            del self.buckets[key]
+
+
+def create_answer_cache() -> Optional[AnswerCache]:
+    max_entries = int(os.getenv('ANSWER_CACHE_SIZE', '1000'))
+    if max_entries <= 0:
+        return None
+    
+    threshold = os.getenv('ANSWER_CACHE_THRESHOLD', '0.9')
+    return AnswerCache(
+        max_entries,
+        float(os.getenv('ANSWER_CACHE_TTL', '3600')),
+        float(threshold) if threshold else None
+    )
@@ -0,0 +1,130 @@
+import math
+import re
+from array import array
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+
+# Identifiers such as ERR_404, v2.3.1 or os.path.join stay whole, and their parts are indexed too
+TOKEN_PATTERN = re.compile(r"\w+(?:[.\-:/]\w+)*")
+PART_PATTERN = re.compile(r"[^\W_]+")
+MAX_TF = 0xFFFF
+
+
+def tokenize(text: str) -> List[str]:
+    tokens = []
+    for token in TOKEN_PATTERN.findall(text.lower()):
+        tokens.append(token)
+        parts = PART_PATTERN.findall(token)
+        if len(parts) > 1:
+            tokens.extend(parts)
+    return tokens
+
+
+class BM25Index:
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        # term -> (document ids, term frequencies); typed arrays take 6 bytes per posting
+        self.postings: Dict[str, Tuple[array, array]] = {}
+        # Indexed by document id, 0 for ids that were removed or never added
+        self.doc_lengths = array("I")
+        self.num_docs = 0
+        self.total_length = 0
+        self.removed = 0
+    
+    def __len__(self) -> int:
+        return self.num_docs
+    
+    def add(self, doc_id: int, text: str) -> None:
+        counts = Counter(tokenize(text))
+        length = sum(counts.values())
+        if not length:
+            return
+        if doc_id < len(self.doc_lengths) and self.doc_lengths[doc_id]:
+            raise ValueError(f"Document {doc_id} is already indexed")
+        
+        if doc_id >= len(self.doc_lengths):
+            self.doc_lengths.extend([0] * (doc_id + 1 - len(self.doc_lengths)))
+        self.doc_lengths[doc_id] = length
+        self.num_docs += 1
+        self.total_length += length
+        
+        for term, tf in counts.items():
+            posting = self.postings.get(term)
+            if posting is None:
+                posting = self.postings[term] = (array("i"), array("H"))
+            posting[0].append(doc_id)
+            posting[1].append(min(tf, MAX_TF))
+    
+    def add_many(self, documents: Iterable[Tuple[int, str]]) -> None:
+        for doc_id, text in documents:
+            self.add(doc_id, text)
+    
+    def remove(self, doc_ids: Iterable[int]) -> None:
+        # Postings of removed documents are skipped at query time and dropped in bulk
+        for doc_id in doc_ids:
+            if doc_id < len(self.doc_lengths) and self.doc_lengths[doc_id]:
+                self.total_length -= self.doc_lengths[doc_id]
+                self.doc_lengths[doc_id] = 0
+                self.num_docs -= 1
+                self.removed += 1
+        
+        if self.removed and self.removed >= 0.2 * (self.num_docs + self.removed):
+            self._compact()
+    
+    def search(self, query: str, k: int = 10, allowed_ids: Optional[np.ndarray] = None) -> List[Tuple[int, float]]:
+        # allowed_ids limits the results, while IDF and average length still come from the whole index
+        if not self.num_docs or k <= 0:
+            return []
+        
+        lengths = np.frombuffer(self.doc_lengths, dtype=np.uint32)
+        avg_length = self.total_length / self.num_docs
+        ids_parts = []
+        score_parts = []
+        for term in set(tokenize(query)):
+            posting = self.postings.get(term)
+            if posting is None:
+                continue
+            
+            ids = np.frombuffer(posting[0], dtype=np.int32)
+            tfs = np.frombuffer(posting[1], dtype=np.uint16).astype(np.float32)
+            doc_lengths = lengths[ids]
+            df = len(ids)
+            idf = math.log(1 + (self.num_docs - df + 0.5) / (df + 0.5))
+            norm = self.k1 * (1 - self.b + self.b * doc_lengths / avg_length)
+            ids_parts.append(ids)
+            # Removed documents have length 0 and contribute nothing
+            score_parts.append(np.where(doc_lengths > 0, idf * tfs * (self.k1 + 1) / (tfs + norm), 0.0))
+        
+        if not ids_parts:
+            return []
+        
+        unique_ids, inverse = np.unique(np.concatenate(ids_parts), return_inverse=True)
+        scores = np.bincount(inverse, weights=np.concatenate(score_parts))
+        matched = scores > 0
+        if allowed_ids is not None:
+            matched &= np.isin(unique_ids, allowed_ids)
+        matched = np.flatnonzero(matched)
+        if len(matched) > k:
+            matched = matched[np.argpartition(-scores[matched], k - 1)[:k]]
+        matched = matched[np.argsort(-scores[matched], kind="stable")]
+        return [(int(unique_ids[i]), float(scores[i])) for i in matched]
+    
+    def _compact(self) -> None:
+        lengths = np.frombuffer(self.doc_lengths, dtype=np.uint32)
+        postings = {}
+        for term, (ids, tfs) in self.postings.items():
+            keep = lengths[np.frombuffer(ids, dtype=np.int32)] > 0
+            if keep.all():
+                postings[term] = (ids, tfs)
+            elif keep.any():
+                kept_ids = array("i")
+                kept_ids.frombytes(np.frombuffer(ids, dtype=np.int32)[keep].tobytes())
+                kept_tfs = array("H")
+                kept_tfs.frombytes(np.frombuffer(tfs, dtype=np.uint16)[keep].tobytes())
+                postings[term] = (kept_ids, kept_tfs)
+        del lengths
+        self.postings = postings
+        self.removed = 0
@@ -1,28 +1,251 @@
-from typing import List
+import io
+import itertools
+import re
+from typing import Any, Dict, Iterable, Iterator, List, Optional, TextIO, Tuple, Union
+
+READ_BLOCK_SIZE = 1 << 16
+PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?])\s+|\s*\n\s*")
 
 class Chunk:
-    def __init__(self, id: str, text: str):
+    def __init__(self, id: str, text: str, start: Optional[int] = None, end: Optional[int] = None,
+                 doc_id: Optional[str] = None):
         self.id = id
         self.text = text
+        # Character offsets of the chunk in the source text
+        self.start = start
+        self.end = end
+        # Set when the chunk belongs to a multi-document corpus
+        self.doc_id = doc_id
+
+    @property
+    def uid(self) -> str:
+        # Chunk ids restart at chunk_0000 in every document
+        return f"{self.doc_id}/{self.id}" if self.doc_id is not None else self.id
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = {"id": self.id, "text": self.text, "start": self.start, "end": self.end}
+        if self.doc_id is not None:
+            data["doc_id"] = self.doc_id
+        return data
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Chunk":
+        return cls(id=data["id"], text=data["text"], start=data.get("start"), end=data.get("end"),
+                   doc_id=data.get("doc_id"))
 
 class TextChunker:
-    
-    def __init__(self, chunk_size: int = 1000):
+
+    def __init__(self, chunk_size: int = 1000, chunk_overlap: int = 100, min_chunk_size: int = 0):
+        if chunk_size <= 0:
+            raise ValueError("chunk_size must be positive")
+        if not 0 <= chunk_overlap < chunk_size:
+            raise ValueError("chunk_overlap must be between 0 and chunk_size")
+        if not 0 <= min_chunk_size <= chunk_size:
+            raise ValueError("min_chunk_size must be between 0 and chunk_size")
+        
         self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.min_chunk_size = min_chunk_size
+    
+    def get_config(self) -> Dict[str, Any]:
+        return {
+            "chunk_size": self.chunk_size,
+            "chunk_overlap": self.chunk_overlap,
+            "min_chunk_size": self.min_chunk_size
+        }
     
     def create_chunks(self, text: str) -> List[Chunk]:
-        chunks = []
-        chunk_id = 0
+        return list(self.iter_chunks(io.StringIO(text)))
+    
+    def iter_chunks(self, source: Union[TextIO, Iterable[str]]) -> Iterator[Chunk]:
+        if hasattr(source, "read"):
+            blocks = iter(lambda: source.read(READ_BLOCK_SIZE), "")
+        else:
+            blocks = iter(source)
+        
+        spans = self._merge_spans(self._iter_spans(blocks))
+        for chunk_id, (start, end, text) in enumerate(spans):
+            yield Chunk(id=f"chunk_{chunk_id:04d}", text=text, start=start, end=end)
+    
+    def _iter_spans(self, blocks: Iterator[str]) -> Iterator[Tuple[int, int, str, str]]:
+        # Only a sliding window of the source is kept: the paragraph being read
+        # (flushed once it grows past two chunks) plus the gap since the last span
+        window = ""
+        window_offset = 0
+        last_end = 0
+        position = 0
+        
+        for block in itertools.chain(blocks, [None]):
+            final = block is None
+            if not final:
+                window += block
+            
+            ranges = []
+            for match in PARAGRAPH_BREAK.finditer(window, position):
+                ranges.append((position, match.start()))
+                position = match.end()
+            if final:
+                ranges.append((position, len(window)))
+                position = len(window)
+            
+            spans = []
+            for start, end in ranges:
+                span = self._strip_span(window, start, end)
+                if span:
+                    spans.extend(self._split_span(window, *span))
+            
+            if not final and len(window) - position > 2 * self.chunk_size:
+                span = self._strip_span(window, position, len(window))
+                if span:
+                    partial = self._split_span(window, *span)
+                    # Span ends only grow, so the settled ones are a prefix; the rest are
+                    # carried over and split again from the first of them with more text
+                    settled = self._settled_end(window, position)
+                    done = sum(1 for _, end in partial if end < settled)
+                    if 0 < done < len(partial):
+                        spans.extend(partial[:done])
+                        position = partial[done][0]
+            
+            for start, end in spans:
+                gap_start = last_end - window_offset
+                gap = window[gap_start:start] if start >= gap_start else ""
+                yield window_offset + start, window_offset + end, window[start:end], gap
+                last_end = max(last_end, window_offset + end)
+            
+            keep = min(position, last_end - window_offset)
+            window = window[keep:]
+            window_offset += keep
+            position -= keep
+    
+    def _settled_end(self, window: str, start: int) -> int:
+        # Spans ending before this are final whatever comes next. The unfinished last
+        # sentence may still grow, or be hard split once it outgrows a chunk, and with a
+        # large overlap every span that stopped because it didn't fit depends on it
+        tail = start
+        for match in SENTENCE_BOUNDARY.finditer(window, start):
+            if match.end() < len(window):
+                tail = match.end()
+        span = self._strip_span(window, tail, len(window))
+        if span and span[1] - span[0] > self.chunk_size:
+            # Only the last piece of a hard split can still change
+            tail = self._hard_split(window, *span)[-1][0]
+        settled = self._strip_span(window, start, tail)
+        return settled[1] if settled else start
+    
+    def _split_span(self, text: str, start: int, end: int) -> List[Tuple[int, int]]:
+        if end - start <= self.chunk_size:
+            return [(start, end)]
+        
+        units = []
+        position = start
+        for match in SENTENCE_BOUNDARY.finditer(text, start, end):
+            units.append((position, match.start()))
+            position = match.end()
+        units.append((position, end))
+        
+        sentences = []
+        for unit_start, unit_end in units:
+            span = self._strip_span(text, unit_start, unit_end)
+            if not span:
+                continue
+            if span[1] - span[0] > self.chunk_size:
+                sentences.extend(self._hard_split(text, *span))
+            else:
+                sentences.append(span)
+        
+        return self._pack(sentences)
+    
+    def _pack(self, sentences: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+        spans = []
+        i = 0
+        while i < len(sentences):
+            j = i + 1
+            while j < len(sentences) and sentences[j][1] - sentences[i][0] <= self.chunk_size:
+                j += 1
+            spans.append((sentences[i][0], sentences[j - 1][1]))
+            
+            if j >= len(sentences):
+                break
+            
+            # Repeat the trailing sentences that fit in the overlap at the start of the next chunk
+            k = j
+            while k - 1 > i and sentences[j - 1][1] - sentences[k - 1][0] <= self.chunk_overlap:
+                k -= 1
+            i = k
         
-        paragraphs = text.split('\n\n')
+        return spans
+    
+    def _hard_split(self, text: str, start: int, end: int) -> List[Tuple[int, int]]:
+        pieces = []
+        position = start
+        while end - position > self.chunk_size:
+            cut = position + self.chunk_size
+            space = text.rfind(" ", position + self.chunk_size // 2, cut + 1)
+            if space > position:
+                cut = space
+            pieces.append((position, cut))
+            
+            # Never look back past the piece's own start: the window may not hold
+            # that text, and a negative index would make find() count from the end
+            next_position = max(cut - self.chunk_overlap, position)
+            if self.chunk_overlap:
+                space = text.find(" ", next_position, cut)
+                if space != -1:
+                    next_position = space + 1
+            position = max(next_position, position + 1)
+            while position < end and text[position].isspace():
+                position += 1
+        
+        if position < end:
+            pieces.append((position, end))
+        
+        return pieces
+    
+    def _merge_spans(self, spans: Iterator[Tuple[int, int, str, str]]) -> Iterator[Tuple[int, int, str]]:
+        if self.min_chunk_size <= 0:
+            for start, end, text, _ in spans:
+                yield start, end, text
+            return
         
-        for paragraph in paragraphs:
-            paragraph = paragraph.strip()
-            if paragraph:
-                chunks.append(Chunk(
-                    id=f"chunk_{chunk_id:04d}",
-                    text=paragraph
-                ))
-                chunk_id += 1
+        ready = None
+        pending = None
+        for start, end, text, gap in spans:
+            if pending is None:
+                pending = (start, end, text, gap)
+                continue
+            
+            pending_start, pending_end, pending_text, pending_gap = pending
+            if pending_end - pending_start < self.min_chunk_size and end - pending_start <= self.chunk_size:
+                merged_text = self._join(pending_text, pending_end, start, text, gap)
+                pending = (pending_start, end, merged_text, pending_gap)
+                continue
+            
+            if ready:
+                yield ready
+            ready = pending[:3]
+            pending = (start, end, text, gap)
         
-        return chunks
\ No newline at end of file
+        if pending:
+            start, end, text, gap = pending
+            if ready and end - start < self.min_chunk_size and end - ready[0] <= self.chunk_size:
+                ready = (ready[0], end, self._join(ready[2], ready[1], start, text, gap))
+                pending = None
+        if ready:
+            yield ready
+        if pending:
+            yield pending[:3]
+    
+    @staticmethod
+    def _join(text: str, end: int, next_start: int, next_text: str, gap: str) -> str:
+        if next_start >= end:
+            return text + gap + next_text
+        return text + next_text[end - next_start:]
+    
+    @staticmethod
+    def _strip_span(text: str, start: int, end: int) -> Optional[Tuple[int, int]]:
+        while start < end and text[start].isspace():
+            start += 1
+        while end > start and text[end - 1].isspace():
+            end -= 1
+        return (start, end) if start < end else None
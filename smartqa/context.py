@@ -0,0 +1,97 @@
+import math
+import os
+import re
+from typing import List, Optional, Set, Tuple
+from .bm25 import tokenize
+from .chunker import Chunk
+
+# Words, numbers and single punctuation marks; long words are split by BPE tokenizers,
+# so they count as one token per 4 characters
+TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+SENTENCE_PATTERN = re.compile(r"(?<=[.!?])\s+|\n+")
+# Below this many tokens a trimmed chunk says too little to be worth its source number
+MIN_SNIPPET_TOKENS = 16
+
+
+def count_tokens(text: str) -> int:
+    return sum(math.ceil(len(token) / 4) for token in TOKEN_PATTERN.findall(text))
+
+
+def split_sentences(text: str) -> List[str]:
+    return [sentence.strip() for sentence in SENTENCE_PATTERN.split(text) if sentence.strip()]
+
+
+class ContextPacker:
+
+    def __init__(self, max_tokens: Optional[int] = None, max_chunk_tokens: Optional[int] = None):
+        self.max_tokens = max_tokens if max_tokens is not None else int(os.getenv('CONTEXT_MAX_TOKENS', '1024'))
+        self.max_chunk_tokens = (max_chunk_tokens if max_chunk_tokens is not None
+                                 else int(os.getenv('CONTEXT_CHUNK_TOKENS', '384')))
+        if self.max_tokens < MIN_SNIPPET_TOKENS:
+            raise ValueError(f"max_tokens must be at least {MIN_SNIPPET_TOKENS}")
+        if self.max_chunk_tokens < MIN_SNIPPET_TOKENS:
+            raise ValueError(f"max_chunk_tokens must be at least {MIN_SNIPPET_TOKENS}")
+    
+    def pack(self, query: str, relevant_chunks: List[Tuple[Chunk, float]]) -> List[Tuple[Chunk, float, str]]:
+        # Chunks arrive best first (retrieval or rerank order) and are packed in that order,
+        # so when the budget runs out it is the weakest chunks that are dropped
+        query_terms = set(tokenize(query))
+        budget = self.max_tokens
+        # Normalised text packed so far; chunks split from one paragraph share an overlap,
+        # so a sentence is skipped when it is contained in it, not only when it repeats exactly
+        seen = " "
+        packed = []
+        
+        for chunk, score in relevant_chunks:
+            limit = min(self.max_chunk_tokens, budget)
+            if limit < MIN_SNIPPET_TOKENS:
+                break
+            
+            sentences = [s for s in split_sentences(chunk.text) if f" {self._normalize(s)} " not in seen]
+            if not sentences:
+                continue
+            
+            text = self._fit(sentences, query_terms, limit)
+            packed.append((chunk, score, text))
+            budget -= count_tokens(text)
+            seen += self._normalize(text) + " \n "
+        
+        return packed
+    
+    def _fit(self, sentences: List[str], query_terms: Set[str], limit: int) -> str:
+        lengths = [count_tokens(sentence) for sentence in sentences]
+        if sum(lengths) <= limit:
+            return " ".join(sentences)
+        
+        # Keep the sentences sharing the most query terms, in their original order
+        ranked = sorted(range(len(sentences)), key=lambda i: -self._relevance(sentences[i], query_terms))
+        keep = []
+        used = 0
+        for i in ranked:
+            if used + lengths[i] <= limit:
+                keep.append(i)
+                used += lengths[i]
+        if keep:
+            return " ".join(sentences[i] for i in sorted(keep))
+        
+        # Even the best sentence is too long, so it is cut at the limit
+        words = []
+        used = 0
+        for word in sentences[ranked[0]].split():
+            used += count_tokens(word)
+            if used > limit:
+                break
+            words.append(word)
+        return " ".join(words) + " ..."
+    
+    @staticmethod
+    def _relevance(sentence: str, query_terms: Set[str]) -> float:
+        terms = tokenize(sentence)
+        if not terms:
+            return 0.0
+        # Favours dense matches over long sentences that mention a term once
+        return len(query_terms.intersection(terms)) / math.sqrt(len(terms))
+    
+    @staticmethod
+    def _normalize(sentence: str) -> str:
+        return " ".join(re.findall(r"\w+", sentence.lower()))
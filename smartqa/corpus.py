@@ -0,0 +1,227 @@
+import glob
+import json
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, TextIO, Tuple, Union
+import numpy as np
+from .chunker import Chunk, TextChunker
+from .embedder import Embedder
+from .embedding_cache import EmbeddingCache
+from .retriever import Retriever
+
+CORPUS_FILE = "corpus.json"
+INDEX_DIRECTORY = "index"
+
+
+def find_documents(pattern: str) -> List[Path]:
+    # A single file, every .txt file under a directory, or a glob pattern
+    path = Path(pattern)
+    if path.is_file():
+        return [path]
+    if path.is_dir():
+        return sorted(p for p in path.rglob("*.txt") if p.is_file())
+    return sorted(Path(p) for p in glob.glob(pattern, recursive=True) if Path(p).is_file())
+
+
+def document_root(pattern: str) -> Optional[Path]:
+    # Document ids are relative to the input directory, or to the part of a glob before its first
+    # wildcard, so docs/a/readme.txt and docs/b/readme.txt stay apart and ids survive added files
+    path = Path(pattern)
+    if path.is_dir():
+        return path
+    if not glob.has_magic(pattern):
+        return None
+    parts = []
+    for part in path.parts:
+        if glob.has_magic(part):
+            break
+        parts.append(part)
+    return Path(*parts) if parts else Path(".")
+
+
+def document_id(path: Path, root: Optional[Path] = None) -> str:
+    if root is not None:
+        try:
+            return path.relative_to(root).as_posix()
+        except ValueError:
+            pass
+    return path.name
+
+
+class Corpus:
+
+    def __init__(self, embedder: Embedder, cache: Optional[EmbeddingCache] = None, chunker: Optional[TextChunker] = None,
+                 index_options: Optional[Dict[str, Any]] = None):
+        self.embedder = embedder
+        self.cache = cache
+        self.chunker = chunker or TextChunker()
+        self.index_options = index_options or {}
+        # One index over every document. Chunks carry their doc_id, and a document filter
+        # restricts the search to that document's vector ids instead of scanning the others
+        self.retriever = Retriever(embedder, cache, **self.index_options)
+        self.sources: Dict[str, str] = {}
+        self.vector_ids: Dict[str, np.ndarray] = {}
+        # Set on views from select(), which share the index but only search these documents
+        self.selection: Optional[List[str]] = None
+    
+    @property
+    def document_ids(self) -> List[str]:
+        return list(self.sources) if self.selection is None else list(self.selection)
+    
+    @property
+    def chunks(self) -> List[Chunk]:
+        if self.selection is None:
+            return self.retriever.chunks
+        selected = set(self.selection)
+        return [chunk for chunk in self.retriever.chunks if chunk.doc_id in selected]
+    
+    @property
+    def fingerprint(self) -> str:
+        return self.retriever.fingerprint
+    
+    def add_document(self, doc_id: str, source: Union[TextIO, Iterable[str]], batch_size: int = 256,
+                     input_file: Optional[str] = None) -> int:
+        if doc_id in self.sources:
+            raise ValueError(f"Document '{doc_id}' is already in the corpus")
+        
+        start = len(self.retriever.vector_ids)
+        total = self.retriever.add_chunks_stream(self._tag_chunks(doc_id, self.chunker.iter_chunks(source)), batch_size)
+        if total:
+            self.sources[doc_id] = input_file or doc_id
+            self.vector_ids[doc_id] = np.array(self.retriever.vector_ids[start:], dtype=np.int64)
+        return total
+    
+    def update_document(self, doc_id: str, source: Union[TextIO, Iterable[str]], batch_size: int = 256,
+                        input_file: Optional[str] = None) -> Dict[str, int]:
+        if doc_id not in self.sources:
+            return {"added": self.add_document(doc_id, source, batch_size, input_file), "removed": 0, "unchanged": 0}
+        
+        stats = self.retriever.update_chunks(self._tag_chunks(doc_id, self.chunker.iter_chunks(source)), batch_size, doc_id)
+        vector_ids = [vector_id for vector_id, chunk in zip(self.retriever.vector_ids, self.retriever.chunks)
+                      if chunk.doc_id == doc_id]
+        if not vector_ids:
+            del self.sources[doc_id]
+            del self.vector_ids[doc_id]
+            return stats
+        
+        self.sources[doc_id] = input_file or self.sources[doc_id]
+        self.vector_ids[doc_id] = np.array(vector_ids, dtype=np.int64)
+        return stats
+    
+    def remove_document(self, doc_id: str) -> int:
+        if doc_id not in self.sources:
+            raise ValueError(f"Document '{doc_id}' is not in the corpus")
+        
+        removed = self.retriever.remove_chunks(chunk.uid for chunk in self.retriever.chunks if chunk.doc_id == doc_id)
+        del self.sources[doc_id]
+        del self.vector_ids[doc_id]
+        return removed
+    
+    def select(self, doc_ids: Iterable[str]) -> "Corpus":
+        # A view sharing this corpus' index, restricted to the given documents
+        doc_ids = list(doc_ids)
+        self._check_documents(doc_ids)
+        
+        corpus = Corpus(self.embedder, self.cache, self.chunker, self.index_options)
+        corpus.retriever = self.retriever
+        corpus.sources = self.sources
+        corpus.vector_ids = self.vector_ids
+        corpus.selection = doc_ids
+        return corpus
+    
+    def search(self, query: str, k: int = 5, min_score: float = None,
+               doc_ids: Optional[Iterable[str]] = None) -> List[Tuple[Chunk, float]]:
+        return self.search_vectors(self.embedder.encode_single(query), k, min_score, doc_ids, [query])[0]
+    
+    def search_batch(self, queries: List[str], k: int = 5, min_score: float = None,
+                     doc_ids: Optional[Iterable[str]] = None) -> List[List[Tuple[Chunk, float]]]:
+        if not queries:
+            return []
+        return self.search_vectors(self.embed_queries(queries), k, min_score, doc_ids, queries)
+    
+    def embed_queries(self, queries: List[str]) -> np.ndarray:
+        return self.embedder.encode_queries(list(queries))
+    
+    def search_vectors(self, query_embeddings: np.ndarray, k: int = 5, min_score: float = None,
+                       doc_ids: Optional[Iterable[str]] = None,
+                       queries: Optional[List[str]] = None) -> List[List[Tuple[Chunk, float]]]:
+        # Dense and BM25 scores come from the one index, so results from different documents compare directly
+        doc_ids = self.selection if doc_ids is None else list(doc_ids)
+        if doc_ids is None:
+            return self.retriever.search_vectors(query_embeddings, k, min_score, queries)
+        
+        self._check_documents(doc_ids)
+        allowed_ids = np.concatenate([self.vector_ids[doc_id] for doc_id in doc_ids] or [np.empty(0, dtype=np.int64)])
+        return self.retriever.search_vectors(query_embeddings, k, min_score, queries, allowed_ids)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        chunks_per_document = {doc_id: len(self.vector_ids[doc_id]) for doc_id in self.document_ids}
+        return {
+            "documents": len(chunks_per_document),
+            "chunks": sum(chunks_per_document.values()),
+            "chunks_per_document": chunks_per_document
+        }
+    
+    def save(self, directory: str, metadata: Optional[Dict[str, Any]] = None) -> None:
+        if not self.sources:
+            raise ValueError("Cannot save an empty corpus")
+        
+        path = Path(directory)
+        path.mkdir(parents=True, exist_ok=True)
+        self.retriever.save(str(path / INDEX_DIRECTORY))
+        
+        # Written last so a directory with corpus.json always holds a complete index
+        meta = {
+            "model_name": self.embedder.model_name,
+            "chunker": self.chunker.get_config(),
+            "documents": [{"doc_id": doc_id, "input_file": input_file} for doc_id, input_file in self.sources.items()],
+            **(metadata or {})
+        }
+        tmp_path = path / (CORPUS_FILE + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f, indent=2, ensure_ascii=False)
+        tmp_path.replace(path / CORPUS_FILE)
+    
+    @classmethod
+    def load(cls, directory: str, embedder: Embedder, cache: Optional[EmbeddingCache] = None,
+             nprobe: int = None, ef_search: int = None, min_score: float = None, fusion: str = None,
+             lexical_weight: float = None) -> "Corpus":
+        path = Path(directory)
+        meta = cls.load_metadata(directory)
+        if any("directory" in document for document in meta["documents"]):
+            raise ValueError("Corpus was saved with one index per document, rebuild it from --input")
+        
+        chunker = TextChunker(**meta["chunker"]) if meta.get("chunker") else None
+        options = {"nprobe": nprobe, "ef_search": ef_search, "min_score": min_score, "fusion": fusion,
+                   "lexical_weight": lexical_weight}
+        corpus = cls(embedder, cache, chunker, options)
+        corpus.retriever = Retriever.load(str(path / INDEX_DIRECTORY), embedder, cache, **options)
+        
+        vector_ids: Dict[str, List[int]] = {}
+        for vector_id, chunk in zip(corpus.retriever.vector_ids, corpus.retriever.chunks):
+            vector_ids.setdefault(chunk.doc_id, []).append(vector_id)
+        for document in meta["documents"]:
+            corpus.sources[document["doc_id"]] = document.get("input_file", document["doc_id"])
+            corpus.vector_ids[document["doc_id"]] = np.array(vector_ids.get(document["doc_id"], []), dtype=np.int64)
+        
+        return corpus
+    
+    @staticmethod
+    def load_metadata(directory: str) -> Dict[str, Any]:
+        with open(Path(directory) / CORPUS_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    
+    @staticmethod
+    def index_exists(directory: str) -> bool:
+        return (Path(directory) / CORPUS_FILE).exists()
+    
+    def _check_documents(self, doc_ids: List[str]) -> None:
+        known = set(self.document_ids)
+        missing = [doc_id for doc_id in doc_ids if doc_id not in known]
+        if missing:
+            raise ValueError(f"Unknown documents: {', '.join(missing)}")
+    
+    @staticmethod
+    def _tag_chunks(doc_id: str, chunks: Iterator[Chunk]) -> Iterator[Chunk]:
+        for chunk in chunks:
+            chunk.doc_id = doc_id
+            yield chunk
@@ -1,17 +1,135 @@
+import multiprocessing
 import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+import faiss
 from sentence_transformers import SentenceTransformer
 import numpy as np
-from typing import List
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from . import tracing
+
+
+_models: Dict[Tuple[str, str], Any] = {}
+_models_lock = threading.Lock()
+# The model in a parallel-encode worker process
+_worker_model = None
+
+
+def load_shared_model(model_name: str, factory: Callable[[str], Any] = SentenceTransformer):
+    # One instance per (model class, name) per process; the models are safe to share for inference
+    key = (factory.__name__, model_name)
+    model = _models.get(key)
+    if model is None:
+        with _models_lock:
+            model = _models.get(key)
+            if model is None:
+                model = factory(model_name)
+                _models[key] = model
+    return model
+
+
+def clear_shared_models() -> None:
+    with _models_lock:
+        _models.clear()
+
+
+def _init_worker(model_name: str, threads: int) -> None:
+    global _worker_model
+    # Each worker gets its share of the cores instead of every process starting one thread per core
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+    _worker_model = load_shared_model(model_name)
+
+
+def _encode_batch(texts: List[str], batch_size: int):
+    return _worker_model.encode(texts, batch_size=batch_size, convert_to_numpy=True)
 
 
 class Embedder:
-    def __init__(self, model_name=None):
+    def __init__(self, model_name=None, normalize: bool = True, workers: int = None, batch_size: int = None):
         self.model_name = model_name or os.getenv('EMBEDDING_MODEL', 'sentence-transformers/all-MiniLM-L6-v2')
-        self.model = SentenceTransformer(self.model_name)
+        self.model = load_shared_model(self.model_name)
         self.dimension = self.model.get_sentence_embedding_dimension()
+        # Unit-length vectors make FAISS inner-product scores cosine similarities
+        self.normalize = normalize
+        # With several workers, encode_texts calls larger than one batch are spread over a pool
+        # of processes, each with its own copy of the model; queries are always encoded here
+        self.workers = workers if workers is not None else int(os.getenv('EMBEDDING_WORKERS', '1'))
+        self.batch_size = batch_size or int(os.getenv('EMBEDDING_BATCH_SIZE', '32'))
+        if self.workers <= 0:
+            raise ValueError("workers must be positive")
+        if self.batch_size <= 0:
+            raise ValueError("batch_size must be positive")
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pool_lock = threading.Lock()
+
+    @property
+    def cache_namespace(self) -> str:
+        return f"{self.model_name}:l2" if self.normalize else self.model_name
+
+    def warm_up(self) -> None:
+        # The first encode call pays for tokenizer and kernel initialisation
+        self.encode_single("warm up")
 
     def encode_single(self, text):
-        return self.model.encode([text], convert_to_numpy=True)
+        with tracing.span("encode_query"):
+            return self._prepare(self.model.encode([text], convert_to_numpy=True))
 
     def encode_texts(self, texts):
-        return self.model.encode(texts, convert_to_numpy=True)
+        with tracing.span("encode_texts"):
+            if self.workers > 1 and len(texts) > self.batch_size:
+                return self._prepare(self._encode_parallel(texts))
+            return self._prepare(self.model.encode(texts, batch_size=self.batch_size, convert_to_numpy=True))
+
+    def encode_queries(self, queries):
+        # Same vectors as encode_texts, traced separately from document embedding
+        with tracing.span("encode_query"):
+            return self._prepare(self.model.encode(queries, convert_to_numpy=True))
+
+    def close(self) -> None:
+        # Stops the worker processes; a later parallel encode starts new ones
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown()
+                self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _encode_parallel(self, texts):
+        # Batches of similar length need less padding; they go to whichever worker is free
+        # and come back in submission order, so the rows are put back where their texts were
+        order = np.argsort([len(text) for text in texts], kind="stable")
+        starts = range(0, len(texts), self.batch_size)
+        batches = [[texts[i] for i in order[start:start + self.batch_size]] for start in starts]
+
+        embeddings = np.empty((len(texts), self.dimension), dtype=np.float32)
+        for start, batch in zip(starts, self._get_pool().map(_encode_batch, batches, repeat(self.batch_size))):
+            embeddings[order[start:start + len(batch)]] = batch
+        return embeddings
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._pool_lock:
+            if self._pool is None:
+                # Forking a process that has already loaded the model and its thread pools can deadlock
+                self._pool = ProcessPoolExecutor(
+                    self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                    initargs=(self.model_name, max(1, (os.cpu_count() or 1) // self.workers))
+                )
+            return self._pool
+
+    def _prepare(self, embeddings):
+        # Only copies when the model returned another dtype or a non-contiguous array
+        embeddings = np.ascontiguousarray(embeddings, dtype=np.float32).reshape(-1, self.dimension)
+        if self.normalize and len(embeddings):
+            faiss.normalize_L2(embeddings)
+        return embeddings
@@ -0,0 +1,234 @@
+import hashlib
+import json
+import os
+import re
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+
+
+VECTORS_FILE = "vectors.f32"
+INDEX_FILE = "index.json"
+# Rows changed since the last snapshot, appended on every flush; one file per snapshot generation
+JOURNAL_FILE = "index.{}.log"
+
+
+class EmbeddingCache:
+
+    def __init__(self, directory: str, model_name: str, dimension: int, max_entries: int = 100_000):
+        if max_entries <= 0:
+            raise ValueError("max_entries must be positive")
+        
+        self.model_name = model_name
+        self.dimension = dimension
+        self.max_entries = max_entries
+        self.directory = Path(directory) / re.sub(r"[^\w.-]+", "__", model_name)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        
+        # key -> row in the vectors file, least recently used first
+        self.rows: "OrderedDict[str, int]" = OrderedDict()
+        self.free_rows: List[int] = []
+        # Rows evicted since the last flush are only reused once the index on
+        # disk no longer points at them, so a crash never serves a wrong vector
+        self.pending_free_rows: List[int] = []
+        self.capacity = 0
+        self.vectors = None
+        # Flushes append the keys touched since the previous one to a journal instead of rewriting
+        # every row, and the journal is folded into a new snapshot once it outgrows the cache
+        self.touched: "OrderedDict[str, None]" = OrderedDict()
+        self.generation = 0
+        self.journal_entries = 0
+        self.snapshot_capacity = None
+        
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        
+        self._load()
+    
+    @staticmethod
+    def make_key(model_name: str, text: str) -> str:
+        return hashlib.sha256(f"{model_name}\0{text}".encode("utf-8")).hexdigest()
+    
+    def __len__(self) -> int:
+        return len(self.rows)
+    
+    def get_many(self, texts: List[str]) -> Tuple[np.ndarray, List[int]]:
+        embeddings = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        missing = []
+        
+        for i, text in enumerate(texts):
+            key = self.make_key(self.model_name, text)
+            row = self.rows.get(key)
+            if row is None:
+                missing.append(i)
+                continue
+            self.rows.move_to_end(key)
+            self._touch(key)
+            embeddings[i] = self.vectors[row]
+        
+        self.hits += len(texts) - len(missing)
+        self.misses += len(missing)
+        return embeddings, missing
+    
+    def put_many(self, texts: List[str], embeddings: np.ndarray) -> None:
+        if len(texts) != len(embeddings):
+            raise ValueError("texts and embeddings must have the same length")
+        
+        for text, embedding in zip(texts, embeddings):
+            key = self.make_key(self.model_name, text)
+            row = self.rows.get(key)
+            
+            if row is None:
+                if len(self.rows) >= self.max_entries:
+                    evicted_key, evicted_row = self.rows.popitem(last=False)
+                    self.pending_free_rows.append(evicted_row)
+                    self._touch(evicted_key)
+                    self.evictions += 1
+                row = self._allocate_row()
+            
+            self.vectors[row] = embedding
+            self.rows[key] = row
+            self.rows.move_to_end(key)
+            self._touch(key)
+    
+    def flush(self) -> None:
+        if self.vectors is not None:
+            self.vectors.flush()
+        
+        if (self.capacity != self.snapshot_capacity
+                or self.journal_entries + len(self.touched) > max(len(self.rows), 1024)):
+            self._write_snapshot()
+        elif self.touched:
+            # Each line is a key's current row (null once evicted), replayed in order on load
+            lines = "".join(json.dumps([key, self.rows.get(key)]) + "\n" for key in self.touched)
+            with open(self._journal_path(), "a", encoding="utf-8") as f:
+                f.write(lines)
+            self.journal_entries += len(self.touched)
+        self.touched.clear()
+        
+        self.free_rows.extend(self.pending_free_rows)
+        self.pending_free_rows = []
+    
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.rows),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+        }
+    
+    def _load(self) -> None:
+        index_path = self.directory / INDEX_FILE
+        vectors_path = self.directory / VECTORS_FILE
+        if not index_path.exists() or not vectors_path.exists():
+            return
+        
+        with open(index_path, "r", encoding="utf-8") as f:
+            index = json.load(f)
+        
+        if index.get("dimension") != self.dimension:
+            # Stale cache from a different model revision, start over
+            return
+        
+        capacity = index["capacity"]
+        if vectors_path.stat().st_size < capacity * self.dimension * 4:
+            return
+        
+        self._resize(capacity)
+        self.snapshot_capacity = capacity
+        self.generation = index.get("generation", 0)
+        self.rows = OrderedDict((key, row) for key, row in index["rows"])
+        
+        journal_path = self._journal_path()
+        if journal_path.exists():
+            with open(journal_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        key, row = json.loads(line)
+                    except ValueError:
+                        # A flush interrupted mid-write; everything before it is intact
+                        break
+                    if row is None:
+                        self.rows.pop(key, None)
+                    else:
+                        self.rows[key] = row
+                        self.rows.move_to_end(key)
+                    self.journal_entries += 1
+        
+        used = set(self.rows.values())
+        self.free_rows = [row for row in range(self.capacity - 1, -1, -1) if row not in used]
+        
+        # Entries beyond a lowered max_entries are evicted oldest first
+        while len(self.rows) > self.max_entries:
+            key, row = self.rows.popitem(last=False)
+            self.pending_free_rows.append(row)
+            self._touch(key)
+    
+    def _touch(self, key: str) -> None:
+        self.touched[key] = None
+        self.touched.move_to_end(key)
+    
+    def _journal_path(self) -> Path:
+        return self.directory / JOURNAL_FILE.format(self.generation)
+    
+    def _write_snapshot(self) -> None:
+        # The new snapshot names a fresh journal, so the old one is never replayed over it,
+        # even if the process dies before deleting it
+        old_journal = self._journal_path()
+        self.generation += 1
+        self._journal_path().unlink(missing_ok=True)
+        index = {
+            "model_name": self.model_name,
+            "dimension": self.dimension,
+            "capacity": self.capacity,
+            "generation": self.generation,
+            "rows": list(self.rows.items())
+        }
+        tmp_path = self.directory / (INDEX_FILE + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(index, f)
+        os.replace(tmp_path, self.directory / INDEX_FILE)
+        
+        old_journal.unlink(missing_ok=True)
+        self.journal_entries = 0
+        self.snapshot_capacity = self.capacity
+    
+    def _allocate_row(self) -> int:
+        if not self.free_rows:
+            capacity = min(max(1024, self.capacity * 2), self.max_entries)
+            if capacity <= self.capacity:
+                # Evicted rows are still pinned until the next flush
+                capacity = self.capacity + max(16, self.max_entries // 8)
+            self._resize(capacity)
+        return self.free_rows.pop()
+    
+    def _resize(self, capacity: int) -> None:
+        vectors_path = self.directory / VECTORS_FILE
+        old_capacity = self.capacity
+        
+        if self.vectors is not None:
+            self.vectors.flush()
+            self.vectors = None
+        
+        size = capacity * self.dimension * 4
+        if not vectors_path.exists() or vectors_path.stat().st_size < size:
+            with open(vectors_path, "ab") as f:
+                f.truncate(size)
+        
+        self.vectors = np.memmap(vectors_path, dtype=np.float32, mode="r+", shape=(capacity, self.dimension))
+        self.capacity = capacity
+        self.free_rows.extend(range(capacity - 1, old_capacity - 1, -1))
+
+
+def create_embedding_cache(embedder, directory: Optional[str] = None) -> Optional[EmbeddingCache]:
+    directory = directory or os.getenv('EMBEDDING_CACHE_DIR')
+    if not directory:
+        return None
+    
+    max_entries = int(os.getenv('EMBEDDING_CACHE_SIZE', '100000'))
+    return EmbeddingCache(directory, embedder.cache_namespace, embedder.dimension, max_entries)
@@ -0,0 +1,199 @@
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+from .logger import QALogger
+
+AGGREGATE_COLUMNS = {"model": "model_name", "input_file": "input_file", "day": "day"}
+IMPORT_BATCH_SIZE = 10_000
+
+
+class HistoryStore:
+
+    def __init__(self, path: str = "qa_history.db"):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(str(self.path), check_same_thread=False)
+        with self.connection:
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS interactions ("
+                "id INTEGER PRIMARY KEY, ts REAL NOT NULL, timestamp TEXT NOT NULL, day TEXT NOT NULL, "
+                "query TEXT NOT NULL, answer TEXT NOT NULL, tokens_used INTEGER NOT NULL, latency_ms REAL NOT NULL, "
+                "ttft_ms REAL, cache_hit INTEGER, cost_usd REAL, citations_count INTEGER NOT NULL, "
+                "input_file TEXT, model_name TEXT, entry TEXT NOT NULL)"
+            )
+            # "Recent N" and time ranges walk this index instead of the table
+            self.connection.execute("CREATE INDEX IF NOT EXISTS interactions_ts ON interactions (ts)")
+            # Rolled up on insert, so aggregates read one row per day, model and file however long the history
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS daily ("
+                "day TEXT NOT NULL, model_name TEXT NOT NULL, input_file TEXT NOT NULL, "
+                "interactions INTEGER NOT NULL, tokens INTEGER NOT NULL, latency_ms REAL NOT NULL, "
+                "cost_usd REAL NOT NULL, cache_hits INTEGER NOT NULL, cache_lookups INTEGER NOT NULL, "
+                "PRIMARY KEY (day, model_name, input_file))"
+            )
+            # Log segment id -> offset already imported, for incremental imports
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS imports (segment TEXT PRIMARY KEY, offset INTEGER NOT NULL)"
+            )
+    
+    def __len__(self) -> int:
+        with self.lock:
+            return self.connection.execute("SELECT COUNT(*) FROM interactions").fetchone()[0]
+    
+    def add_entries(self, entries: Iterable[Dict[str, Any]]) -> int:
+        rows = [self._row(entry) for entry in entries]
+        with self.lock, self.connection:
+            self._insert(rows)
+        return len(rows)
+    
+    def import_log(self, logger: Union[QALogger, str] = "qa_history.jsonl") -> int:
+        # Reads only what was appended to each log segment since the last import
+        logger = QALogger(logger) if isinstance(logger, str) else logger
+        logger.flush()
+        imported = 0
+        for path in logger.segments():
+            segment = logger.segment_id(path)
+            if segment is None:
+                continue
+            with self.lock:
+                row = self.connection.execute("SELECT offset FROM imports WHERE segment = ?", (segment,)).fetchone()
+            start = row[0] if row else 0
+            
+            rows = []
+            offset = start
+            for offset, entry in logger.read_segment(path, start):
+                rows.append(self._row(entry))
+                if len(rows) >= IMPORT_BATCH_SIZE:
+                    if not self._import_batch(segment, rows, start, offset):
+                        break
+                    imported += len(rows)
+                    rows, start = [], offset
+            else:
+                if offset != start and self._import_batch(segment, rows, start, offset):
+                    imported += len(rows)
+        return imported
+    
+    def recent(self, n: int = 5) -> List[Dict[str, Any]]:
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT entry FROM interactions ORDER BY ts DESC, id DESC LIMIT ?", (n,)
+            ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+    
+    def between(self, start: datetime, end: datetime, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT entry FROM interactions WHERE ts >= ? AND ts < ? ORDER BY ts, id LIMIT ?",
+                (start.timestamp(), end.timestamp(), -1 if limit is None else limit)
+            ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+    
+    def aggregate(self, by: str = "day", start_day: Optional[str] = None,
+                  end_day: Optional[str] = None) -> List[Dict[str, Any]]:
+        if by not in AGGREGATE_COLUMNS:
+            raise ValueError(f"Unknown aggregate '{by}', expected one of {', '.join(AGGREGATE_COLUMNS)}")
+        column = AGGREGATE_COLUMNS[by]
+        
+        with self.lock:
+            rows = self.connection.execute(
+                f"SELECT {column}, SUM(interactions), SUM(tokens), SUM(latency_ms), SUM(cost_usd), "
+                "SUM(cache_hits), SUM(cache_lookups) FROM daily WHERE day >= ? AND day <= ? "
+                f"GROUP BY {column} ORDER BY {column}",
+                (start_day or "", end_day or "9999-12-31")
+            ).fetchall()
+        
+        return [
+            {
+                by: key,
+                "interactions": interactions,
+                "total_tokens": tokens,
+                "avg_latency_ms": round(latency / interactions, 2),
+                "total_cost_usd": round(cost, 4),
+                "answer_cache_hit_rate": round(hits / lookups, 4) if lookups else None
+            }
+            for key, interactions, tokens, latency, cost, hits, lookups in rows
+        ]
+    
+    def clear(self) -> None:
+        with self.lock, self.connection:
+            for table in ("interactions", "daily", "imports"):
+                self.connection.execute(f"DELETE FROM {table}")
+    
+    def close(self) -> None:
+        with self.lock:
+            self.connection.close()
+    
+    def _import_batch(self, segment: str, rows: List[Tuple], start: int, offset: int) -> bool:
+        # Rows and the new offset commit together, so an interrupted import never duplicates entries;
+        # if another importer moved the offset first, this batch is already in the store
+        with self.lock, self.connection:
+            # Taken before the read, so a concurrent importer in another process waits instead of racing
+            self.connection.execute("BEGIN IMMEDIATE")
+            row = self.connection.execute("SELECT offset FROM imports WHERE segment = ?", (segment,)).fetchone()
+            if (row[0] if row else 0) != start:
+                return False
+            self._insert(rows)
+            self.connection.execute(
+                "INSERT INTO imports (segment, offset) VALUES (?, ?) "
+                "ON CONFLICT (segment) DO UPDATE SET offset = excluded.offset",
+                (segment, offset)
+            )
+        return True
+    
+    def _insert(self, rows: List[Tuple]) -> None:
+        self.connection.executemany(
+            "INSERT INTO interactions (ts, timestamp, day, query, answer, tokens_used, latency_ms, ttft_ms, cache_hit, "
+            "cost_usd, citations_count, input_file, model_name, entry) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            rows
+        )
+        
+        daily: Dict[Tuple[str, str, str], List[float]] = {}
+        for row in rows:
+            totals = daily.setdefault((row[2], row[12] or "", row[11] or ""), [0, 0, 0.0, 0.0, 0, 0])
+            totals[0] += 1
+            totals[1] += row[5]
+            totals[2] += row[6]
+            totals[3] += row[9] or 0.0
+            if row[8] is not None:
+                totals[4] += row[8]
+                totals[5] += 1
+        self.connection.executemany(
+            "INSERT INTO daily (day, model_name, input_file, interactions, tokens, latency_ms, cost_usd, cache_hits, "
+            "cache_lookups) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT (day, model_name, input_file) DO UPDATE SET "
+            "interactions = interactions + excluded.interactions, tokens = tokens + excluded.tokens, "
+            "latency_ms = latency_ms + excluded.latency_ms, cost_usd = cost_usd + excluded.cost_usd, "
+            "cache_hits = cache_hits + excluded.cache_hits, cache_lookups = cache_lookups + excluded.cache_lookups",
+            [(*key, *totals) for key, totals in daily.items()]
+        )
+    
+    @staticmethod
+    def _row(entry: Dict[str, Any]) -> Tuple:
+        timestamp = entry.get("timestamp") or datetime.now().isoformat()
+        cache_hit = entry.get("cache_hit")
+        return (
+            datetime.fromisoformat(timestamp).timestamp(),
+            timestamp,
+            timestamp[:10],
+            entry.get("query", ""),
+            entry.get("answer", ""),
+            entry.get("tokens_used", 0),
+            entry.get("latency_ms", 0.0),
+            entry.get("ttft_ms"),
+            None if cache_hit is None else int(cache_hit),
+            entry.get("cost_usd"),
+            entry.get("citations_count", 0),
+            entry.get("input_file"),
+            entry.get("model_name"),
+            json.dumps(entry, ensure_ascii=False)
+        )
+
+
+def create_history_store(path: Optional[str] = None) -> HistoryStore:
+    return HistoryStore(path or os.getenv('HISTORY_DB_PATH', 'qa_history.db'))
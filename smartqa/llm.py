@@ -1,20 +1,88 @@
+import asyncio
 import os
 import time
 import requests
 import json
-from typing import Any
+from typing import Any, Callable, Optional
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from . import tracing
+from .answer_cache import AnswerCache
 from .chunker import Chunk
+from .context import ContextPacker, count_tokens
 from .logger import QALogger
+from .response_cache import ResponseCache
+
+
+GENERATION_OPTIONS = {
+    "temperature": 0.3,
+    "num_predict": 100
+}
 
 
 class LLMResponseGenerator:
-    
-    def __init__(self, model: str = None, base_url: str = "http://localhost:11434"):
+
+    def __init__(self, model: str = None, base_url: str = "http://localhost:11434", timeout: float = None,
+                 pool_size: int = None, max_retries: int = None, logger: QALogger = None,
+                 answer_cache: Optional[AnswerCache] = None, response_cache: Optional[ResponseCache] = None,
+                 context_packer: Optional[ContextPacker] = None):
         self.model = model or os.getenv('OLLAMA_MODEL', 'llama2')
         self.base_url = base_url
-        self.logger = QALogger()
+        self.timeout = timeout if timeout is not None else float(os.getenv('OLLAMA_TIMEOUT', '45'))
+        self.logger = logger or QALogger()
+        self.answer_cache = answer_cache
+        self.response_cache = response_cache
+        # Prompt evaluation time grows with prompt length, so the context is kept to a token budget
+        self.context_packer = context_packer or ContextPacker()
+        
+        pool_size = pool_size if pool_size is not None else int(os.getenv('OLLAMA_POOL_SIZE', '4'))
+        max_retries = max_retries if max_retries is not None else int(os.getenv('OLLAMA_MAX_RETRIES', '2'))
+        if pool_size <= 0:
+            raise ValueError("pool_size must be positive")
+        if max_retries < 0:
+            raise ValueError("max_retries must not be negative")
+        
+        # One keep-alive session per generator; reuse the generator across questions
+        # so each call doesn't pay TCP connection setup
+        # Generation isn't idempotent: a read timeout means Ollama is still working on the
+        # prompt, so only failed connections and busy/gateway statuses are retried
+        retry = Retry(
+            total=max_retries,
+            connect=max_retries,
+            read=0,
+            status=max_retries,
+            backoff_factor=0.5,
+            status_forcelist=[502, 503, 504],
+            allowed_methods=["POST"],
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+    
+    def close(self) -> None:
+        self.session.close()
+        self.logger.flush()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        self.close()
 
-    def generate_response(self, query: str, relevant_chunks: list[tuple[Chunk, float]], input_file: str = "unknown") -> dict[str, Any]:
+    def generate_response(self, query: str, relevant_chunks: list[tuple[Chunk, float]], input_file: str = "unknown",
+                          on_token: Optional[Callable[[str], None]] = None, index_fingerprint: Optional[str] = None,
+                          query_embedding=None) -> dict[str, Any]:
+        # Stage timings go into the caller's trace when it has one, so the log
+        # record covers retrieval as well as generation
+        with tracing.ensure_trace() as trace:
+            return self._generate_response(query, relevant_chunks, input_file, on_token, index_fingerprint,
+                                           query_embedding, trace)
+    
+    def _generate_response(self, query: str, relevant_chunks: list[tuple[Chunk, float]], input_file: str,
+                           on_token: Optional[Callable[[str], None]], index_fingerprint: Optional[str],
+                           query_embedding, trace: tracing.Trace) -> dict[str, Any]:
         start_time = time.time()
         
         if not relevant_chunks:
@@ -25,55 +93,53 @@ class LLMResponseGenerator:
                 "latency_ms": 0
             }
 
-        context = self._build_context(relevant_chunks)
-        prompt = (
-            "You are a document Q&A assistant. Your job is to answer questions based ONLY on the provided context.\n\n"
-            "CRITICAL: If the question is about ANYTHING not explicitly mentioned in the context below, respond with:\n"
-            "'I don't have information about this topic in the provided document.'\n\n"
-            "This includes:\n"
-            "- Personal questions (What's your favorite color?)\n"
-            "- External facts (What's the weather in Uganda?)\n"
-            "- Opinions (What do you think about...?)\n"
-            "- Current events (What happened yesterday?)\n"
-            "- Any topic not in the document\n\n"
-            "Format: Under 50 words, 1-2 sentences, English only.\n\n"
-            f"Context:\n{context}\n\n"
-            f"Question: {query}\n\n"
-            "Answer:"
-        )
+        # Citations only list the chunks that made it into the prompt
+        with tracing.span("prompt_build"):
+            packed = self.context_packer.pack(query, relevant_chunks)
+        relevant_chunks = [(chunk, score) for chunk, score, _ in packed]
+        
+        cache_key = None
+        if self.answer_cache is not None and index_fingerprint:
+            cache_key = AnswerCache.make_key(index_fingerprint, self.model, [chunk.uid for chunk, _ in relevant_chunks])
+            answer = self.answer_cache.get(cache_key, query, query_embedding)
+            if answer is not None:
+                return self._cached_response(query, answer, relevant_chunks, input_file, on_token, start_time, trace)
+        
+        with tracing.span("prompt_build"):
+            context = self._build_context(packed)
+            prompt = (
+                "You are a document Q&A assistant. Your job is to answer questions based ONLY on the provided context.\n\n"
+                "CRITICAL: If the question is about ANYTHING not explicitly mentioned in the context below, respond with:\n"
+                "'I don't have information about this topic in the provided document.'\n\n"
+                "This includes:\n"
+                "- Personal questions (What's your favorite color?)\n"
+                "- External facts (What's the weather in Uganda?)\n"
+                "- Opinions (What do you think about...?)\n"
+                "- Current events (What happened yesterday?)\n"
+                "- Any topic not in the document\n\n"
+                "Format: Under 50 words, 1-2 sentences, English only.\n\n"
+                f"Context:\n{context}\n\n"
+                f"Question: {query}\n\n"
+                "Answer:"
+            )
 
         try:
-            response = requests.post(
-                f"{self.base_url}/api/generate",
-                json={
-                    "model": self.model,
-                    "prompt": prompt,
-                    "stream": False,
-                    "options": {
-                        "temperature": 0.3,
-                        "num_predict": 100
-                    }
-                },
-                timeout=45
-            )
-            
-            if response.status_code == 200:
-                result = response.json()
-                answer = result.get("response", "").strip()
-                tokens_used = result.get("eval_count", 0)
-                
-                if not answer or answer.lower().startswith("i don't have") or "no information" in answer.lower():
-                    answer = "I don't have information about this topic in the provided document."
+            result = self._cached_generate(prompt, on_token)
+            if on_token is None:
+                ttft_ms = None
             else:
-                raise Exception(f"Ollama API error: {response.status_code}")
+                ttft_ms = (result["first_token_time"] - start_time) * 1000 if result["first_token_time"] else None
+            
+            answer = result.get("response", "").strip()
+            tokens_used = result.get("eval_count", 0)
             
-            citations = []
-            for chunk, score in relevant_chunks:
-                citations.append({
-                    "chunk_id": chunk.id,
-                    "text": chunk.text[:100] + "..." if len(chunk.text) > 100 else chunk.text,
-                    "relevance_score": round(score, 3)
-                })
+            if not answer or answer.lower().startswith("i don't have") or "no information" in answer.lower():
+                answer = "I don't have information about this topic in the provided document."
+            
+            citations = self._citations(relevant_chunks)
+            # The fallback above also covers a truncated or empty generation, which mustn't outlive this request
+            if cache_key is not None and result.get("done") and result.get("response", "").strip():
+                self.answer_cache.put(cache_key, query, answer, query_embedding)
             
             latency_ms = (time.time() - start_time) * 1000
             
@@ -84,16 +150,23 @@ class LLMResponseGenerator:
                 latency_ms=latency_ms,
                 citations=citations,
                 input_file=input_file,
-                model_name=self.model
+                model_name=self.model,
+                ttft_ms=ttft_ms,
+                cache_hit=False if cache_key is not None else None,
+                spans=trace.snapshot()
             )
             
             return {
                 "answer": answer,
                 "citations": citations,
                 "tokens_used": tokens_used,
-                "latency_ms": round(latency_ms, 2)
+                "latency_ms": round(latency_ms, 2),
+                "ttft_ms": round(ttft_ms, 2) if ttft_ms is not None else None,
+                "response_cache_hit": result.get("cached", False),
+                "context_tokens": count_tokens(context),
+                "spans": trace.snapshot()
             }
-            
+        
         except Exception as e:
             latency_ms = (time.time() - start_time) * 1000
             
@@ -104,7 +177,8 @@ class LLMResponseGenerator:
                 latency_ms=latency_ms,
                 citations=[],
                 input_file=input_file,
-                model_name=self.model
+                model_name=self.model,
+                spans=trace.snapshot()
             )
             
             return {
@@ -114,10 +188,147 @@ class LLMResponseGenerator:
                 "latency_ms": round(latency_ms, 2)
             }
     
-    def _build_context(self, relevant_chunks: list[tuple[Chunk, float]]) -> str:
+    async def agenerate_response(self, query: str, relevant_chunks: list[tuple[Chunk, float]], input_file: str = "unknown",
+                                 on_token: Optional[Callable[[str], None]] = None, index_fingerprint: Optional[str] = None,
+                                 query_embedding=None) -> dict[str, Any]:
+        # The pooled session is shared by the worker threads, so size the pool
+        # to the number of requests awaited at once
+        return await asyncio.to_thread(self.generate_response, query, relevant_chunks, input_file, on_token,
+                                       index_fingerprint, query_embedding)
+    
+    def _cached_response(self, query: str, answer: str, relevant_chunks: list[tuple[Chunk, float]], input_file: str,
+                         on_token: Optional[Callable[[str], None]], start_time: float,
+                         trace: tracing.Trace) -> dict[str, Any]:
+        if on_token is not None:
+            on_token(answer)
+        
+        citations = self._citations(relevant_chunks)
+        latency_ms = (time.time() - start_time) * 1000
+        
+        self.logger.log_interaction(
+            query=query,
+            answer=answer,
+            tokens_used=0,
+            latency_ms=latency_ms,
+            citations=citations,
+            input_file=input_file,
+            model_name=self.model,
+            cache_hit=True,
+            spans=trace.snapshot()
+        )
+        
+        return {
+            "answer": answer,
+            "citations": citations,
+            "tokens_used": 0,
+            "latency_ms": round(latency_ms, 2),
+            "cache_hit": True,
+            "spans": trace.snapshot()
+        }
+    
+    @staticmethod
+    def _citations(relevant_chunks: list[tuple[Chunk, float]]) -> list[dict[str, Any]]:
+        citations = []
+        for chunk, score in relevant_chunks:
+            citations.append({
+                "chunk_id": chunk.id,
+                "doc_id": chunk.doc_id,
+                "text": chunk.text[:100] + "..." if len(chunk.text) > 100 else chunk.text,
+                "relevance_score": round(score, 3),
+                "start": chunk.start,
+                "end": chunk.end
+            })
+        return citations
+    
+    def _cached_generate(self, prompt: str, on_token: Optional[Callable[[str], None]]) -> dict[str, Any]:
+        if self.response_cache is None:
+            result = self._generate(prompt) if on_token is None else self._generate_stream(prompt, on_token)
+            self._record_ollama_timings(result)
+            return result
+        
+        key = ResponseCache.make_key(self.model, prompt, GENERATION_OPTIONS)
+        cached = self.response_cache.get(key)
+        if cached is not None:
+            # Nothing is generated, so no tokens are spent; a stream gets the whole answer at once
+            if on_token is not None and cached["response"]:
+                on_token(cached["response"])
+            return {"response": cached["response"], "eval_count": 0, "first_token_time": time.time(), "cached": True,
+                    "done": True}
+        
+        result = self._generate(prompt) if on_token is None else self._generate_stream(prompt, on_token)
+        self._record_ollama_timings(result)
+        # A stream cut off before its done line, or an empty answer, would be replayed forever
+        if result.get("done") and result.get("response", "").strip():
+            self.response_cache.put(key, self.model, {"response": result["response"],
+                                                      "eval_count": result.get("eval_count", 0)})
+        return result
+    
+    @staticmethod
+    def _record_ollama_timings(result: dict[str, Any]) -> None:
+        # Ollama reports where its time went in nanoseconds; the rest of the http span is transfer and queueing
+        for stage, field in (("ollama_load", "load_duration"), ("ollama_prompt_eval", "prompt_eval_duration"),
+                             ("ollama_eval", "eval_duration")):
+            if result.get(field) is not None:
+                tracing.record(stage, result[field] / 1e6)
+    
+    def _generate(self, prompt: str) -> dict[str, Any]:
+        with tracing.span("http"):
+            response = self.session.post(
+                f"{self.base_url}/api/generate",
+                json=self._payload(prompt, stream=False),
+                timeout=self.timeout
+            )
+        
+        if response.status_code != 200:
+            raise Exception(f"Ollama API error: {response.status_code}")
+        return response.json()
+    
+    def _generate_stream(self, prompt: str, on_token: Callable[[str], None]) -> dict[str, Any]:
+        # Ollama streams one JSON object per line; the last one (done=true) carries the counters
+        with tracing.span("http"), self.session.post(
+            f"{self.base_url}/api/generate",
+            json=self._payload(prompt, stream=True),
+            timeout=self.timeout,
+            stream=True
+        ) as response:
+            if response.status_code != 200:
+                raise Exception(f"Ollama API error: {response.status_code}")
+            
+            parts = []
+            result = {}
+            first_token_time = None
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                result = json.loads(line)
+                if result.get("error"):
+                    raise Exception(f"Ollama API error: {result['error']}")
+                
+                token = result.get("response", "")
+                if token:
+                    if first_token_time is None:
+                        first_token_time = time.time()
+                    parts.append(token)
+                    on_token(token)
+                if result.get("done"):
+                    break
+        
+        result["response"] = "".join(parts)
+        result["first_token_time"] = first_token_time
+        return result
+    
+    def _payload(self, prompt: str, stream: bool) -> dict[str, Any]:
+        return {
+            "model": self.model,
+            "prompt": prompt,
+            "stream": stream,
+            "options": GENERATION_OPTIONS
+        }
+    
+    def _build_context(self, packed: list[tuple[Chunk, float, str]]) -> str:
         context_parts = []
-        for i, (chunk, score) in enumerate(relevant_chunks, 1):
-            context_parts.append(f"[{i}] {chunk.text}")
+        for i, (chunk, score, text) in enumerate(packed, 1):
+            context_parts.append(f"[{i}] {text}")
         return "\n\n".join(context_parts)
     
     def print_stats(self) -> None:
@@ -1,15 +1,57 @@
+import atexit
+import gzip
+import hashlib
 import json
+import os
+import shutil
+import threading
 import time
+from contextlib import contextmanager
 from datetime import datetime
-from typing import Dict, Any, Optional
+from typing import Dict, Any, BinaryIO, Iterator, List, Optional, Tuple
 from pathlib import Path
+from .stats import StatsAggregate
+
+try:
+    import fcntl
+except ImportError:
+    # Without flock, writes are only serialised within one process
+    fcntl = None
 
 
 class QALogger:
-    
-    def __init__(self, log_file: str = "qa_history.jsonl"):
+
+    def __init__(self, log_file: str = "qa_history.jsonl", flush_interval: float = 0.0, buffer_size: int = 256,
+                 max_bytes: int = 0, rotate_interval: float = 0.0, compress: bool = False):
+        if flush_interval < 0 or max_bytes < 0 or rotate_interval < 0:
+            raise ValueError("flush_interval, max_bytes and rotate_interval must not be negative")
+        if buffer_size <= 0:
+            raise ValueError("buffer_size must be positive")
+        
         self.log_file = Path(log_file)
         self.log_file.parent.mkdir(exist_ok=True)
+        # 0 writes every interaction before returning; otherwise entries are buffered and a
+        # background thread appends them every flush_interval seconds or once buffer_size are queued
+        self.flush_interval = flush_interval
+        self.buffer_size = buffer_size
+        # The active file is moved aside once it would exceed max_bytes or its first entry
+        # is older than rotate_interval seconds; 0 disables either rule
+        self.max_bytes = max_bytes
+        self.rotate_interval = rotate_interval
+        self.compress = compress
+        
+        # Interactions may be logged from several pipeline workers at once
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._buffer: List[str] = []
+        self._started: Optional[Tuple[int, float]] = None
+        self._wakeup = threading.Event()
+        self._closed = False
+        self._thread = None
+        if flush_interval:
+            self._thread = threading.Thread(target=self._flush_loop, name="qa-logger-flush", daemon=True)
+            self._thread.start()
+            atexit.register(self.close)
     
     def log_interaction(
         self,
@@ -20,7 +62,10 @@ class QALogger:
         citations: list,
         input_file: str,
         model_name: str = "llama2",
-        cost_usd: Optional[float] = None
+        cost_usd: Optional[float] = None,
+        ttft_ms: Optional[float] = None,
+        cache_hit: Optional[bool] = None,
+        spans: Optional[Dict[str, float]] = None
     ) -> None:
         log_entry = {
             "timestamp": datetime.now().isoformat(),
@@ -36,21 +81,279 @@ class QALogger:
             "query_length": len(query)
         }
         
+        if ttft_ms is not None:
+            log_entry["ttft_ms"] = round(ttft_ms, 2)
+        if cache_hit is not None:
+            log_entry["cache_hit"] = cache_hit
+        if spans:
+            log_entry["spans"] = spans
+        
         if citations:
             log_entry["citations"] = [
                 {
                     "chunk_id": cit.get("chunk_id", "unknown"),
+                    "doc_id": cit.get("doc_id"),
                     "relevance_score": cit.get("relevance_score", 0.0),
                     "text_preview": cit.get("text", "")[:100] + "..." if len(cit.get("text", "")) > 100 else cit.get("text", "")
                 }
                 for cit in citations
             ]
         
-        with open(self.log_file, "a", encoding="utf-8") as f:
-            f.write(json.dumps(log_entry, ensure_ascii=False) + "\n")
+        line = json.dumps(log_entry, ensure_ascii=False) + "\n"
+        if not self._thread:
+            self._write([line])
+            return
+        
+        with self._lock:
+            self._buffer.append(line)
+            full = len(self._buffer) >= self.buffer_size
+        if full:
+            self._wakeup.set()
+    
+    def flush(self) -> None:
+        with self._lock:
+            lines, self._buffer = self._buffer, []
+        if not lines:
+            return
+        try:
+            self._write(lines)
+        except OSError:
+            # Kept for the next flush rather than dropped
+            with self._lock:
+                self._buffer[:0] = lines
+            raise
+    
+    def close(self) -> None:
+        if self._thread is not None:
+            self._closed = True
+            self._wakeup.set()
+            self._thread.join()
+            self._thread = None
+            atexit.unregister(self.close)
+        self.flush()
+    
+    def segments(self) -> List[Path]:
+        # Rotated segments oldest first, then the active file; a segment caught between
+        # gzip and the removal of the original is listed once, under its .gz name
+        pattern = f"{self.log_file.stem}.*{self.log_file.suffix}"
+        rotated = {}
+        for path in list(self.log_file.parent.glob(pattern)) + list(self.log_file.parent.glob(pattern + ".gz")):
+            if path != self.log_file:
+                rotated[self._segment_name(path)] = path
+        paths = [rotated[name] for name in sorted(rotated)]
+        if self.log_file.exists():
+            paths.append(self.log_file)
+        return paths
+    
+    def _flush_loop(self) -> None:
+        while not self._closed:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except OSError:
+                pass
+    
+    def _write(self, lines: List[str]) -> None:
+        data = "".join(lines).encode("utf-8")
+        rotated = None
+        with self._write_lock:
+            while True:
+                with self._open_active() as f:
+                    if self._should_rotate(f, len(data)):
+                        rotated = self._rotate()
+                        continue
+                    # One write per flush, so entries from other processes never interleave with it
+                    size = os.fstat(f.fileno()).st_size
+                    f.write(data)
+                    self._advance_checkpoint(size, data)
+                    break
+        
+        if rotated is not None and self.compress:
+            self._compress(rotated)
+    
+    @contextmanager
+    def _open_active(self) -> Iterator[BinaryIO]:
+        while True:
+            f = open(self.log_file, "ab")
+            try:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_EX)
+                # Another process may have rotated the file while this one waited for the lock
+                if self._is_active(f):
+                    yield f
+                    return
+            finally:
+                f.close()
+    
+    def _is_active(self, f) -> bool:
+        try:
+            return os.fstat(f.fileno()).st_ino == os.stat(self.log_file).st_ino
+        except FileNotFoundError:
+            return False
+    
+    def _should_rotate(self, f, size: int) -> bool:
+        stat = os.fstat(f.fileno())
+        if not stat.st_size:
+            return False
+        if self.max_bytes and stat.st_size + size > self.max_bytes:
+            return True
+        if self.rotate_interval:
+            if self._started is None or self._started[0] != stat.st_ino:
+                self._started = (stat.st_ino, self._first_timestamp())
+            return time.time() - self._started[1] > self.rotate_interval
+        return False
+    
+    def _first_timestamp(self) -> float:
+        with open(self.log_file, "r", encoding="utf-8") as f:
+            try:
+                return datetime.fromisoformat(json.loads(f.readline())["timestamp"]).timestamp()
+            except (ValueError, KeyError):
+                return time.time()
+    
+    def _rotate(self) -> Path:
+        # Timestamped names sort in rotation order
+        target = self.log_file.with_name(f"{self.log_file.stem}.{datetime.now():%Y%m%d-%H%M%S-%f}{self.log_file.suffix}")
+        os.replace(self.log_file, target)
+        self._started = None
+        return target
+    
+    @staticmethod
+    def _compress(path: Path) -> None:
+        tmp_path = path.with_name(path.name + ".gz.tmp")
+        with open(path, "rb") as source, gzip.open(tmp_path, "wb") as target:
+            shutil.copyfileobj(source, target)
+        os.replace(tmp_path, path.with_name(path.name + ".gz"))
+        path.unlink()
+    
+    @staticmethod
+    def _open_segment(path: Path) -> BinaryIO:
+        if path.suffix == ".gz":
+            return gzip.open(path, "rb")
+        try:
+            return open(path, "rb")
+        except FileNotFoundError:
+            # Compressed by another writer since it was listed; offsets are the same in both
+            return gzip.open(path.with_name(path.name + ".gz"), "rb")
+    
+    @property
+    def checkpoint_file(self) -> Path:
+        return self.log_file.with_name(self.log_file.name + ".stats.json")
+    
+    def _load_checkpoint(self) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self.checkpoint_file, "r", encoding="utf-8") as f:
+                checkpoint = json.load(f)
+            checkpoint["aggregate"] = StatsAggregate.from_dict(checkpoint["aggregate"])
+            return checkpoint
+        except (OSError, ValueError, KeyError):
+            return None
+    
+    def _save_checkpoint(self, checkpoint: Dict[str, Any]) -> None:
+        data = {**checkpoint, "aggregate": checkpoint["aggregate"].to_dict()}
+        tmp_path = self.checkpoint_file.with_name(self.checkpoint_file.name + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        tmp_path.replace(self.checkpoint_file)
+    
+    def _catch_up(self) -> StatsAggregate:
+        # The checkpoint holds aggregates over fully read rotated segments, plus the active file
+        # up to `offset`; the file is recognised by its first line since rotation and gzip change
+        # its name and inode. Runs under the log file lock.
+        segments = self.segments()
+        rotated = [path for path in segments if path != self.log_file]
+        names = {self._segment_name(path) for path in rotated}
+        active_head = self.segment_id(self.log_file)
+        
+        checkpoint = self._load_checkpoint()
+        if checkpoint is not None:
+            head = checkpoint["head"]
+            consumed = set(checkpoint["rotated"])
+            tracked_rotated = [path for path in rotated
+                               if self._segment_name(path) not in consumed and self.segment_id(path) == head]
+            tracked_active = head is not None and head == active_head and self.log_file.stat().st_size >= checkpoint["offset"]
+            # Counted entries must still be on disk, otherwise the aggregates can't be trusted
+            if not consumed <= names or (head is not None and not tracked_rotated and not tracked_active):
+                checkpoint = None
+        if checkpoint is None:
+            checkpoint = {"rotated": [], "head": None, "offset": 0, "aggregate": StatsAggregate()}
+        
+        aggregate = checkpoint["aggregate"]
+        consumed = set(checkpoint["rotated"])
+        head, offset = checkpoint["head"], checkpoint["offset"]
+        for path in rotated:
+            if self._segment_name(path) in consumed:
+                continue
+            start = offset if head is not None and self.segment_id(path) == head else 0
+            self._scan(path, start, aggregate)
+            consumed.add(self._segment_name(path))
+            if start:
+                head, offset = None, 0
+        
+        start = offset if head is not None and head == active_head else 0
+        end = self._scan(self.log_file, start, aggregate) if self.log_file.exists() else 0
+        
+        self._save_checkpoint({
+            "rotated": sorted(consumed),
+            "head": active_head,
+            "offset": end,
+            "aggregate": aggregate
+        })
+        return aggregate
+    
+    def _advance_checkpoint(self, size: int, data: bytes) -> None:
+        # Called with the lock held right after an append; keeps an existing checkpoint current
+        # when it had read everything before the append, so the next get_stats scans nothing
+        if not self.checkpoint_file.exists():
+            return
+        checkpoint = self._load_checkpoint()
+        if checkpoint is None or not size or checkpoint["offset"] != size or checkpoint["head"] != self.segment_id(self.log_file):
+            return
+        
+        for line in data.splitlines():
+            if line.strip():
+                checkpoint["aggregate"].add(json.loads(line))
+        checkpoint["offset"] = size + len(data)
+        self._save_checkpoint(checkpoint)
+    
+    def _scan(self, path: Path, start: int, aggregate: StatsAggregate) -> int:
+        # Returns the offset after the last complete line read
+        offset = start
+        for offset, entry in self.read_segment(path, start):
+            aggregate.add(entry)
+        return offset
+    
+    def read_segment(self, path: Path, start: int = 0) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        # (offset after the entry, entry) for each complete line from `start`; offsets are
+        # into the uncompressed text, so they stay valid once a segment is gzipped
+        with self._open_segment(path) as f:
+            f.seek(start)
+            offset = start
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                offset += len(line)
+                if line.strip():
+                    yield offset, json.loads(line)
+    
+    def segment_id(self, path: Path) -> Optional[str]:
+        # Hash of the first line, which survives rotation and compression
+        try:
+            with self._open_segment(path) as f:
+                line = f.readline()
+        except FileNotFoundError:
+            return None
+        if not line.endswith(b"\n"):
+            return None
+        return hashlib.sha256(line).hexdigest()
+    
+    @staticmethod
+    def _segment_name(path: Path) -> str:
+        return path.name[:-3] if path.suffix == ".gz" else path.name
     
     def get_stats(self) -> Dict[str, Any]:
-        if not self.log_file.exists():
+        self.flush()
+        if not self.segments():
             return {
                 "total_interactions": 0,
                 "total_tokens": 0,
@@ -58,30 +361,14 @@ class QALogger:
                 "avg_latency_ms": 0.0
             }
         
-        total_interactions = 0
-        total_tokens = 0
-        total_cost = 0.0
-        total_latency = 0.0
-        
-        with open(self.log_file, "r", encoding="utf-8") as f:
-            for line in f:
-                if line.strip():
-                    entry = json.loads(line)
-                    total_interactions += 1
-                    total_tokens += entry.get("tokens_used", 0)
-                    
-                    cost = entry.get("cost_usd")
-                    if cost is not None:
-                        total_cost += cost
-                    
-                    total_latency += entry.get("latency_ms", 0.0)
+        # Only entries appended since the checkpoint are parsed, so this doesn't slow down as history grows
+        with self._write_lock, self._open_active():
+            aggregate = self._catch_up()
         
         return {
-            "total_interactions": total_interactions,
-            "total_tokens": total_tokens,
-            "total_cost_usd": round(total_cost, 4),
-            "avg_latency_ms": round(total_latency / max(total_interactions, 1), 2),
-            "log_file": str(self.log_file)
+            **aggregate.summary(),
+            "log_file": str(self.log_file),
+            "log_segments": len(self.segments())
         }
     
     def print_stats(self) -> None:
@@ -93,5 +380,27 @@ class QALogger:
         print(f"Total tokens used: {stats['total_tokens']:,}")
         print(f"Total cost: ${stats['total_cost_usd']:.4f}")
         print(f"Average latency: {stats['avg_latency_ms']}ms")
+        if stats.get("latency_p50_ms") is not None:
+            print(f"Latency p50/p95/p99: {stats['latency_p50_ms']}ms / {stats['latency_p95_ms']}ms / {stats['latency_p99_ms']}ms")
+        if stats.get("avg_ttft_ms") is not None:
+            print(f"Average time to first token: {stats['avg_ttft_ms']}ms")
+        if stats.get("answer_cache_hit_rate") is not None:
+            print(f"Answer cache hits: {stats['answer_cache_hits']} ({stats['answer_cache_hit_rate']:.1%})")
+        if stats.get("stage_latency_ms"):
+            print("Stage latency p50 / p95 / p99:")
+            for stage, timing in stats["stage_latency_ms"].items():
+                print(f"  {stage:<20} {timing['p50']}ms / {timing['p95']}ms / {timing['p99']}ms ({timing['count']} calls)")
         print(f"Log file: {stats['log_file']}")
         print("=" * 40)
+
+
+def create_logger(log_file: str = "qa_history.jsonl") -> QALogger:
+    # For the CLI and web app: logging stays off the request path unless QA_LOG_FLUSH_INTERVAL is 0
+    return QALogger(
+        log_file,
+        flush_interval=float(os.getenv('QA_LOG_FLUSH_INTERVAL', '1.0')),
+        buffer_size=int(os.getenv('QA_LOG_BUFFER_SIZE', '256')),
+        max_bytes=int(os.getenv('QA_LOG_MAX_BYTES', '0')),
+        rotate_interval=float(os.getenv('QA_LOG_ROTATE_SECONDS', '0')),
+        compress=os.getenv('QA_LOG_COMPRESS', '').lower() in ('1', 'true', 'yes')
+    )
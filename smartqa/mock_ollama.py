@@ -0,0 +1,277 @@
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Optional, Union
+
+DEFAULT_ANSWER = "Machine learning allows computers to learn from data without being explicitly programmed."
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; with Nagle on, keep-alive requests stall on delayed ACKs
+    disable_nagle_algorithm = True
+    
+    def do_GET(self):
+        if self.path == "/":
+            self._send(200, b"Ollama is running", "text/plain")
+        else:
+            self._send_json(404, {"error": "not found"})
+    
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if self.path != "/api/generate":
+            self._send_json(404, {"error": "not found"})
+            return
+        try:
+            request = json.loads(body or b"{}")
+        except json.JSONDecodeError:
+            self._send_json(400, {"error": "invalid JSON"})
+            return
+        self.server.mock.handle(self, request)
+    
+    def _send(self, status: int, payload: bytes, content_type: str) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+    
+    def _send_json(self, status: int, data: Dict[str, Any]) -> None:
+        self._send(status, json.dumps(data).encode("utf-8"), "application/json")
+    
+    def _start_stream(self) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+    
+    def _send_line(self, data: Dict[str, Any]) -> None:
+        line = json.dumps(data).encode("utf-8") + b"\n"
+        self.wfile.write(f"{len(line):x}\r\n".encode("ascii") + line + b"\r\n")
+    
+    def _end_stream(self) -> None:
+        self.wfile.write(b"0\r\n\r\n")
+    
+    def log_message(self, format, *args):
+        pass
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    
+    def handle_error(self, request, client_address):
+        # Clients that time out hang up mid-response; that is expected under test
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class MockOllama:
+    # A stand-in for Ollama's /api/generate with controllable timing and failures, for
+    # tests and load tests that shouldn't depend on a model; use it as a context manager
+    # or call start() and stop()
+    
+    def __init__(self, host: str = "127.0.0.1", port: int = 0,
+                 answer: Union[str, Callable[[str], str]] = DEFAULT_ANSWER, load_delay_ms: float = 0.0,
+                 prompt_delay_ms: float = 0.0, token_delay_ms: float = 0.0, failure_rate: float = 0.0,
+                 failure_status: int = 500, max_concurrency: Optional[int] = None, max_queue: Optional[int] = None,
+                 seed: Optional[int] = None):
+        if not 0.0 <= failure_rate <= 1.0:
+            raise ValueError("failure_rate must be between 0 and 1")
+        if max_concurrency is not None and max_concurrency <= 0:
+            raise ValueError("max_concurrency must be positive")
+        if max_queue is not None and max_queue < 0:
+            raise ValueError("max_queue must not be negative")
+        
+        self.answer = answer
+        # Paid once per request before evaluation, like a model that was unloaded
+        self.load_delay = load_delay_ms / 1000
+        # Time to the first token, like prompt evaluation
+        self.prompt_delay = prompt_delay_ms / 1000
+        self.token_delay = token_delay_ms / 1000
+        self.failure_rate = failure_rate
+        self.failure_status = failure_status
+        self.random = random.Random(seed)
+        
+        # Like OLLAMA_NUM_PARALLEL and OLLAMA_MAX_QUEUE: requests beyond max_concurrency wait
+        # their turn, and once max_queue are waiting the rest get 503 straight away
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue if max_concurrency else None
+        self.slots = threading.Semaphore(max_concurrency) if max_concurrency else None
+        
+        self.lock = threading.Lock()
+        self.planned_failures: deque = deque()
+        self.requests = 0
+        self.failures = 0
+        self.rejected = 0
+        self.waiting = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.last_request: Optional[Dict[str, Any]] = None
+        
+        self.server = _Server((host, port), _Handler)
+        self.server.mock = self
+        self.thread: Optional[threading.Thread] = None
+    
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+    
+    def start(self) -> "MockOllama":
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+    
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+        if self.thread is not None:
+            self.thread.join()
+    
+    def __enter__(self):
+        return self.start()
+    
+    def __exit__(self, *exc):
+        self.stop()
+    
+    def fail_next(self, count: int = 1, status: Optional[int] = None) -> None:
+        # Deterministic failures for the next requests, ahead of failure_rate
+        with self.lock:
+            self.planned_failures.extend([status or self.failure_status] * count)
+    
+    def get_stats(self) -> Dict[str, int]:
+        with self.lock:
+            return {
+                "requests": self.requests,
+                "failures": self.failures,
+                "rejected": self.rejected,
+                "max_in_flight": self.max_in_flight
+            }
+    
+    def handle(self, handler: _Handler, request: Dict[str, Any]) -> None:
+        with self.lock:
+            self.requests += 1
+            self.last_request = request
+            status = self.planned_failures.popleft() if self.planned_failures else None
+            if status is None and self.failure_rate and self.random.random() < self.failure_rate:
+                status = self.failure_status
+            if status is not None:
+                self.failures += 1
+            elif self.max_queue is not None and self.waiting >= self.max_queue and self.in_flight >= self.max_concurrency:
+                status = 503
+                self.rejected += 1
+            else:
+                self.waiting += 1
+        
+        if status is not None:
+            handler._send_json(status, {"error": "server busy, please try again" if status == 503
+                                        else "injected failure"})
+            return
+        
+        if self.slots is not None:
+            self.slots.acquire()
+        with self.lock:
+            self.waiting -= 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            self._generate(handler, request)
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+            if self.slots is not None:
+                self.slots.release()
+    
+    def _generate(self, handler: _Handler, request: Dict[str, Any]) -> None:
+        prompt = request.get("prompt", "")
+        answer = self.answer(prompt) if callable(self.answer) else self.answer
+        words = answer.split(" ")
+        tokens = [word if i == 0 else " " + word for i, word in enumerate(words)] if answer else []
+        
+        start = time.perf_counter()
+        time.sleep(self.load_delay)
+        loaded = time.perf_counter()
+        time.sleep(self.prompt_delay)
+        evaluated = time.perf_counter()
+        
+        def final() -> Dict[str, Any]:
+            # Durations in nanoseconds, as Ollama reports them
+            end = time.perf_counter()
+            return {
+                "model": request.get("model"),
+                "created_at": datetime.now(timezone.utc).isoformat(),
+                "response": "",
+                "done": True,
+                "done_reason": "stop",
+                "total_duration": int((end - start) * 1e9),
+                "load_duration": int((loaded - start) * 1e9),
+                "prompt_eval_count": max(1, len(prompt) // 4),
+                "prompt_eval_duration": int((evaluated - loaded) * 1e9),
+                "eval_count": len(tokens),
+                "eval_duration": int((end - evaluated) * 1e9)
+            }
+        
+        if not request.get("stream", True):
+            time.sleep(self.token_delay * len(tokens))
+            handler._send_json(200, {**final(), "response": answer})
+            return
+        
+        handler._start_stream()
+        for token in tokens:
+            time.sleep(self.token_delay)
+            handler._send_line({"model": request.get("model"), "created_at": datetime.now(timezone.utc).isoformat(),
+                                "response": token, "done": False})
+        handler._send_line(final())
+        handler._end_stream()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Serve a mock Ollama /api/generate for offline and load testing",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+Examples:
+  python -m smartqa.mock_ollama --port 11434 --token-delay-ms 20
+  python -m smartqa.mock_ollama --prompt-delay-ms 200 --max-concurrency 4 --max-queue 8
+  python -m smartqa.mock_ollama --failure-rate 0.1 --failure-status 503
+        """
+    )
+    parser.add_argument("--host", default="127.0.0.1", help="Address to listen on (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=11434, help="Port to listen on (default: 11434)")
+    parser.add_argument("--answer", default=DEFAULT_ANSWER, help="Response returned for every prompt")
+    parser.add_argument("--load-delay-ms", type=float, default=0.0, help="Simulated model load time per request")
+    parser.add_argument("--prompt-delay-ms", type=float, default=0.0, help="Simulated time to the first token")
+    parser.add_argument("--token-delay-ms", type=float, default=0.0, help="Simulated time per generated token")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Share of requests that fail (0-1)")
+    parser.add_argument("--failure-status", type=int, default=500, help="HTTP status of injected failures")
+    parser.add_argument("--max-concurrency", type=int, help="Requests generated at once; the rest wait")
+    parser.add_argument("--max-queue", type=int, help="Waiting requests before new ones get 503")
+    parser.add_argument("--seed", type=int, help="Seed for failure injection")
+    args = parser.parse_args()
+    
+    try:
+        mock = MockOllama(args.host, args.port, args.answer, args.load_delay_ms, args.prompt_delay_ms,
+                          args.token_delay_ms, args.failure_rate, args.failure_status, args.max_concurrency,
+                          args.max_queue, args.seed)
+    except (ValueError, OSError) as e:
+        print(f"❌ Error: {e}")
+        raise SystemExit(1)
+    
+    print(f"🦙 Mock Ollama listening on {mock.url} (Ctrl+C to stop)")
+    try:
+        mock.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        mock.server.server_close()
+        print(f"\n📊 {mock.get_stats()}")
+
+
+if __name__ == "__main__":
+    main()
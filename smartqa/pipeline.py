@@ -0,0 +1,97 @@
+import asyncio
+import os
+from typing import Any, Callable, Dict, List, Optional
+from . import tracing
+from .llm import LLMResponseGenerator
+from .reranker import Reranker
+from .retriever import Retriever
+
+
+class QAPipeline:
+
+    def __init__(self, retriever: Retriever, llm: LLMResponseGenerator, k: int = 3, min_score: Optional[float] = None,
+                 concurrency: int = 4, reranker: Optional[Reranker] = None, retrieval_batch_size: int = None):
+        retrieval_batch_size = retrieval_batch_size or int(os.getenv('RETRIEVAL_BATCH_SIZE', '32'))
+        if k <= 0:
+            raise ValueError("k must be positive")
+        if concurrency <= 0 or retrieval_batch_size <= 0:
+            raise ValueError("concurrency and retrieval_batch_size must be positive")
+        
+        self.retriever = retriever
+        self.llm = llm
+        self.k = k
+        self.min_score = min_score
+        self.concurrency = concurrency
+        # Questions embedded and searched together in answer_many; one matrix search serves
+        # the whole batch, so it is sized for retrieval rather than for the LLM workers
+        self.retrieval_batch_size = retrieval_batch_size
+        # With a reranker, a wider candidate set is retrieved and cut down to the best k
+        self.reranker = reranker
+    
+    def answer(self, question: str, input_file: str = "unknown",
+               on_token: Optional[Callable[[str], None]] = None) -> Dict[str, Any]:
+        # The query embedding is kept for the LLM's semantic answer cache
+        with tracing.ensure_trace():
+            query_embedding, search_results = self._retrieve_batch([question])
+            search_results = search_results[0]
+            response = self.llm.generate_response(question, search_results, input_file, on_token,
+                                                  self.retriever.fingerprint, query_embedding[0])
+        return {"question": question, "search_results": search_results, "response": response}
+    
+    async def answer_many(self, questions: List[str], input_file: str = "unknown",
+                          on_result: Optional[Callable[[int, Dict[str, Any]], None]] = None) -> List[Dict[str, Any]]:
+        # Retrieval runs a batch ahead of generation; the bounded queue is the
+        # backpressure that stops it from racing further ahead of the LLM workers
+        queue: asyncio.Queue = asyncio.Queue(maxsize=2 * self.concurrency)
+        results: List[Optional[Dict[str, Any]]] = [None] * len(questions)
+        
+        fingerprint = self.retriever.fingerprint
+        
+        async def retrieve():
+            for start in range(0, len(questions), self.retrieval_batch_size):
+                batch = questions[start:start + self.retrieval_batch_size]
+                embeddings, batch_results, spans = await asyncio.to_thread(self._traced_retrieve_batch, batch)
+                for offset, (question, search_results) in enumerate(zip(batch, batch_results)):
+                    await queue.put((start + offset, question, search_results, embeddings[offset], spans))
+            for _ in range(self.concurrency):
+                await queue.put(None)
+        
+        async def generate():
+            while True:
+                item = await queue.get()
+                if item is None:
+                    return
+                
+                index, question, search_results, query_embedding, spans = item
+                # Each task has its own context, and to_thread carries this trace into the LLM call
+                with tracing.start_trace() as trace:
+                    trace.merge(spans)
+                    response = await self.llm.agenerate_response(question, search_results, input_file, None,
+                                                                 fingerprint, query_embedding)
+                results[index] = {"question": question, "search_results": search_results, "response": response}
+                if on_result is not None:
+                    on_result(index, results[index])
+        
+        async with asyncio.TaskGroup() as group:
+            group.create_task(retrieve())
+            for _ in range(self.concurrency):
+                group.create_task(generate())
+        
+        return results
+    
+    def _traced_retrieve_batch(self, questions: List[str]):
+        # Each question is charged its share of the batch, so per-stage stats stay comparable
+        # with single questions and batches don't count their retrieval once per question
+        with tracing.start_trace() as trace:
+            embeddings, results = self._retrieve_batch(questions)
+        spans = {stage: round(ms / len(questions), 2) for stage, ms in trace.snapshot().items()}
+        return embeddings, results, spans
+    
+    def _retrieve_batch(self, questions: List[str]):
+        embeddings = self.retriever.embed_queries(questions)
+        if self.reranker is None:
+            return embeddings, self.retriever.search_vectors(embeddings, self.k, self.min_score, queries=questions)
+        
+        candidates = self.retriever.search_vectors(embeddings, max(self.k, self.reranker.candidates), self.min_score,
+                                                   queries=questions)
+        return embeddings, self.reranker.rerank_batch(questions, candidates, self.k)
@@ -0,0 +1,120 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+from sentence_transformers import CrossEncoder
+from . import tracing
+from .chunker import Chunk
+from .embedder import load_shared_model
+
+DEFAULT_RERANK_MODEL = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+
+
+class Reranker:
+
+    def __init__(self, model_name: Optional[str] = None, candidates: Optional[int] = None, batch_size: int = 16,
+                 time_budget_ms: Optional[float] = None, cache_size: int = 10_000):
+        self.model_name = model_name or os.getenv('RERANK_MODEL', DEFAULT_RERANK_MODEL)
+        self.candidates = candidates if candidates is not None else int(os.getenv('RERANK_CANDIDATES', '20'))
+        if self.candidates <= 0:
+            raise ValueError("candidates must be positive")
+        if batch_size <= 0:
+            raise ValueError("batch_size must be positive")
+        if cache_size < 0:
+            raise ValueError("cache_size must not be negative")
+        
+        self.model = load_shared_model(self.model_name, CrossEncoder)
+        self.batch_size = batch_size
+        # Per query; 0 scores every candidate however long it takes
+        self.time_budget_ms = time_budget_ms if time_budget_ms is not None else float(os.getenv('RERANK_BUDGET_MS', '200'))
+        if self.time_budget_ms < 0:
+            raise ValueError("time_budget_ms must not be negative")
+        
+        # (query, chunk text) -> cross-encoder score, least recently used first; the text
+        # is the chunk's own string, so entries don't copy it
+        self.cache_size = cache_size
+        self.scores: "OrderedDict[Tuple[str, str], float]" = OrderedDict()
+        self.lock = threading.Lock()
+        
+        self.hits = 0
+        self.misses = 0
+        self.truncated = 0
+    
+    def rerank(self, query: str, results: List[Tuple[Chunk, float]], k: int) -> List[Tuple[Chunk, float]]:
+        return self.rerank_batch([query], [results], k)[0]
+    
+    def rerank_batch(self, queries: List[str], results: List[List[Tuple[Chunk, float]]],
+                     k: int) -> List[List[Tuple[Chunk, float]]]:
+        with tracing.span("rerank"):
+            return self._rerank_batch(queries, results, k)
+    
+    def _rerank_batch(self, queries: List[str], results: List[List[Tuple[Chunk, float]]],
+                      k: int) -> List[List[Tuple[Chunk, float]]]:
+        # Pairs from every query share batches, so a pipeline batch costs few model calls
+        scores: List[Dict[int, float]] = [{} for _ in queries]
+        pending: List[Tuple[int, int]] = []
+        with self.lock:
+            for row, (query, candidates) in enumerate(zip(queries, results)):
+                for i, (chunk, _) in enumerate(candidates):
+                    score = self.scores.get((query, chunk.text))
+                    if score is None:
+                        pending.append((row, i))
+                    else:
+                        self.scores.move_to_end((query, chunk.text))
+                        scores[row][i] = score
+            self.hits += sum(len(row) for row in scores)
+            self.misses += len(pending)
+        
+        deadline = time.perf_counter() + self.time_budget_ms * len(queries) / 1000 if self.time_budget_ms else None
+        for start in range(0, len(pending), self.batch_size):
+            if deadline is not None and start and time.perf_counter() >= deadline:
+                # Out of time: the rest keep their retrieval order behind the scored candidates
+                self.truncated += len(pending) - start
+                break
+            
+            batch = pending[start:start + self.batch_size]
+            pairs = [(queries[row], results[row][i][0].text) for row, i in batch]
+            predicted = self.model.predict(pairs, batch_size=self.batch_size, show_progress_bar=False)
+            with self.lock:
+                for (row, i), pair, score in zip(batch, pairs, predicted):
+                    scores[row][i] = float(score)
+                    self._store(pair, float(score))
+        
+        reranked = []
+        for row, candidates in zip(scores, results):
+            order = sorted(range(len(candidates)), key=lambda i: (i not in row, -row.get(i, 0.0), i))
+            # Retrieval scores are kept, so relevance in citations and min_score stay cosine similarities
+            reranked.append([candidates[i] for i in order[:k]])
+        return reranked
+    
+    def clear(self) -> None:
+        with self.lock:
+            self.scores.clear()
+    
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "model_name": self.model_name,
+            "cached_scores": len(self.scores),
+            "hits": self.hits,
+            "misses": self.misses,
+            "truncated": self.truncated,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+        }
+    
+    def _store(self, pair: Tuple[str, str], score: float) -> None:
+        if not self.cache_size:
+            return
+        self.scores[pair] = score
+        self.scores.move_to_end(pair)
+        while len(self.scores) > self.cache_size:
+            self.scores.popitem(last=False)
+
+
+def create_reranker(model_name: Optional[str] = None, candidates: Optional[int] = None) -> Optional[Reranker]:
+    model_name = model_name or os.getenv('RERANK_MODEL')
+    if not model_name:
+        return None
+    
+    return Reranker(model_name, candidates)
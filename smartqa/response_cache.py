@@ -0,0 +1,96 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+
+class ResponseCache:
+
+    def __init__(self, path: str, max_entries: int = 10_000):
+        if max_entries <= 0:
+            raise ValueError("max_entries must be positive")
+        
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        
+        # One connection shared by the pipeline's worker threads, serialised by the lock
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(str(self.path), check_same_thread=False)
+        with self.connection:
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, model TEXT NOT NULL, response TEXT NOT NULL, "
+                "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            self.connection.execute("CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)")
+    
+    @staticmethod
+    def make_key(model: str, prompt: str, options: Dict[str, Any]) -> str:
+        # Everything that changes the generated text is part of the key
+        raw = json.dumps({"model": model, "prompt": prompt, "options": options}, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+    
+    def __len__(self) -> int:
+        with self.lock:
+            return self.connection.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+    
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self.lock:
+            row = self.connection.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            
+            with self.connection:
+                self.connection.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (time.time(), key))
+            self.hits += 1
+            return json.loads(row[0])
+    
+    def put(self, key: str, model: str, response: Dict[str, Any]) -> None:
+        now = time.time()
+        with self.lock, self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO responses (key, model, response, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (key, model, json.dumps(response, ensure_ascii=False), now, now)
+            )
+            # Least recently read entries go first once the store is full
+            self.connection.execute(
+                "DELETE FROM responses WHERE key IN "
+                "(SELECT key FROM responses ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+    
+    def clear(self) -> None:
+        with self.lock, self.connection:
+            self.connection.execute("DELETE FROM responses")
+    
+    def close(self) -> None:
+        with self.lock:
+            self.connection.close()
+    
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "path": str(self.path)
+        }
+
+
+def create_response_cache(path: Optional[str] = None) -> Optional[ResponseCache]:
+    path = path or os.getenv('RESPONSE_CACHE_PATH')
+    if not path:
+        return None
+    
+    return ResponseCache(path, int(os.getenv('RESPONSE_CACHE_SIZE', '10000')))
@@ -1,39 +1,619 @@
+import hashlib
+import itertools
+import json
+import math
+import os
+import time
 import faiss
-from typing import List, Tuple
+import numpy as np
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from . import tracing
+from .bm25 import BM25Index
 from .chunker import Chunk
 from .embedder import Embedder
+from .embedding_cache import EmbeddingCache
 
 
-class Retriever:
+INDEX_FILE = "index.faiss"
+CHUNKS_FILE = "chunks.jsonl"
+META_FILE = "meta.json"
+
+INDEX_TYPES = ("flat", "ivf", "hnsw", "ivfpq", "auto")
+INDEX_TYPE_ALIASES = {
+    "indexflatip": "flat",
+    "indexivfflat": "ivf",
+    "indexhnswflat": "hnsw",
+    "indexivfpq": "ivfpq"
+}
+# Corpus sizes where "auto" switches from exact search to HNSW, then to compressed IVF-PQ
+AUTO_FLAT_LIMIT = 50_000
+AUTO_HNSW_LIMIT = 1_000_000
+AUTO_TYPES = ("flat", "hnsw", "ivfpq")
+# Rebuilding an index moves vectors over this many at a time
+REBUILD_BATCH_SIZE = 65_536
+HNSW_NEIGHBORS = 32
+# HNSW can't delete vectors, so removed ones are skipped at search time until
+# they make up this share of the index and it is rebuilt without them
+TOMBSTONE_LIMIT = 0.1
+FUSION_METHODS = ("rrf", "weighted")
+RRF_K = 60
+# Each side of a hybrid search contributes this many times k candidates to the fusion
+HYBRID_DEPTH = 4
+# Filtered HNSW and IVF searches lose recall when few vectors pass the filter, so
+# selections up to this size are scored exactly from their stored vectors instead
+FILTER_EXACT_LIMIT = 20_000
+
+
+def resolve_index_type(index_type: str, num_vectors: int) -> str:
+    index_type = INDEX_TYPE_ALIASES.get(index_type.lower(), index_type.lower())
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type '{index_type}', expected one of {', '.join(INDEX_TYPES)}")
+    
+    if index_type != "auto":
+        return index_type
+    if num_vectors < AUTO_FLAT_LIMIT:
+        return "flat"
+    if num_vectors < AUTO_HNSW_LIMIT:
+        return "hnsw"
+    return "ivfpq"
+
+
+def fuse(dense: List[Tuple[Any, float]], lexical: List[Tuple[Any, float]], fusion: str,
+         lexical_weight: float) -> List[Tuple[Any, float]]:
+    scores: Dict[Any, float] = {}
+    if fusion == "rrf":
+        for results in (dense, lexical):
+            for rank, (key, _) in enumerate(results):
+                scores[key] = scores.get(key, 0.0) + 1.0 / (RRF_K + rank + 1)
+    else:
+        # BM25 scores are unbounded, so they are scaled by the best one for the query
+        top = lexical[0][1] if lexical else 1.0
+        for key, score in dense:
+            scores[key] = (1 - lexical_weight) * score
+        for key, score in lexical:
+            scores[key] = scores.get(key, 0.0) + lexical_weight * score / top
+    
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+def hybrid_rank(dense: List[Tuple[Any, float]], lexical: List[Tuple[Any, float, float]], k: int, fusion: str,
+                lexical_weight: float) -> List[Tuple[Any, float]]:
+    # Dense hits are (key, cosine) and lexical hits (key, bm25, cosine), both best first;
+    # the fused order decides the ranking, but each result keeps its cosine as its score
+    cosines = dict(dense)
+    cosines.update((key, cosine) for key, _, cosine in lexical)
+    fused = fuse(dense, [(key, score) for key, score, _ in lexical], fusion, lexical_weight)
+    return [(key, cosines[key]) for key, _ in fused[:k]]
+
+
+def create_index(index_type: str, dimension: int, num_vectors: int, num_train: Optional[int] = None):
+    # num_train is the size of the training sample when it is smaller than the corpus
+    index_type = resolve_index_type(index_type, num_vectors)
+    num_train = num_vectors if num_train is None else min(num_train, num_vectors)
+    
+    if index_type == "flat":
+        return faiss.IndexFlatIP(dimension)
+    if index_type == "hnsw":
+        return faiss.IndexHNSWFlat(dimension, HNSW_NEIGHBORS, faiss.METRIC_INNER_PRODUCT)
     
-    def __init__(self, embedder: Embedder):
+    # IVF needs ~39 training points per list, so small samples get fewer lists
+    nlist = max(1, min(int(4 * math.sqrt(num_vectors)), num_train // 39))
+    quantizer = faiss.IndexFlatIP(dimension)
+    if index_type == "ivf":
+        return faiss.IndexIVFFlat(quantizer, dimension, nlist, faiss.METRIC_INNER_PRODUCT)
+    
+    # ~8 dimensions per sub-quantizer and up to 256 centroids each (one byte per code)
+    m = max(divisor for divisor in range(1, max(1, dimension // 8) + 1) if dimension % divisor == 0)
+    nbits = max(1, min(8, int(math.log2(max(num_train, 2)))))
+    return faiss.IndexIVFPQ(quantizer, dimension, nlist, m, nbits, faiss.METRIC_INNER_PRODUCT)
+
+
+def set_search_params(index, nprobe: int, ef_search: int) -> None:
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.nprobe = min(nprobe, ivf.nlist)
+    
+    hnsw = faiss.downcast_index(index)
+    if isinstance(hnsw, faiss.IndexIDMap2):
+        hnsw = faiss.downcast_index(hnsw.index)
+    if isinstance(hnsw, faiss.IndexHNSW):
+        hnsw.hnsw.efSearch = ef_search
+
+
+def index_recall_report(embeddings: np.ndarray, queries: np.ndarray, k: int = 10,
+                        index_types: Tuple[str, ...] = ("flat", "ivf", "hnsw", "ivfpq"),
+                        nprobe: int = 16, ef_search: int = 64) -> List[Dict[str, Any]]:
+    k = min(k, len(embeddings))
+    exact = faiss.IndexFlatIP(embeddings.shape[1])
+    exact.add(embeddings)
+    _, expected = exact.search(queries, k)
+    
+    report = []
+    for index_type in index_types:
+        start = time.perf_counter()
+        index = create_index(index_type, embeddings.shape[1], len(embeddings))
+        if not index.is_trained:
+            index.train(embeddings)
+        index.add(embeddings)
+        set_search_params(index, nprobe, ef_search)
+        build_ms = (time.perf_counter() - start) * 1000
+        
+        start = time.perf_counter()
+        _, found = index.search(queries, k)
+        search_ms = (time.perf_counter() - start) * 1000
+        
+        hits = sum(len(set(row[row >= 0]) & set(truth)) for row, truth in zip(found, expected))
+        report.append({
+            "index_type": resolve_index_type(index_type, len(embeddings)),
+            "recall_at_k": round(hits / (k * len(queries)), 4),
+            "avg_query_ms": round(search_ms / len(queries), 4),
+            "build_ms": round(build_ms, 2)
+        })
+    
+    return report
+
+
+class Retriever:
+
+    def __init__(self, embedder: Embedder, cache: Optional[EmbeddingCache] = None, index_type: str = None,
+                 nprobe: int = None, ef_search: int = None, train_size: int = 100_000, min_score: float = None,
+                 fusion: str = None, lexical_weight: float = None):
         self.embedder = embedder
+        self.cache = cache
+        # Results below this cosine similarity are dropped before they reach the LLM
+        if min_score is None and os.getenv('MIN_RELEVANCE_SCORE'):
+            min_score = float(os.getenv('MIN_RELEVANCE_SCORE'))
+        self.min_score = min_score
+        self.index_type = index_type or os.getenv('FAISS_INDEX_TYPE', 'IndexFlatIP')
+        self.nprobe = nprobe or int(os.getenv('FAISS_NPROBE', '16'))
+        self.ef_search = ef_search or int(os.getenv('FAISS_EF_SEARCH', '64'))
+        # IVF indexes and "auto" need data before they can be built, so vectors are held back
+        # until train_size of them arrive or the index is queried; "auto" is upgraded as it grows
+        self.train_size = train_size
+        self.pending: List[Tuple[np.ndarray, np.ndarray]] = []
+        resolve_index_type(self.index_type, 0)
         self.index = None
         self.chunks: List[Chunk] = []
+        # FAISS ids are stable across updates; chunk i of self.chunks is stored under vector_ids[i]
+        self.vector_ids: List[int] = []
+        self.next_vector_id = 0
+        self.tombstones = 0
+        self._chunks_by_vector_id: Dict[int, Chunk] = {}
+        self._fingerprint: Optional[str] = None
+        
+        # Hybrid search fuses these dense results with BM25 over the same chunks,
+        # so exact identifiers and names that embeddings blur still rank
+        fusion = fusion if fusion is not None else os.getenv('HYBRID_FUSION', '')
+        if fusion and fusion not in FUSION_METHODS:
+            raise ValueError(f"Unknown fusion method '{fusion}', expected one of {', '.join(FUSION_METHODS)}")
+        self.fusion = fusion or None
+        self.lexical_weight = lexical_weight if lexical_weight is not None else float(os.getenv('HYBRID_LEXICAL_WEIGHT', '0.3'))
+        if not 0.0 <= self.lexical_weight <= 1.0:
+            raise ValueError("lexical_weight must be between 0 and 1")
+        self.bm25 = BM25Index() if self.fusion else None
+    
+    @property
+    def fingerprint(self) -> str:
+        # Identifies the indexed content, recomputed only after chunks change
+        if self._fingerprint is None:
+            digest = hashlib.sha256(f"{self.embedder.cache_namespace}\0".encode("utf-8"))
+            for chunk in self.chunks:
+                digest.update(f"{chunk.uid}\0{chunk.text}\0".encode("utf-8"))
+            self._fingerprint = digest.hexdigest()
+        return self._fingerprint
     
     def add_chunks(self, chunks: List[Chunk]):
         if not chunks:
             return
         
         texts = [chunk.text for chunk in chunks]
-        embeddings = self.embedder.encode_texts(texts)
+        embeddings = self._encode_texts(texts)
+        ids = np.arange(self.next_vector_id, self.next_vector_id + len(chunks), dtype=np.int64)
+        self.next_vector_id += len(chunks)
+        
+        self.chunks.extend(chunks)
+        self.vector_ids.extend(ids.tolist())
+        self._chunks_by_vector_id.update(zip(ids.tolist(), chunks))
+        self._fingerprint = None
+        self._add_vectors(ids, embeddings)
+        self._upgrade_auto_index()
+        if self.bm25 is not None:
+            self.bm25.add_many(zip(ids.tolist(), texts))
+    
+    def add_chunks_stream(self, chunks: Iterable[Chunk], batch_size: int = 256) -> int:
+        # Embeds and indexes fixed-size batches so only one batch of vectors is in memory at a time
+        chunks = iter(chunks)
+        total = 0
+        while True:
+            with tracing.span("chunk"):
+                batch = list(itertools.islice(chunks, batch_size))
+            if not batch:
+                return total
+            self.add_chunks(batch)
+            total += len(batch)
+    
+    def update_chunks(self, chunks: Iterable[Chunk], batch_size: int = 256,
+                      doc_id: Optional[str] = None) -> Dict[str, int]:
+        # Replaces the indexed chunks (only those of doc_id, if given) with `chunks`, embedding only
+        # text that isn't indexed yet; unchanged chunks keep their vectors even when their ids or offsets moved
+        existing: Dict[str, List[int]] = {}
+        kept_chunks: List[Chunk] = []
+        kept_vector_ids: List[int] = []
+        for vector_id, chunk in zip(self.vector_ids, self.chunks):
+            if doc_id is None or chunk.doc_id == doc_id:
+                existing.setdefault(self._content_hash(chunk.text), []).append(vector_id)
+            else:
+                kept_chunks.append(chunk)
+                kept_vector_ids.append(vector_id)
+        
+        new_chunks: List[Chunk] = []
+        new_vector_ids: List[Optional[int]] = []
+        added: List[int] = []
+        for chunk in chunks:
+            matches = existing.get(self._content_hash(chunk.text))
+            if matches:
+                new_vector_ids.append(matches.pop(0))
+            else:
+                new_vector_ids.append(None)
+                added.append(len(new_chunks))
+            new_chunks.append(chunk)
+        
+        stale = [vector_id for ids in existing.values() for vector_id in ids]
+        self._remove_vectors(stale)
+        
+        for start in range(0, len(added), batch_size):
+            batch = added[start:start + batch_size]
+            embeddings = self._encode_texts([new_chunks[i].text for i in batch])
+            ids = np.arange(self.next_vector_id, self.next_vector_id + len(batch), dtype=np.int64)
+            self.next_vector_id += len(batch)
+            for i, vector_id in zip(batch, ids.tolist()):
+                new_vector_ids[i] = vector_id
+            self._add_vectors(ids, embeddings)
+            if self.bm25 is not None:
+                self.bm25.add_many((vector_id, new_chunks[i].text) for i, vector_id in zip(batch, ids.tolist()))
+        
+        self.chunks = kept_chunks + new_chunks
+        self.vector_ids = kept_vector_ids + new_vector_ids
+        self._chunks_by_vector_id = dict(zip(self.vector_ids, self.chunks))
+        self._fingerprint = None
+        self._upgrade_auto_index()
+        self._compact()
+        
+        return {"added": len(added), "removed": len(stale), "unchanged": len(new_chunks) - len(added)}
+    
+    def remove_chunks(self, chunk_ids: Iterable[str]) -> int:
+        chunk_ids = set(chunk_ids)
+        # Matched on uid, so chunks of one document in a corpus don't take other documents' with them
+        keep = [i for i, chunk in enumerate(self.chunks) if chunk.uid not in chunk_ids]
+        if len(keep) == len(self.chunks):
+            return 0
+        
+        removed = [vector_id for i, vector_id in enumerate(self.vector_ids) if self.chunks[i].uid in chunk_ids]
+        self._remove_vectors(removed)
+        
+        self.chunks = [self.chunks[i] for i in keep]
+        self.vector_ids = [self.vector_ids[i] for i in keep]
+        for vector_id in removed:
+            del self._chunks_by_vector_id[vector_id]
+        self._fingerprint = None
+        self._compact()
+        return len(removed)
+    
+    def build_index(self) -> None:
+        if not self.pending:
+            return
+        
+        ids = np.concatenate([batch_ids for batch_ids, _ in self.pending])
+        embeddings = np.concatenate([batch for _, batch in self.pending])
+        self.pending = []
         
         if self.index is None:
-            self.index = faiss.IndexFlatIP(self.embedder.dimension)
+            self.index = self._create_index(len(embeddings))
+            if not self.index.is_trained:
+                self.index.train(embeddings)
         
-        self.index.add(embeddings)
-        self.chunks.extend(chunks)
+        with tracing.span("index_add"):
+            self.index.add_with_ids(embeddings, ids)
+    
+    def search(self, query: str, k: int = 5, min_score: float = None) -> List[Tuple[Chunk, float]]:
+        return self.search_vectors(self.embedder.encode_single(query), k, min_score, [query])[0]
+    
+    def search_batch(self, queries: List[str], k: int = 5, min_score: float = None) -> List[List[Tuple[Chunk, float]]]:
+        if not queries:
+            return []
+        return self.search_vectors(self.embed_queries(queries), k, min_score, queries)
+    
+    def embed_queries(self, queries: List[str]) -> np.ndarray:
+        # One encode call for every query instead of one per question
+        return self.embedder.encode_queries(list(queries))
+    
+    def search_vectors(self, query_embeddings: np.ndarray, k: int = 5, min_score: float = None,
+                       queries: Optional[List[str]] = None,
+                       allowed_ids: Optional[np.ndarray] = None) -> List[List[Tuple[Chunk, float]]]:
+        # Without the query texts (or with fusion off) this is a dense-only search; scores are always
+        # cosine similarities. allowed_ids restricts both sides to those vectors, e.g. one document's
+        min_score = self.min_score if min_score is None else min_score
+        self.build_index()
+        if len(self.chunks) == 0 or (allowed_ids is not None and len(allowed_ids) == 0):
+            return [[] for _ in range(len(query_embeddings))]
+        
+        hybrid = self.bm25 is not None and queries is not None
+        depth = k * HYBRID_DEPTH if hybrid else k
+        dense = self._dense_search(query_embeddings, depth, min_score, allowed_ids)
+        if not hybrid:
+            return [[(self._chunks_by_vector_id[i], score) for i, score in row] for row in dense]
+        
+        with tracing.span("bm25_search"):
+            hits = [self.bm25.search(query, depth, allowed_ids) for query in queries]
+        results = []
+        for embedding, row, row_hits in zip(query_embeddings, dense, hits):
+            # BM25 hits keep their cosine too, so min_score applies to both sides
+            cosines = dict(row)
+            cosines.update(self._cosines(embedding, [i for i, _ in row_hits if i not in cosines]))
+            lexical = [(i, score, cosines[i]) for i, score in row_hits if min_score is None or cosines[i] >= min_score]
+            ranked = hybrid_rank(row, lexical, k, self.fusion, self.lexical_weight)
+            results.append([(self._chunks_by_vector_id[i], score) for i, score in ranked])
+        return results
     
-    def search(self, query: str, k: int = 5) -> List[Tuple[Chunk, float]]:
-        if self.index is None or len(self.chunks) == 0:
+    def recall_report(self, k: int = 10, num_queries: int = 100, index_types: Tuple[str, ...] = ("flat", "ivf", "hnsw", "ivfpq")) -> List[Dict[str, Any]]:
+        if not self.chunks:
             return []
         
-        query_embedding = self.embedder.encode_single(query)
-        scores, indices = self.index.search(query_embedding, min(k, len(self.chunks)))
+        # Chunks double as queries; vectors are re-encoded since compressed indexes can't return them exactly
+        embeddings = self._encode_texts([chunk.text for chunk in self.chunks])
+        rng = np.random.default_rng(0)
+        sample = rng.choice(len(embeddings), size=min(num_queries, len(embeddings)), replace=False)
+        return index_recall_report(embeddings, embeddings[sample], k, index_types, self.nprobe, self.ef_search)
+    
+    def _dense_search(self, query_embeddings: np.ndarray, k: int, min_score: Optional[float],
+                      allowed_ids: Optional[np.ndarray] = None) -> List[List[Tuple[int, float]]]:
+        if self.index is None:
+            return [[] for _ in range(len(query_embeddings))]
+        
+        if allowed_ids is None:
+            # Removed HNSW vectors still occupy result slots, so fetch enough to fill k
+            k = min(k, len(self.chunks))
+            with tracing.span("index_search"):
+                scores, indices = self.index.search(query_embeddings, min(k + self.tombstones, self.index.ntotal))
+        else:
+            k = min(k, len(allowed_ids))
+            with tracing.span("index_search"):
+                scores, indices = self._filtered_search(query_embeddings, k, allowed_ids)
         
         results = []
-        for i, score in zip(indices[0], scores[0]):
-            if i < len(self.chunks):
-                results.append((self.chunks[i], float(score)))
+        for row_indices, row_scores in zip(indices, scores):
+            row = []
+            for i, score in zip(row_indices, row_scores):
+                if int(i) in self._chunks_by_vector_id and (min_score is None or score >= min_score):
+                    row.append((int(i), float(score)))
+            results.append(row[:k])
         
         return results
+    
+    def _filtered_search(self, query_embeddings: np.ndarray, k: int, allowed_ids: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        ivf = faiss.try_extract_index_ivf(self.index)
+        if (ivf is not None or self._is_hnsw()) and len(allowed_ids) <= FILTER_EXACT_LIMIT:
+            scores = query_embeddings @ self._vectors(allowed_ids).T
+            top = np.argsort(-scores, axis=1, kind="stable")[:, :k]
+            return np.take_along_axis(scores, top, axis=1), allowed_ids[top]
+        
+        # The selector is passed with the index's own search parameters, which would otherwise reset to defaults
+        selector = faiss.IDSelectorBatch(allowed_ids)
+        if ivf is not None:
+            params = faiss.SearchParametersIVF(sel=selector, nprobe=min(self.nprobe, ivf.nlist))
+        elif self._is_hnsw():
+            params = faiss.SearchParametersHNSW(sel=selector, efSearch=self.ef_search)
+        else:
+            params = faiss.SearchParameters(sel=selector)
+        return self.index.search(query_embeddings, k, params=params)
+    
+    def _cosines(self, query_embedding: np.ndarray, vector_ids: List[int]) -> Dict[int, float]:
+        # Similarity of BM25 hits the dense search didn't return, from their stored vectors
+        if not vector_ids:
+            return {}
+        vectors = self._vectors(np.array(vector_ids, dtype=np.int64))
+        return dict(zip(vector_ids, (vectors @ query_embedding).tolist()))
+    
+    def _vectors(self, vector_ids: np.ndarray) -> np.ndarray:
+        ivf = faiss.try_extract_index_ivf(self.index)
+        if ivf is not None and ivf.direct_map.type == faiss.DirectMap.NoMap:
+            # IVF lists can only reconstruct by id once they keep an id -> entry map
+            ivf.set_direct_map_type(faiss.DirectMap.Hashtable)
+        return self.index.reconstruct_batch(vector_ids)
+    
+    def _needs_data(self) -> bool:
+        # "auto" resolves to flat for zero vectors, so ask for it by name
+        return self.index_type.lower() == "auto" or resolve_index_type(self.index_type, 0) in ("ivf", "ivfpq")
+    
+    def _create_index(self, num_vectors: int, num_train: Optional[int] = None):
+        index = create_index(self.index_type, self.embedder.dimension, num_vectors, num_train)
+        if faiss.try_extract_index_ivf(index) is None:
+            # IVF indexes take ids natively; flat and HNSW need the id map
+            index = faiss.IndexIDMap2(index)
+        set_search_params(index, self.nprobe, self.ef_search)
+        return index
+    
+    def _add_vectors(self, ids: np.ndarray, embeddings: np.ndarray) -> None:
+        if self.index is None and self._needs_data():
+            self.pending.append((ids, embeddings))
+            if sum(len(batch_ids) for batch_ids, _ in self.pending) >= self.train_size:
+                self.build_index()
+            return
+        
+        if self.index is None:
+            self.index = self._create_index(len(embeddings))
+        
+        with tracing.span("index_add"):
+            self.index.add_with_ids(embeddings, ids)
+    
+    def _remove_vectors(self, vector_ids: List[int]) -> None:
+        if not vector_ids:
+            return
+        if self.bm25 is not None:
+            self.bm25.remove(vector_ids)
+        
+        if self.index is None:
+            # Still waiting for training data, drop them from the held back vectors
+            pending = []
+            for ids, batch in self.pending:
+                keep = ~np.isin(ids, vector_ids)
+                pending.append((ids[keep], batch[keep]))
+            self.pending = pending
+        elif self._is_hnsw():
+            self.tombstones += len(vector_ids)
+        else:
+            self.index.remove_ids(np.array(vector_ids, dtype=np.int64))
+    
+    def _compact(self, force: bool = False) -> None:
+        if self.index is None or not self.tombstones:
+            return
+        if not force and self.tombstones < TOMBSTONE_LIMIT * self.index.ntotal:
+            return
+        
+        # Rebuild from the live vectors, which the id map can still reconstruct
+        if self.vector_ids:
+            self._rebuild_from_index(np.array(self.vector_ids, dtype=np.int64))
+        else:
+            self.index = None
+            self.tombstones = 0
+    
+    def _upgrade_auto_index(self) -> None:
+        # "auto" picks a type for the vectors it has when the index is built, and moves
+        # to the next one once the corpus grows past AUTO_FLAT_LIMIT or AUTO_HNSW_LIMIT
+        if self.index is None or self.index_type.lower() != "auto":
+            return
+        current = "ivfpq" if faiss.try_extract_index_ivf(self.index) is not None else "hnsw" if self._is_hnsw() else "flat"
+        if AUTO_TYPES.index(resolve_index_type("auto", len(self.vector_ids))) > AUTO_TYPES.index(current):
+            self._rebuild_from_index(np.array(self.vector_ids, dtype=np.int64))
+    
+    def _rebuild_from_index(self, ids: np.ndarray) -> None:
+        # Training takes a train_size sample and vectors move over in batches,
+        # so a rebuild never holds a second copy of every vector
+        sample = ids
+        if len(ids) > self.train_size:
+            sample = np.sort(np.random.default_rng(0).choice(ids, self.train_size, replace=False))
+        index = self._create_index(len(ids), len(sample))
+        if not index.is_trained:
+            index.train(self._vectors(sample))
+        with tracing.span("index_add"):
+            for start in range(0, len(ids), REBUILD_BATCH_SIZE):
+                batch = ids[start:start + REBUILD_BATCH_SIZE]
+                index.add_with_ids(self._vectors(batch), batch)
+        self.index = index
+        self.tombstones = 0
+    
+    def _rebuild(self, ids: np.ndarray, embeddings: np.ndarray) -> None:
+        self.index = self._create_index(len(embeddings))
+        if not self.index.is_trained:
+            self.index.train(embeddings)
+        with tracing.span("index_add"):
+            self.index.add_with_ids(embeddings, ids)
+    
+    def _is_hnsw(self) -> bool:
+        index = faiss.downcast_index(self.index)
+        if isinstance(index, faiss.IndexIDMap2):
+            index = faiss.downcast_index(index.index)
+        return isinstance(index, faiss.IndexHNSW)
+    
+    @staticmethod
+    def _content_hash(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+    
+    def _encode_texts(self, texts: List[str]):
+        if self.cache is None:
+            return self.embedder.encode_texts(texts)
+        
+        embeddings, missing = self.cache.get_many(texts)
+        if missing:
+            missing_texts = [texts[i] for i in missing]
+            computed = self.embedder.encode_texts(missing_texts)
+            embeddings[missing] = computed
+            self.cache.put_many(missing_texts, computed)
+            self.cache.flush()
+        
+        return embeddings
+    
+    def save(self, directory: str, metadata: Optional[Dict[str, Any]] = None) -> None:
+        self.build_index()
+        if self.index is None:
+            raise ValueError("Cannot save an empty index")
+        # Saved indexes hold exactly the live chunks
+        self._compact(force=True)
+        
+        path = Path(directory)
+        path.mkdir(parents=True, exist_ok=True)
+        
+        faiss.write_index(self.index, str(path / INDEX_FILE))
+        
+        with open(path / CHUNKS_FILE, "w", encoding="utf-8") as f:
+            for vector_id, chunk in zip(self.vector_ids, self.chunks):
+                f.write(json.dumps({**chunk.to_dict(), "vector_id": vector_id}, ensure_ascii=False) + "\n")
+        
+        # Written last so a directory with meta.json always holds a complete index
+        meta = {
+            "model_name": self.embedder.model_name,
+            "dimension": self.embedder.dimension,
+            "normalized": self.embedder.normalize,
+            "num_chunks": len(self.chunks),
+            "next_vector_id": self.next_vector_id,
+            "index_type": resolve_index_type(self.index_type, len(self.chunks)),
+            **(metadata or {})
+        }
+        with open(path / META_FILE, "w", encoding="utf-8") as f:
+            json.dump(meta, f, indent=2, ensure_ascii=False)
+    
+    @classmethod
+    def load(cls, directory: str, embedder: Embedder, cache: Optional[EmbeddingCache] = None,
+             nprobe: int = None, ef_search: int = None, min_score: float = None, fusion: str = None,
+             lexical_weight: float = None) -> "Retriever":
+        path = Path(directory)
+        meta = cls.load_metadata(directory)
+        
+        if meta["model_name"] != embedder.model_name:
+            raise ValueError(
+                f"Index was built with '{meta['model_name']}' but the embedder uses '{embedder.model_name}'"
+            )
+        if meta.get("normalized", False) != embedder.normalize:
+            raise ValueError("Index and embedder disagree on L2 normalization, rebuild the index")
+        if meta["dimension"] != embedder.dimension:
+            raise ValueError(
+                f"Index dimension {meta['dimension']} does not match embedder dimension {embedder.dimension}"
+            )
+        
+        retriever = cls(embedder, cache, meta.get("index_type", "flat"), nprobe, ef_search, min_score=min_score,
+                        fusion=fusion, lexical_weight=lexical_weight)
+        index = faiss.read_index(str(path / INDEX_FILE))
+        
+        with open(path / CHUNKS_FILE, "r", encoding="utf-8") as f:
+            rows = [json.loads(line) for line in f if line.strip()]
+        retriever.chunks = [Chunk.from_dict(row) for row in rows]
+        # Indexes saved before vector ids were stored hold the chunks in order
+        retriever.vector_ids = [row.get("vector_id", i) for i, row in enumerate(rows)]
+        retriever.next_vector_id = meta.get("next_vector_id", len(rows))
+        retriever._chunks_by_vector_id = dict(zip(retriever.vector_ids, retriever.chunks))
+        if retriever.bm25 is not None:
+            # Rebuilding the lexical index is cheap next to re-embedding, so it isn't saved
+            retriever.bm25.add_many((vector_id, chunk.text) for vector_id, chunk in zip(retriever.vector_ids, retriever.chunks))
+        
+        if index.ntotal != len(rows):
+            raise ValueError(f"Index holds {index.ntotal} vectors but {len(rows)} chunks were stored")
+        
+        if faiss.try_extract_index_ivf(index) is None and not isinstance(faiss.downcast_index(index), faiss.IndexIDMap2):
+            # Older flat and HNSW indexes have no id map; move their vectors into one
+            retriever._rebuild(np.arange(index.ntotal, dtype=np.int64), index.reconstruct_n(0, index.ntotal))
+        else:
+            retriever.index = index
+            set_search_params(retriever.index, retriever.nprobe, retriever.ef_search)
+        
+        return retriever
+    
+    @staticmethod
+    def load_metadata(directory: str) -> Dict[str, Any]:
+        with open(Path(directory) / META_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    
+    @staticmethod
+    def index_exists(directory: str) -> bool:
+        path = Path(directory)
+        return all((path / name).exists() for name in (INDEX_FILE, CHUNKS_FILE, META_FILE))
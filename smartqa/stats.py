@@ -0,0 +1,143 @@
+import math
+from typing import Any, Dict, Optional
+from .tracing import STAGES
+
+
+class LatencySketch:
+
+    def __init__(self, relative_accuracy: float = 0.01):
+        if not 0.0 < relative_accuracy < 1.0:
+            raise ValueError("relative_accuracy must be between 0 and 1")
+        # Log-spaced buckets: any quantile is within relative_accuracy of the true value,
+        # and a few hundred buckets cover microseconds to hours
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.buckets: Dict[int, int] = {}
+        self.zero_count = 0
+        self.count = 0
+    
+    def add(self, value: float) -> None:
+        self.count += 1
+        if value <= 0:
+            self.zero_count += 1
+            return
+        index = math.ceil(math.log(value) / self.log_gamma)
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+    
+    def quantile(self, q: float) -> Optional[float]:
+        if not self.count:
+            return None
+        
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if rank < seen:
+            return 0.0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if rank < seen:
+                return 2 * self.gamma ** index / (self.gamma + 1)
+        return 2 * self.gamma ** max(self.buckets) / (self.gamma + 1)
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "relative_accuracy": self.relative_accuracy,
+            "zero_count": self.zero_count,
+            "buckets": {str(index): count for index, count in self.buckets.items()}
+        }
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "LatencySketch":
+        sketch = cls(data["relative_accuracy"])
+        sketch.zero_count = data["zero_count"]
+        sketch.buckets = {int(index): count for index, count in data["buckets"].items()}
+        sketch.count = sketch.zero_count + sum(sketch.buckets.values())
+        return sketch
+
+
+class StatsAggregate:
+
+    def __init__(self):
+        self.total_interactions = 0
+        self.total_tokens = 0
+        self.total_cost = 0.0
+        self.total_latency = 0.0
+        self.total_ttft = 0.0
+        self.streamed = 0
+        self.cache_hits = 0
+        self.cache_lookups = 0
+        self.latency = LatencySketch()
+        # Stage name -> sketch of its per-question time, from the entries' trace spans
+        self.stages: Dict[str, LatencySketch] = {}
+    
+    def add(self, entry: Dict[str, Any]) -> None:
+        self.total_interactions += 1
+        self.total_tokens += entry.get("tokens_used", 0)
+        
+        cost = entry.get("cost_usd")
+        if cost is not None:
+            self.total_cost += cost
+        
+        latency = entry.get("latency_ms", 0.0)
+        self.total_latency += latency
+        self.latency.add(latency)
+        
+        ttft = entry.get("ttft_ms")
+        if ttft is not None:
+            self.total_ttft += ttft
+            self.streamed += 1
+        
+        cache_hit = entry.get("cache_hit")
+        if cache_hit is not None:
+            self.cache_lookups += 1
+            self.cache_hits += int(cache_hit)
+        
+        for stage, ms in (entry.get("spans") or {}).items():
+            self.stages.setdefault(stage, LatencySketch()).add(ms)
+    
+    def summary(self) -> Dict[str, Any]:
+        percentile = lambda q: round(self.latency.quantile(q), 2) if self.latency.count else None
+        return {
+            "total_interactions": self.total_interactions,
+            "total_tokens": self.total_tokens,
+            "total_cost_usd": round(self.total_cost, 4),
+            "avg_latency_ms": round(self.total_latency / max(self.total_interactions, 1), 2),
+            "latency_p50_ms": percentile(0.5),
+            "latency_p95_ms": percentile(0.95),
+            "latency_p99_ms": percentile(0.99),
+            "avg_ttft_ms": round(self.total_ttft / self.streamed, 2) if self.streamed else None,
+            "answer_cache_hits": self.cache_hits,
+            "answer_cache_hit_rate": round(self.cache_hits / self.cache_lookups, 4) if self.cache_lookups else None,
+            "stage_latency_ms": self.stage_summary()
+        }
+    
+    def stage_summary(self) -> Dict[str, Dict[str, Any]]:
+        # Pipeline order first, then any stages this version doesn't know about
+        order = [stage for stage in STAGES if stage in self.stages]
+        order += sorted(stage for stage in self.stages if stage not in STAGES)
+        return {
+            stage: {
+                "count": self.stages[stage].count,
+                "p50": round(self.stages[stage].quantile(0.5), 2),
+                "p95": round(self.stages[stage].quantile(0.95), 2),
+                "p99": round(self.stages[stage].quantile(0.99), 2)
+            }
+            for stage in order
+        }
+    
+    def to_dict(self) -> Dict[str, Any]:
+        data = {name: value for name, value in vars(self).items() if name not in ("latency", "stages")}
+        data["latency"] = self.latency.to_dict()
+        data["stages"] = {stage: sketch.to_dict() for stage, sketch in self.stages.items()}
+        return data
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "StatsAggregate":
+        aggregate = cls()
+        for name, value in data.items():
+            if name not in ("latency", "stages"):
+                setattr(aggregate, name, value)
+        aggregate.latency = LatencySketch.from_dict(data["latency"])
+        # Checkpoints written before stage tracing have no "stages"
+        aggregate.stages = {stage: LatencySketch.from_dict(sketch) for stage, sketch in data.get("stages", {}).items()}
+        return aggregate
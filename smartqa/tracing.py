@@ -0,0 +1,92 @@
+import functools
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterator, Optional, TypeVar
+
+# Stages in the order a question goes through them, for printing breakdowns
+STAGES = (
+    "chunk", "encode_texts", "index_add", "encode_query", "index_search", "bm25_search", "rerank",
+    "prompt_build", "http", "ollama_load", "ollama_prompt_eval", "ollama_eval"
+)
+
+F = TypeVar("F", bound=Callable)
+
+_current: ContextVar[Optional["Trace"]] = ContextVar("smartqa_trace", default=None)
+
+
+class Trace:
+
+    def __init__(self):
+        # Stage -> milliseconds; a stage entered several times accumulates
+        self.spans: Dict[str, float] = {}
+        # asyncio.to_thread copies the context, so pipeline worker threads share a trace
+        self._lock = threading.Lock()
+    
+    def add(self, name: str, ms: float) -> None:
+        with self._lock:
+            self.spans[name] = self.spans.get(name, 0.0) + ms
+    
+    def merge(self, spans: Dict[str, float]) -> None:
+        for name, ms in spans.items():
+            self.add(name, ms)
+    
+    def snapshot(self) -> Dict[str, float]:
+        with self._lock:
+            return {name: round(ms, 2) for name, ms in self.spans.items()}
+
+
+def current_trace() -> Optional[Trace]:
+    return _current.get()
+
+
+@contextmanager
+def start_trace() -> Iterator[Trace]:
+    trace = Trace()
+    token = _current.set(trace)
+    try:
+        yield trace
+    finally:
+        _current.reset(token)
+
+
+def traced(func: F) -> F:
+    # Runs each call in a fresh trace, for entry points that handle one question
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with start_trace():
+            return func(*args, **kwargs)
+    return wrapper
+
+
+@contextmanager
+def ensure_trace() -> Iterator[Trace]:
+    # Joins the caller's trace when there is one, so retrieval and generation land in the same record
+    trace = _current.get()
+    if trace is not None:
+        yield trace
+        return
+    with start_trace() as trace:
+        yield trace
+
+
+@contextmanager
+def span(name: str) -> Iterator[None]:
+    # Costs one context variable lookup when nothing is tracing
+    trace = _current.get()
+    if trace is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.add(name, (time.perf_counter() - start) * 1000)
+
+
+def record(name: str, ms: float) -> None:
+    # For durations measured elsewhere, such as the ones Ollama reports
+    trace = _current.get()
+    if trace is not None:
+        trace.add(name, ms)
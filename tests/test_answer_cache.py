@@ -0,0 +1,87 @@
+import pytest
+import numpy as np
+from smartqa.answer_cache import AnswerCache
+
+
+def unit(vector):
+    vector = np.asarray(vector, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+def test_answer_cache_exact_match_is_normalized():
+    cache = AnswerCache()
+    key = AnswerCache.make_key("index", "llama2", ["chunk_0000", "chunk_0001"])
+    
+    cache.put(key, "What is AI?", "AI is artificial intelligence.")
+    
+    assert cache.get(key, "  what is   ai ") == "AI is artificial intelligence.", "Case, spacing and punctuation should not matter"
+    assert cache.get(key, "What is ML?") is None
+    
+    stats = cache.get_stats()
+    assert stats["hits"] == 1 and stats["misses"] == 1
+    assert stats["hit_rate"] == 0.5
+
+
+def test_answer_cache_key_depends_on_context():
+    cache = AnswerCache()
+    key = AnswerCache.make_key("index", "llama2", ["chunk_0000"])
+    cache.put(key, "What is AI?", "AI is artificial intelligence.")
+    
+    assert cache.get(AnswerCache.make_key("index", "llama2", ["chunk_0001"]), "What is AI?") is None
+    assert cache.get(AnswerCache.make_key("index", "mistral", ["chunk_0000"]), "What is AI?") is None
+    assert cache.get(AnswerCache.make_key("other", "llama2", ["chunk_0000"]), "What is AI?") is None
+
+
+def test_answer_cache_semantic_match():
+    cache = AnswerCache(similarity_threshold=0.9)
+    key = AnswerCache.make_key("index", "llama2", ["chunk_0000"])
+    cache.put(key, "What is AI?", "AI is artificial intelligence.", unit([1.0, 0.0, 0.0]))
+    
+    close = unit([1.0, 0.2, 0.0])
+    far = unit([0.2, 1.0, 0.0])
+    
+    assert cache.get(key, "what is artificial intelligence", close) == "AI is artificial intelligence."
+    assert cache.get(key, "who invented AI", far) is None, "Dissimilar queries should miss"
+    assert cache.get_stats()["semantic_hits"] == 1
+    
+    exact_only = AnswerCache(similarity_threshold=None)
+    exact_only.put(key, "What is AI?", "AI is artificial intelligence.", unit([1.0, 0.0, 0.0]))
+    assert exact_only.get(key, "what is artificial intelligence", close) is None, "Semantic layer should be optional"
+
+
+def test_answer_cache_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("smartqa.answer_cache.time.time", lambda: now[0])
+    
+    cache = AnswerCache(ttl_seconds=60)
+    cache.put("key", "What is AI?", "AI is artificial intelligence.")
+    
+    now[0] += 30
+    assert cache.get("key", "What is AI?") is not None
+    
+    now[0] += 61
+    assert cache.get("key", "What is AI?") is None, "Entries older than the TTL should expire"
+    assert len(cache) == 0
+    assert cache.get_stats()["expired"] == 1
+
+
+def test_answer_cache_lru_eviction():
+    cache = AnswerCache(max_entries=2)
+    cache.put("key", "first", "1")
+    cache.put("key", "second", "2")
+    cache.get("key", "first")
+    cache.put("key", "third", "3")
+    
+    assert cache.get("key", "second") is None, "Least recently used entry should be evicted"
+    assert cache.get("key", "first") == "1"
+    assert cache.get("key", "third") == "3"
+    assert cache.get_stats()["evictions"] == 1
+
+
+def test_answer_cache_invalid_settings():
+    with pytest.raises(ValueError):
+        AnswerCache(max_entries=0)
+    with pytest.raises(ValueError):
+        AnswerCache(ttl_seconds=0)
+    with pytest.raises(ValueError):
+        AnswerCache(similarity_threshold=1.5)
@@ -0,0 +1,46 @@
+import json
+import numpy as np
+from benchmarks.compare import compare
+from benchmarks.run import Results, bench_chunking, bench_index
+from benchmarks.synthetic import SyntheticEmbedder, generate_text
+
+
+def test_synthetic_corpus_is_reproducible():
+    assert generate_text(50, seed=1) == generate_text(50, seed=1)
+    assert generate_text(50, seed=1) != generate_text(50, seed=2)
+    assert len(generate_text(50).split("\n\n")) == 50
+    
+    embedder = SyntheticEmbedder(dimension=16)
+    vectors = embedder.encode_texts(["a", "b", "a"])
+    assert vectors.shape == (3, 16) and vectors.dtype == np.float32
+    assert np.allclose(vectors[0], vectors[2]), "The same text should get the same vector"
+    assert np.allclose(np.linalg.norm(vectors, axis=1), 1.0)
+
+
+def test_benchmarks_record_results():
+    results = Results()
+    bench_chunking(results, [20], repeats=1, seed=0)
+    bench_index(results, ["flat", "hnsw"], [100], num_queries=5, k=3, seed=0)
+    
+    names = {(record["name"], record["metric"]) for record in results.records}
+    assert ("chunking/paragraphs=20", "mb_per_sec") in names
+    assert ("index/hnsw/size=100", "search_p95_ms") in names
+    assert all(record["value"] > 0 for record in results.records)
+    json.dumps(results.records)
+
+
+def test_compare_flags_regressions():
+    def report(throughput, latency):
+        return {"results": [
+            {"name": "encode/batch=32", "metric": "chunks_per_sec", "value": throughput, "unit": "chunks/s",
+             "better": "higher"},
+            {"name": "index/flat/size=1000", "metric": "search_p50_ms", "value": latency, "unit": "ms",
+             "better": "lower"}
+        ]}
+    
+    rows = compare(report(100, 1.0), report(80, 0.5), threshold=0.1)
+    
+    assert [row["regression"] for row in rows] == [True, False], "Lower throughput should count as a regression"
+    assert rows[0]["change"] == -0.2 and rows[1]["change"] == 0.5
+    assert compare(report(100, 1.0), {"results": []}) == [], "Measurements missing from one run are skipped"
+
@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+from smartqa.bm25 import BM25Index, tokenize
+
+
+def test_tokenize_keeps_identifiers_and_parts():
+    tokens = tokenize("Call os.path.join or see ERR_404 in v2.3.1")
+    
+    assert "os.path.join" in tokens and "path" in tokens, "Dotted names should be indexed whole and in parts"
+    assert "err_404" in tokens and "err" in tokens and "404" in tokens
+    assert "v2.3.1" in tokens
+    assert tokenize("") == []
+
+
+def test_bm25_ranks_matching_documents():
+    index = BM25Index()
+    index.add_many([
+        (0, "The server returned ERR_404 for the missing page."),
+        (1, "Machine learning allows computers to learn from data."),
+        (2, "Deep learning uses neural networks; learning learning learning."),
+    ])
+    
+    assert index.search("ERR_404")[0][0] == 0, "Exact identifiers should match"
+    assert [doc_id for doc_id, _ in index.search("learning")] == [2, 1], "Higher term frequency should rank first"
+    assert index.search("quantum") == []
+    assert len(index.search("learning data neural", k=1)) == 1
+
+
+def test_bm25_search_restricted_to_allowed_ids():
+    texts = [f"report {i} on {'quantum' if i % 4 == 0 else 'classical'} physics" for i in range(12)]
+    index = BM25Index()
+    index.add_many(enumerate(texts))
+    
+    query = "quantum physics"
+    allowed = np.arange(3, 12)
+    filtered = index.search(query, 12, allowed)
+    expected = [hit for hit in index.search(query, 12) if hit[0] >= 3]
+    assert [i for i, _ in filtered] == [i for i, _ in expected]
+    assert [score for _, score in filtered] == pytest.approx([score for _, score in expected]), \
+        "Filtered hits should keep their whole-index scores"
+    assert index.search(query, 2, allowed) == filtered[:2]
+    assert index.search(query, 12, np.array([], dtype=np.int64)) == []
+
+
+def test_bm25_rejects_duplicate_documents():
+    index = BM25Index()
+    index.add(0, "Some text")
+    
+    with pytest.raises(ValueError):
+        index.add(0, "Other text")
+
+
+def test_bm25_remove_and_compact():
+    index = BM25Index()
+    index.add_many((i, f"document {i} about topic {i % 3}") for i in range(10))
+    
+    index.remove([0])
+    assert len(index) == 9 and index.removed == 1
+    assert 0 not in [doc_id for doc_id, _ in index.search("document 0", k=10)], "Removed documents should not match"
+    
+    index.remove([3, 6])
+    assert index.removed == 0, "Postings should be compacted once enough documents are removed"
+    assert [doc_id for doc_id, _ in index.search("topic 0", k=10)][0] == 9
+    
+    index.add(0, "document zero is back")
+    assert index.search("zero")[0][0] == 0, "Removed ids can be reused"
@@ -1,4 +1,5 @@
 import pytest
+import random
 from smartqa.chunker import TextChunker, Chunk
 
 
@@ -49,3 +50,130 @@ def test_chunker_multiple_empty_lines():
     assert chunks[0].text == "First paragraph."
     assert chunks[1].text == "Second paragraph."
     assert chunks[2].text == "Third paragraph."
+
+
+def test_chunker_respects_chunk_size():
+    text = "\n".join(f"2024-01-01 12:00:{i % 60:02d} ERROR E{i:04d} request timed out" for i in range(500))
+    
+    chunker = TextChunker(chunk_size=300, chunk_overlap=50)
+    chunks = chunker.create_chunks(text)
+    
+    assert len(chunks) > 1, "Paragraph-less text larger than chunk_size should be split"
+    for chunk in chunks:
+        assert len(chunk.text) <= 300, f"Chunk {chunk.id} exceeds chunk_size"
+
+
+def test_chunker_offsets_point_into_source():
+    text = (
+        "Artificial intelligence is a branch of computer science.\n\n"
+        + " ".join(f"Sentence {i} talks about machine learning." for i in range(60))
+    )
+    
+    chunker = TextChunker(chunk_size=200, chunk_overlap=60)
+    chunks = chunker.create_chunks(text)
+    
+    for chunk in chunks:
+        assert text[chunk.start:chunk.end] == chunk.text, f"Offsets of {chunk.id} don't match its text"
+
+
+def test_chunker_overlap_between_split_chunks():
+    text = " ".join(f"Sentence number {i} is here." for i in range(100))
+    
+    chunker = TextChunker(chunk_size=200, chunk_overlap=60)
+    chunks = chunker.create_chunks(text)
+    
+    for previous, current in zip(chunks, chunks[1:]):
+        assert current.start < previous.end, "Consecutive chunks should overlap"
+        assert previous.end - current.start <= 60, "Overlap should not exceed chunk_overlap"
+        assert current.text.startswith("Sentence"), "Chunks should start on a sentence boundary"
+
+
+def test_chunker_splits_long_words_without_boundaries():
+    text = "x" * 2500
+    
+    chunker = TextChunker(chunk_size=1000, chunk_overlap=100)
+    chunks = chunker.create_chunks(text)
+    
+    assert len(chunks) == 3
+    assert all(len(chunk.text) <= 1000 for chunk in chunks)
+    assert chunks[-1].end == len(text), "Last chunk should reach the end of the text"
+
+
+def test_chunker_merges_small_paragraphs():
+    text = "Hi.\n\nShort note.\n\nAnother small paragraph.\n\nEnd."
+    
+    chunker = TextChunker(chunk_size=200, chunk_overlap=0, min_chunk_size=30)
+    chunks = chunker.create_chunks(text)
+    
+    assert len(chunks) == 1, "Tiny paragraphs should be merged up to min_chunk_size"
+    assert chunks[0].start == 0 and chunks[0].end == len(text)
+
+
+def test_chunker_invalid_settings():
+    with pytest.raises(ValueError):
+        TextChunker(chunk_size=0)
+    with pytest.raises(ValueError):
+        TextChunker(chunk_size=100, chunk_overlap=100)
+
+
+def test_chunker_iter_chunks_from_file(tmp_path):
+    text = "\n\n".join(
+        " ".join(f"Paragraph {p} sentence {i} mentions embeddings." for i in range(40))
+        for p in range(5)
+    )
+    path = tmp_path / "document.txt"
+    path.write_text(text, encoding="utf-8")
+    
+    chunker = TextChunker(chunk_size=300, chunk_overlap=50)
+    with open(path, "r", encoding="utf-8") as f:
+        streamed = list(chunker.iter_chunks(f))
+    
+    expected = chunker.create_chunks(text)
+    assert [(c.start, c.end) for c in streamed] == [(c.start, c.end) for c in expected], "Streaming should match in-memory chunking"
+    for chunk in streamed:
+        assert text[chunk.start:chunk.end] == chunk.text
+
+
+def test_chunker_iter_chunks_is_lazy():
+    def lines():
+        for i in range(10_000):
+            yield f"log line {i} with an error code\n"
+        raise AssertionError("Chunker should not read past the first chunks")
+    
+    chunker = TextChunker(chunk_size=200, chunk_overlap=0)
+    first = next(chunker.iter_chunks(lines()))
+    
+    assert len(first.text) <= 200
+    assert first.start == 0
+
+
+def random_text(rng):
+    # Sentences, long runs of words without a boundary, and unbreakable tokens, under
+    # assorted separators, so splits land mid-sentence, mid-word and between paragraphs
+    parts = []
+    for _ in range(rng.randint(1, 40)):
+        kind = rng.random()
+        if kind < 0.3:
+            parts.append("x" * rng.randint(1, 400))
+        elif kind < 0.6:
+            parts.append(" ".join("w" * rng.randint(1, 12) for _ in range(rng.randint(1, 80))))
+        else:
+            parts.append(" ".join(f"Sentence {i} here." for i in range(rng.randint(1, 10))))
+        parts.append(rng.choice([" ", "\n", "\n\n", ". ", "  \n \n"]))
+    return "".join(parts)
+
+
+@pytest.mark.parametrize("seed", range(300))
+def test_chunker_boundaries_do_not_depend_on_read_size(seed):
+    rng = random.Random(seed)
+    chunk_size = rng.randint(20, 200)
+    # High overlaps are where a pending tail used to be cut differently per block size
+    chunk_overlap = rng.choice([0, rng.randint(0, chunk_size - 1), chunk_size - rng.randint(1, 5)])
+    chunker = TextChunker(chunk_size, chunk_overlap, rng.choice([0, 0, rng.randint(0, chunk_size)]))
+    text = random_text(rng)
+    
+    expected = [(c.start, c.end, c.text) for c in chunker.iter_chunks([text])]
+    for block_size in (1, 7, 64, 333):
+        blocks = [text[i:i + block_size] for i in range(0, len(text), block_size)]
+        assert [(c.start, c.end, c.text) for c in chunker.iter_chunks(blocks)] == expected, \
+            f"Chunks should not depend on the read size ({block_size})"
@@ -32,6 +32,36 @@ def test_cli_missing_input():
     print("✅ CLI missing input test PASSED")
 
 
+def test_cli_rejects_streaming_bulk_questions(tmp_path):
+    questions = tmp_path / "questions.txt"
+    questions.write_text("What is AI?\n", encoding="utf-8")
+    result = subprocess.run(
+        ['python3', 'smartqa.py', '--input', 'example.txt', '--questions', str(questions), '--stream'],
+        capture_output=True,
+        text=True,
+        timeout=60
+    )
+    
+    assert result.returncode == 1
+    assert "--stream" in result.stdout and "--questions" in result.stdout
+
+
+def test_cli_glob_input_with_duplicate_file_names(tmp_path):
+    for name in ("a", "b"):
+        (tmp_path / name).mkdir()
+        (tmp_path / name / "readme.txt").write_text(f"Project {name} is written in Python.", encoding="utf-8")
+    result = subprocess.run(
+        ['python3', 'smartqa.py', '--input', str(tmp_path / "*" / "readme.txt"), '--document', 'b/readme.txt',
+         '--ask', 'What is project b written in?'],
+        capture_output=True,
+        text=True,
+        timeout=60
+    )
+    
+    assert result.returncode == 0, result.stdout + result.stderr
+    assert "a/readme.txt: 1 chunks" in result.stdout and "b/readme.txt: 1 chunks" in result.stdout
+
+
 def test_cli_file_not_found():
     result = subprocess.run(
         ['python3', 'smartqa.py', '--input', 'nonexistent_file.txt', '--ask', 'test'],
@@ -60,6 +90,8 @@ def test_cli_basic_functionality():
 
         assert result.returncode == 0, f"CLI failed with return code {result.returncode}"
         assert "ANSWER" in result.stdout or "Answer" in result.stdout, "Should show answer"
+        assert "encode_texts" in result.stdout and "index_add" in result.stdout, \
+            "Ingestion should report its stage timings"
         
         print("✅ CLI basic functionality test PASSED")
     finally:
@@ -0,0 +1,81 @@
+import pytest
+from smartqa.chunker import Chunk
+from smartqa.context import ContextPacker, count_tokens, split_sentences
+
+
+def test_count_tokens_is_approximate():
+    assert count_tokens("") == 0
+    assert count_tokens("What is AI?") == 4
+    assert count_tokens("internationalization") == 5, "Long words should count as several tokens"
+
+
+def test_split_sentences():
+    assert split_sentences("First one. Second one!\nThird one") == ["First one.", "Second one!", "Third one"]
+
+
+def test_packer_keeps_everything_within_budget():
+    chunks = [
+        (Chunk("chunk_0000", "Machine learning allows computers to learn from data."), 0.9),
+        (Chunk("chunk_0001", "Deep learning uses neural networks for complex tasks."), 0.8),
+    ]
+    
+    packed = ContextPacker(max_tokens=1024).pack("What is machine learning?", chunks)
+    
+    assert [(chunk.id, text) for chunk, _, text in packed] == [(chunk.id, chunk.text) for chunk, _ in chunks]
+    assert [score for _, score, _ in packed] == [0.9, 0.8]
+
+
+def test_packer_respects_token_budget():
+    sentence = "Filler sentence about nothing in particular number {}."
+    chunks = [(Chunk(f"chunk_{i:04d}", " ".join(sentence.format(i * 10 + j) for j in range(10))), 1.0 - i / 10)
+              for i in range(5)]
+    
+    packed = ContextPacker(max_tokens=200, max_chunk_tokens=80).pack("What is the filler about?", chunks)
+    
+    assert sum(count_tokens(text) for _, _, text in packed) <= 200
+    assert all(count_tokens(text) <= 80 for _, _, text in packed)
+    ids = [chunk.id for chunk, _, _ in packed]
+    assert 2 <= len(ids) < 5 and ids == [f"chunk_{i:04d}" for i in range(len(ids))], "The weakest chunks should be dropped"
+
+
+def test_packer_extracts_relevant_sentences():
+    text = (
+        "The company was founded in a small garage. "
+        "It later moved to a larger office downtown. "
+        "Photosynthesis converts sunlight into chemical energy in plants. "
+        "The office has a cafeteria and a gym."
+    )
+    
+    packed = ContextPacker(max_tokens=1024, max_chunk_tokens=20).pack("How does photosynthesis work in plants?",
+                                                                       [(Chunk("chunk_0000", text), 0.9)])
+    
+    assert packed[0][2] == "Photosynthesis converts sunlight into chemical energy in plants."
+
+
+def test_packer_truncates_overlong_sentence():
+    text = " ".join(["word"] * 200)
+    
+    packed = ContextPacker(max_tokens=1024, max_chunk_tokens=50).pack("word", [(Chunk("chunk_0000", text), 0.9)])
+    
+    assert packed[0][2].endswith("...")
+    assert count_tokens(packed[0][2]) <= 50 + count_tokens("...")
+
+
+def test_packer_deduplicates_overlapping_chunks():
+    chunks = [
+        (Chunk("chunk_0000", "Neural networks learn features. They need a lot of data."), 0.9),
+        (Chunk("chunk_0001", "They need a lot of data. Training them takes hours on GPUs."), 0.8),
+        (Chunk("chunk_0002", "Neural networks learn features."), 0.7),
+    ]
+    
+    packed = ContextPacker().pack("How do neural networks learn?", chunks)
+    
+    assert [text for _, _, text in packed] == [
+        "Neural networks learn features. They need a lot of data.",
+        "Training them takes hours on GPUs."
+    ], "Repeated sentences should only be sent once"
+
+
+def test_packer_rejects_tiny_budgets():
+    with pytest.raises(ValueError):
+        ContextPacker(max_tokens=4)
@@ -0,0 +1,195 @@
+import pytest
+import io
+import json
+from pathlib import Path
+from smartqa import retriever
+from smartqa.chunker import TextChunker
+from smartqa.corpus import Corpus, document_id, document_root, find_documents
+from smartqa.embedder import Embedder
+
+
+DOCUMENTS = {
+    "ai.txt": "Artificial intelligence is a branch of computer science.\n\nMachine learning allows computers to learn from data.",
+    "cooking.txt": "Bread is baked from flour, water and yeast.\n\nPasta is boiled in salted water.",
+    "space.txt": "The moon orbits the earth.\n\nMars is the fourth planet from the sun."
+}
+
+
+def create_corpus():
+    corpus = Corpus(Embedder(), chunker=TextChunker())
+    for doc_id, text in DOCUMENTS.items():
+        corpus.add_document(doc_id, io.StringIO(text))
+    return corpus
+
+
+def test_corpus_chunks_carry_document_ids():
+    corpus = create_corpus()
+    
+    assert corpus.document_ids == list(DOCUMENTS)
+    assert all(chunk.doc_id in DOCUMENTS for chunk in corpus.chunks), "Every chunk should know its document"
+    
+    uids = [chunk.uid for chunk in corpus.chunks]
+    assert len(set(uids)) == len(uids), "Chunk uids should be unique across documents"
+    assert len({chunk.id for chunk in corpus.chunks}) < len(uids), "Plain chunk ids repeat per document"
+
+
+def test_corpus_search_merges_documents():
+    corpus = create_corpus()
+    results = corpus.search("Machine learning allows computers to learn from data", k=3)
+    
+    assert len(results) == 3
+    assert results[0][0].doc_id == "ai.txt", "Best match should come from the matching document"
+    assert len({chunk.doc_id for chunk, _ in results}) > 1, "Results should be merged across documents"
+    scores = [score for _, score in results]
+    assert scores == sorted(scores, reverse=True), "Merged results should be sorted by score"
+
+
+def test_corpus_filtered_search():
+    corpus = create_corpus()
+    
+    results = corpus.search("Machine learning allows computers to learn from data", k=5, doc_ids=["space.txt"])
+    assert results and all(chunk.doc_id == "space.txt" for chunk, _ in results), "Filter should restrict documents"
+    
+    view = corpus.select(["cooking.txt", "space.txt"])
+    batch = view.search_batch(["bread", "planets"], k=2)
+    assert all(chunk.doc_id != "ai.txt" for row in batch for chunk, _ in row)
+    
+    with pytest.raises(ValueError):
+        corpus.select(["missing.txt"])
+
+
+@pytest.mark.parametrize("fusion", ["rrf", "weighted"])
+def test_corpus_hybrid_search_ranks_across_documents(fusion):
+    topics = ["images", "speech", "games", "translation", "proteins", "weather", "music", "robots"]
+    networks = "\n\n".join(f"Neural networks trained on {topic} learn layered features, and deeper neural networks "
+                            f"need more data about {topic}." for topic in topics)
+    corpus = Corpus(Embedder(), chunker=TextChunker(), index_options={"fusion": fusion})
+    corpus.add_document("networks.txt", io.StringIO(networks))
+    corpus.add_document("kitchen.txt", io.StringIO("Kids learn to stir the soup while grown-ups chop the onions."))
+    
+    question = "How do neural networks learn?"
+    results = corpus.search(question, k=5)
+    assert [chunk.doc_id for chunk, _ in results] == ["networks.txt"] * 5, \
+        "A one-chunk document's local best shouldn't outrank better matches elsewhere"
+    
+    # Scores stay cosine similarities, whichever fusion ordered them
+    query = corpus.embedder.encode_single(question)[0]
+    for chunk, score in results:
+        assert score == pytest.approx(float(query @ corpus.embedder.encode_single(chunk.text)[0]), abs=1e-5)
+    
+    # The kitchen chunk still matches "learn", but min_score applies to keyword hits too
+    assert any(chunk.doc_id == "kitchen.txt" for chunk, _ in corpus.search(question, k=20))
+    kitchen_score = next(score for chunk, score in corpus.search(question, k=20) if chunk.doc_id == "kitchen.txt")
+    filtered = corpus.search(question, k=20, min_score=kitchen_score + 0.01)
+    assert filtered and all(chunk.doc_id == "networks.txt" for chunk, _ in filtered)
+
+
+def test_corpus_save_and_load(tmp_path):
+    corpus = create_corpus()
+    corpus.save(str(tmp_path), {"input_file": "docs"})
+    
+    assert Corpus.index_exists(str(tmp_path))
+    
+    loaded = Corpus.load(str(tmp_path), Embedder())
+    assert loaded.document_ids == corpus.document_ids
+    assert loaded.fingerprint == corpus.fingerprint, "Loaded corpus should hold the same content"
+    assert Corpus.load_metadata(str(tmp_path))["input_file"] == "docs"
+    
+    query = "Pasta is boiled in salted water"
+    assert [c.uid for c, _ in loaded.search(query, k=3)] == [c.uid for c, _ in corpus.search(query, k=3)]
+
+
+def test_corpus_rejects_duplicate_documents():
+    corpus = create_corpus()
+    with pytest.raises(ValueError):
+        corpus.add_document("ai.txt", io.StringIO("Duplicate"))
+
+
+def test_find_documents(tmp_path):
+    (tmp_path / "nested").mkdir()
+    (tmp_path / "a.txt").write_text("A")
+    (tmp_path / "nested" / "b.txt").write_text("B")
+    (tmp_path / "notes.md").write_text("C")
+    
+    paths = find_documents(str(tmp_path))
+    assert [document_id(p, tmp_path) for p in paths] == ["a.txt", "nested/b.txt"], "Directories should yield .txt files"
+    assert find_documents(str(tmp_path / "*.md")) == [tmp_path / "notes.md"], "Globs should be expanded"
+    assert find_documents(str(tmp_path / "a.txt")) == [tmp_path / "a.txt"]
+
+
+def test_glob_document_ids_keep_directories(tmp_path):
+    for name in ("a", "b"):
+        (tmp_path / "docs" / name).mkdir(parents=True)
+        (tmp_path / "docs" / name / "readme.txt").write_text(f"Readme {name}")
+    
+    pattern = str(tmp_path / "docs" / "*" / "readme.txt")
+    root = document_root(pattern)
+    assert root == tmp_path / "docs", "Ids should be relative to the part before the first wildcard"
+    assert [document_id(p, root) for p in find_documents(pattern)] == ["a/readme.txt", "b/readme.txt"]
+    assert document_root(str(tmp_path / "docs")) == tmp_path / "docs"
+    assert document_root(str(tmp_path / "docs" / "a" / "readme.txt")) is None
+    assert document_root("*.txt") == Path(".")
+    
+    corpus = Corpus(Embedder(), chunker=TextChunker())
+    for path in find_documents(pattern):
+        corpus.add_document(document_id(path, root), io.StringIO(path.read_text()))
+    assert corpus.document_ids == ["a/readme.txt", "b/readme.txt"]
+
+
+def test_corpus_update_and_remove_documents(tmp_path):
+    corpus = create_corpus()
+    corpus.save(str(tmp_path))
+    
+    stats = corpus.update_document("ai.txt", io.StringIO(
+        "Artificial intelligence is a branch of computer science.\n\nDeep learning stacks many neural network layers."
+    ))
+    assert stats == {"added": 1, "removed": 1, "unchanged": 1}
+    assert [chunk.doc_id for chunk in corpus.select(["ai.txt"]).chunks] == ["ai.txt"] * 2
+    
+    assert corpus.remove_document("cooking.txt") == 2
+    assert all(chunk.doc_id != "cooking.txt" for chunk in corpus.chunks)
+    corpus.update_document("music.txt", io.StringIO("Jazz grew out of blues and ragtime."))
+    assert corpus.get_stats()["chunks_per_document"] == {"ai.txt": 2, "space.txt": 2, "music.txt": 1}
+    corpus.save(str(tmp_path))
+    
+    loaded = Corpus.load(str(tmp_path), Embedder())
+    assert loaded.document_ids == ["ai.txt", "space.txt", "music.txt"]
+    assert loaded.search("neural network layers", k=1)[0][0].doc_id == "ai.txt"
+    assert loaded.search("Pasta is boiled in salted water", k=5, doc_ids=["music.txt"])[0][0].doc_id == "music.txt"
+    
+    with pytest.raises(ValueError):
+        loaded.remove_document("cooking.txt")
+
+
+@pytest.mark.parametrize("index_type", ["hnsw", "ivf"])
+@pytest.mark.parametrize("exact_limit", [retriever.FILTER_EXACT_LIMIT, 0])
+def test_corpus_filtered_search_on_approximate_index(index_type, exact_limit, monkeypatch):
+    # One shared index; a small document filter must still find that document's best chunks,
+    # whether its vectors are scored exactly or through a FAISS ID selector
+    monkeypatch.setattr(retriever, "FILTER_EXACT_LIMIT", exact_limit)
+    texts = {f"doc{i}.txt": "\n\n".join(f"Note {i}.{j} about topic {(i * 7 + j) % 13}." for j in range(20))
+             for i in range(30)}
+    exact = Corpus(Embedder(), chunker=TextChunker())
+    corpus = Corpus(Embedder(), chunker=TextChunker(), index_options={"index_type": index_type, "train_size": 64})
+    for doc_id, text in texts.items():
+        exact.add_document(doc_id, io.StringIO(text))
+        corpus.add_document(doc_id, io.StringIO(text))
+    
+    query = "Note 3.4 about topic 12."
+    results = corpus.search(query, k=5, doc_ids=["doc3.txt", "doc17.txt"])
+    expected = exact.search(query, k=5, doc_ids=["doc3.txt", "doc17.txt"])
+    assert results[0][0].uid == expected[0][0].uid == "doc3.txt/chunk_0004"
+    assert [score for _, score in results] == pytest.approx([score for _, score in expected], abs=1e-5)
+    assert all(chunk.doc_id in ("doc3.txt", "doc17.txt") for chunk, _ in results)
+
+
+def test_corpus_rejects_per_document_layout(tmp_path):
+    corpus = create_corpus()
+    corpus.save(str(tmp_path))
+    meta = Corpus.load_metadata(str(tmp_path))
+    for document in meta["documents"]:
+        document["directory"] = document["doc_id"]
+    (tmp_path / "corpus.json").write_text(json.dumps(meta))
+    
+    with pytest.raises(ValueError, match="rebuild"):
+        Corpus.load(str(tmp_path), Embedder())
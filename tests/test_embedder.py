@@ -1,7 +1,9 @@
 import pytest
+import threading
+import time
 import numpy as np
 from smartqa.chunker import TextChunker
-from smartqa.embedder import Embedder
+from smartqa.embedder import Embedder, load_shared_model
 
 
 def test_embedder_with_chunker():
@@ -66,4 +68,78 @@ def test_embedder_model_dimension():
     
     assert hasattr(embedder, 'dimension'), "Embedder should have dimension attribute"
     assert embedder.dimension > 0, "Dimension should be positive"
-    assert isinstance(embedder.dimension, int), "Dimension should be integer" 
\ No newline at end of file
+    assert isinstance(embedder.dimension, int), "Dimension should be integer" 
+
+def test_embedder_returns_unit_vectors():
+    embedder = Embedder()
+    
+    embeddings = embedder.encode_texts(["Machine learning uses data.", "Neural networks have layers."])
+    query = embedder.encode_single("What is machine learning?")
+    
+    assert np.allclose(np.linalg.norm(embeddings, axis=1), 1.0, atol=1e-5), "Embeddings should be L2-normalized"
+    assert np.allclose(np.linalg.norm(query, axis=1), 1.0, atol=1e-5), "Query embedding should be L2-normalized"
+    assert embeddings.flags["C_CONTIGUOUS"], "Embeddings should be contiguous for FAISS"
+
+
+def test_embedder_without_normalization():
+    embedder = Embedder(normalize=False)
+    
+    embeddings = embedder.encode_texts(["Machine learning uses data."])
+    
+    assert embeddings.dtype == np.float32
+    assert embeddings.shape == (1, embedder.dimension)
+
+
+def test_embedders_share_one_model():
+    first = Embedder()
+    second = Embedder()
+    
+    assert first.model is second.model, "Embedders for the same model should share one loaded instance"
+
+
+def test_load_shared_model_loads_once_across_threads():
+    calls = []
+    
+    def slow_factory(name):
+        calls.append(name)
+        time.sleep(0.05)
+        return object()
+    
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(load_shared_model("shared-test-model", slow_factory)))
+        for _ in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    
+    assert len(calls) == 1, "Concurrent callers should trigger a single load"
+    assert all(model is results[0] for model in results)
+
+
+def test_embedder_parallel_matches_single_process():
+    texts = [f"Sentence {i} about machine learning " + "and data " * (i % 7) for i in range(50)]
+    expected = Embedder().encode_texts(texts)
+    
+    with Embedder(workers=2, batch_size=8) as embedder:
+        embeddings = embedder.encode_texts(texts)
+        assert embedder._pool is not None, "More than one batch should go to the worker pool"
+        again = embedder.encode_texts(texts)
+    
+    assert embedder._pool is None, "Closing should stop the workers"
+    assert embeddings.shape == expected.shape and embeddings.dtype == np.float32
+    assert np.allclose(embeddings, expected, atol=1e-5), "Rows should come back in input order"
+    assert np.allclose(again, expected, atol=1e-5)
+
+
+def test_embedder_parallel_settings():
+    embedder = Embedder(workers=4, batch_size=16)
+    embedder.encode_texts(["Only one batch."] * 16)
+    assert embedder._pool is None, "A single batch should be encoded in-process"
+    
+    with pytest.raises(ValueError):
+        Embedder(workers=0)
+    with pytest.raises(ValueError):
+        Embedder(batch_size=-1)
@@ -0,0 +1,120 @@
+import pytest
+import numpy as np
+from smartqa.embedding_cache import EmbeddingCache
+
+
+def make_vectors(n, dimension=8, seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.random((n, dimension), dtype=np.float32)
+
+
+def test_cache_miss_then_hit(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), "test-model", 8)
+    texts = ["first text", "second text"]
+    vectors = make_vectors(2)
+    
+    embeddings, missing = cache.get_many(texts)
+    assert missing == [0, 1], "Empty cache should miss every text"
+    
+    cache.put_many(texts, vectors)
+    embeddings, missing = cache.get_many(texts)
+    
+    assert missing == [], "Cached texts should all hit"
+    assert np.allclose(embeddings, vectors), "Cached vectors should be returned unchanged"
+    assert cache.get_stats()["hits"] == 2
+    assert cache.get_stats()["misses"] == 2
+
+
+def test_cache_persists_across_instances(tmp_path):
+    texts = ["persisted text"]
+    vectors = make_vectors(1)
+    
+    cache = EmbeddingCache(str(tmp_path), "test-model", 8)
+    cache.put_many(texts, vectors)
+    cache.flush()
+    
+    reopened = EmbeddingCache(str(tmp_path), "test-model", 8)
+    embeddings, missing = reopened.get_many(texts)
+    
+    assert missing == [], "Flushed entries should survive a restart"
+    assert np.allclose(embeddings, vectors)
+
+
+def test_cache_is_keyed_by_model(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), "model-a", 8)
+    cache.put_many(["shared text"], make_vectors(1))
+    cache.flush()
+    
+    other = EmbeddingCache(str(tmp_path), "model-b", 8)
+    _, missing = other.get_many(["shared text"])
+    
+    assert missing == [0], "Vectors from another model should not be served"
+
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), "test-model", 8, max_entries=2)
+    vectors = make_vectors(3)
+    
+    cache.put_many(["a", "b"], vectors[:2])
+    cache.get_many(["a"])
+    cache.put_many(["c"], vectors[2:])
+    
+    assert len(cache) == 2, "Cache should stay within max_entries"
+    assert cache.get_stats()["evictions"] == 1
+    
+    embeddings, missing = cache.get_many(["a", "b", "c"])
+    assert missing == [1], "Least recently used entry should be evicted"
+    assert np.allclose(embeddings[0], vectors[0])
+    assert np.allclose(embeddings[2], vectors[2])
+
+
+def test_cache_reuses_evicted_rows_after_flush(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), "test-model", 8, max_entries=2)
+    vectors = make_vectors(6)
+    
+    for i in range(6):
+        cache.put_many([f"text {i}"], vectors[i:i + 1])
+        cache.flush()
+    
+    embeddings, missing = cache.get_many(["text 4", "text 5"])
+    assert missing == []
+    assert np.allclose(embeddings, vectors[4:])
+    assert cache.capacity <= 2 + 16, "Evicted rows should be recycled instead of growing the file"
+
+
+def test_cache_flush_appends_instead_of_rewriting(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), "test-model", 8, max_entries=1000)
+    vectors = make_vectors(1000)
+    cache.put_many([f"text {i}" for i in range(800)], vectors[:800])
+    cache.flush()
+    
+    index_path = cache.directory / "index.json"
+    snapshot = index_path.read_bytes()
+    for i in range(800, 1000):
+        cache.put_many([f"text {i}"], vectors[i:i + 1])
+        cache.get_many(["text 0"])
+        cache.flush()
+    assert index_path.read_bytes() == snapshot, "A flush should only append the rows it touched"
+    
+    # A flush cut off mid-line loses at most that flush
+    with open(cache.directory / f"index.{cache.generation}.log", "a", encoding="utf-8") as f:
+        f.write('["partial')
+    reopened = EmbeddingCache(str(tmp_path), "test-model", 8, max_entries=1000)
+    assert next(iter(reopened.rows)) == reopened.make_key("test-model", "text 1"), "Replayed hits should keep recency"
+    embeddings, missing = reopened.get_many([f"text {i}" for i in range(1000)])
+    assert missing == []
+    assert np.allclose(embeddings, vectors)
+    
+    # Growing the journal past the cache size folds it into a new snapshot
+    for i in range(3):
+        reopened.get_many([f"text {j}" for j in range(1000)])
+        reopened.flush()
+    assert index_path.read_bytes() != snapshot
+    assert len(list(reopened.directory.glob("index.*.log"))) <= 1, "Old journals should be removed"
+    
+    evicting = EmbeddingCache(str(tmp_path), "test-model", 8, max_entries=100)
+    evicting.flush()
+    again = EmbeddingCache(str(tmp_path), "test-model", 8, max_entries=1000)
+    embeddings, missing = again.get_many([f"text {i}" for i in range(1000)])
+    assert len(again) == 100 and missing == list(range(900))
+    assert np.allclose(embeddings[900:], vectors[900:])
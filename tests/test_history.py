@@ -0,0 +1,100 @@
+import pytest
+import json
+from datetime import datetime, timedelta
+from smartqa.history import HistoryStore
+from smartqa.logger import QALogger
+
+
+def make_entry(i, day=1, model="llama2", input_file="a.txt", cache_hit=None):
+    entry = {
+        "timestamp": datetime(2024, 1, day, 12, 0, i % 60).isoformat(),
+        "query": f"question {i}",
+        "answer": f"answer {i}",
+        "tokens_used": 10,
+        "latency_ms": 100.0 * (i % 3 + 1),
+        "citations_count": 1,
+        "input_file": input_file,
+        "model_name": model,
+        "cost_usd": None
+    }
+    if cache_hit is not None:
+        entry["cache_hit"] = cache_hit
+    return entry
+
+
+def write_log(path, entries):
+    with open(path, "a", encoding="utf-8") as f:
+        for entry in entries:
+            f.write(json.dumps(entry) + "\n")
+
+
+def test_history_recent_and_between(tmp_path):
+    store = HistoryStore(str(tmp_path / "history.db"))
+    store.add_entries(make_entry(i, day=1 + i // 10) for i in range(30))
+    
+    assert len(store) == 30
+    assert [entry["query"] for entry in store.recent(3)] == ["question 29", "question 28", "question 27"]
+    
+    entries = store.between(datetime(2024, 1, 2), datetime(2024, 1, 3))
+    assert [entry["query"] for entry in entries] == [f"question {i}" for i in range(10, 20)]
+    assert len(store.between(datetime(2024, 1, 2), datetime(2024, 1, 3), limit=4)) == 4
+    store.close()
+
+
+def test_history_aggregates(tmp_path):
+    store = HistoryStore(str(tmp_path / "history.db"))
+    store.add_entries([
+        make_entry(0, day=1, model="llama2", cache_hit=True),
+        make_entry(1, day=1, model="mistral", input_file="b.txt", cache_hit=False),
+        make_entry(2, day=2, model="llama2"),
+    ])
+    
+    by_model = {row["model"]: row for row in store.aggregate("model")}
+    assert by_model["llama2"]["interactions"] == 2
+    assert by_model["llama2"]["avg_latency_ms"] == 200.0
+    assert by_model["llama2"]["answer_cache_hit_rate"] == 1.0
+    assert by_model["mistral"]["total_tokens"] == 10
+    
+    assert [row["input_file"] for row in store.aggregate("input_file")] == ["a.txt", "b.txt"]
+    assert [(row["day"], row["interactions"]) for row in store.aggregate("day")] == [("2024-01-01", 2), ("2024-01-02", 1)]
+    assert [row["day"] for row in store.aggregate("day", start_day="2024-01-02")] == ["2024-01-02"]
+    
+    with pytest.raises(ValueError):
+        store.aggregate("query")
+    store.close()
+
+
+def test_history_imports_log_incrementally(tmp_path):
+    log_path = tmp_path / "history.jsonl"
+    write_log(log_path, [make_entry(i) for i in range(5)])
+    store = HistoryStore(str(tmp_path / "history.db"))
+    
+    assert store.import_log(str(log_path)) == 5
+    assert store.import_log(str(log_path)) == 0, "Imported entries should not be read again"
+    
+    write_log(log_path, [make_entry(i) for i in range(5, 8)])
+    assert store.import_log(str(log_path)) == 3
+    assert len(store) == 8
+    assert store.recent(1)[0]["query"] == "question 7"
+    store.close()
+
+
+def test_history_import_follows_rotation(tmp_path):
+    log_path = tmp_path / "history.jsonl"
+    logger = QALogger(str(log_path), max_bytes=1000, compress=True)
+    store = HistoryStore(str(tmp_path / "history.db"))
+    
+    def log(i):
+        logger.log_interaction(f"question {i}", "answer", 1, 10.0, [], "a.txt")
+    
+    for i in range(3):
+        log(i)
+    store.import_log(logger)
+    for i in range(3, 20):
+        log(i)
+    store.import_log(logger)
+    
+    assert len(logger.segments()) > 1
+    assert sorted(entry["query"] for entry in store.between(datetime.now() - timedelta(hours=1), datetime.now() + timedelta(hours=1))) == \
+        sorted(f"question {i}" for i in range(20)), "Every entry should be imported once across rotated segments"
+    store.close()
@@ -1,8 +1,17 @@
 import pytest
-from smartqa.chunker import TextChunker
+import asyncio
+import json
+import time
+from smartqa.chunker import Chunk, TextChunker
 from smartqa.embedder import Embedder
 from smartqa.retriever import Retriever
+from smartqa.answer_cache import AnswerCache
+from smartqa.context import ContextPacker
 from smartqa.llm import LLMResponseGenerator
+from smartqa.logger import QALogger
+from smartqa.mock_ollama import MockOllama
+from smartqa.response_cache import ResponseCache
+from smartqa import tracing
 
 
 def load_example_text():
@@ -134,4 +143,327 @@ def test_llm_response_structure():
     assert response["tokens_used"] >= 0, "Tokens used should be non-negative"
     assert response["latency_ms"] >= 0, "Latency should be non-negative"
     
-    print("✅ LLM response structure test PASSED") 
\ No newline at end of file
+    print("✅ LLM response structure test PASSED") 
+
+class FakeStreamResponse:
+    status_code = 200
+    
+    def __init__(self, lines):
+        self.lines = lines
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        return False
+    
+    def iter_lines(self):
+        return iter(self.lines)
+
+
+def test_llm_streaming_tokens(monkeypatch, tmp_path):
+    lines = [
+        b'{"response": "Machine", "done": false}',
+        b'{"response": " learning", "done": false}',
+        b'',
+        b'{"response": " learns.", "done": false}',
+        b'{"response": "", "done": true, "eval_count": 3}'
+    ]
+    llm = LLMResponseGenerator(logger=QALogger(str(tmp_path / "history.jsonl")))
+    monkeypatch.setattr(llm.session, "post", lambda *args, **kwargs: FakeStreamResponse(lines))
+    chunks = [(Chunk("chunk_0000", "Machine learning learns from data.", 0, 34), 0.9)]
+    
+    tokens = []
+    response = llm.generate_response("What is ML?", chunks, "test.txt", on_token=tokens.append)
+    
+    assert tokens == ["Machine", " learning", " learns."], "Tokens should be delivered as they arrive"
+    assert response["answer"] == "Machine learning learns.", "Answer should be the joined tokens"
+    assert response["tokens_used"] == 3, "Token count should come from the final message"
+    assert response["ttft_ms"] is not None and response["ttft_ms"] <= response["latency_ms"]
+    
+    entry = json.loads((tmp_path / "history.jsonl").read_text().splitlines()[-1])
+    assert "ttft_ms" in entry, "Streamed interactions should log time to first token"
+    
+    print("✅ LLM streaming test PASSED")
+
+
+def test_llm_session_settings():
+    llm = LLMResponseGenerator(timeout=5, pool_size=8, max_retries=3)
+    adapter = llm.session.get_adapter("http://localhost:11434")
+    
+    assert llm.timeout == 5
+    assert adapter._pool_maxsize == 8, "Pool size should be applied to the HTTP adapter"
+    assert adapter.max_retries.total == 3, "Retries should be applied to the HTTP adapter"
+    
+    with pytest.raises(ValueError):
+        LLMResponseGenerator(pool_size=0)
+    
+    llm.close()
+
+
+def test_llm_answer_cache_skips_ollama(monkeypatch, tmp_path):
+    def fail(*args, **kwargs):
+        raise AssertionError("Ollama should not be called on a cache hit")
+    
+    cache = AnswerCache()
+    llm = LLMResponseGenerator(logger=QALogger(str(tmp_path / "history.jsonl")), answer_cache=cache)
+    monkeypatch.setattr(llm.session, "post", fail)
+    
+    chunks = [(Chunk("chunk_0000", "Machine learning learns from data.", 0, 34), 0.9)]
+    key = AnswerCache.make_key("fingerprint", llm.model, ["chunk_0000"])
+    cache.put(key, "What is ML?", "ML learns from data.")
+    
+    tokens = []
+    response = llm.generate_response("what is ML", chunks, "test.txt", tokens.append, "fingerprint")
+    
+    assert response["cache_hit"] is True
+    assert response["answer"] == "ML learns from data."
+    assert tokens == ["ML learns from data."], "A cached answer should still reach the stream callback"
+    assert response["citations"][0]["chunk_id"] == "chunk_0000"
+    
+    stats = llm.logger.get_stats()
+    assert stats["answer_cache_hits"] == 1
+    assert stats["answer_cache_hit_rate"] == 1.0
+
+
+def test_llm_answer_cache_keeps_only_complete_generations(monkeypatch, tmp_path):
+    class CutStream:
+        # The connection drops before Ollama sends the done line
+        status_code = 200
+        
+        def __enter__(self):
+            return self
+        
+        def __exit__(self, *exc):
+            return False
+        
+        def iter_lines(self):
+            return iter([b'{"response": "ML", "done": false}'])
+    
+    chunks = [(Chunk("chunk_0000", "Machine learning learns from data.", 0, 34), 0.9)]
+    cache = AnswerCache()
+    llm = LLMResponseGenerator(logger=QALogger(str(tmp_path / "history.jsonl")), answer_cache=cache)
+    monkeypatch.setattr(llm.session, "post", lambda *args, **kwargs: CutStream())
+    llm.generate_response("What is ML?", chunks, "test.txt", lambda token: None, "fingerprint")
+    assert len(cache) == 0, "A truncated stream shouldn't be cached"
+    llm.close()
+    
+    with MockOllama(answer="") as mock:
+        llm = LLMResponseGenerator(base_url=mock.url, logger=QALogger(str(tmp_path / "history.jsonl")),
+                                   answer_cache=cache)
+        response = llm.generate_response("What is ML?", chunks, "test.txt", index_fingerprint="fingerprint")
+        assert response["answer"].startswith("I don't have information")
+        assert len(cache) == 0, "The fallback for an empty answer shouldn't be cached"
+        llm.close()
+    
+    with MockOllama(answer="ML learns from data.") as mock:
+        llm = LLMResponseGenerator(base_url=mock.url, logger=QALogger(str(tmp_path / "history.jsonl")),
+                                   answer_cache=cache)
+        llm.generate_response("What is ML?", chunks, "test.txt", index_fingerprint="fingerprint")
+        llm.close()
+    assert len(cache) == 1
+
+
+def test_llm_response_cache_skips_ollama(monkeypatch, tmp_path):
+    calls = []
+    
+    class FakeResponse:
+        status_code = 200
+        
+        def json(self):
+            return {"response": "ML learns from data.", "eval_count": 5, "done": True}
+    
+    def post(*args, **kwargs):
+        calls.append(kwargs["json"])
+        return FakeResponse()
+    
+    chunks = [(Chunk("chunk_0000", "Machine learning learns from data.", 0, 34), 0.9)]
+    cache_path = str(tmp_path / "responses.db")
+    
+    for run in range(2):
+        # A fresh generator and cache per run, as separate CLI invocations would have
+        cache = ResponseCache(cache_path)
+        llm = LLMResponseGenerator(logger=QALogger(str(tmp_path / "history.jsonl")), response_cache=cache)
+        monkeypatch.setattr(llm.session, "post", post)
+        response = llm.generate_response("What is ML?", chunks, "test.txt")
+        cache.close()
+    
+    assert len(calls) == 1, "An identical prompt should only reach Ollama once"
+    assert response["answer"] == "ML learns from data."
+    assert response["response_cache_hit"] is True
+    assert response["tokens_used"] == 0
+
+
+def test_llm_response_cache_keeps_only_complete_generations(monkeypatch, tmp_path):
+    lines = [b'{"response": "ML learns", "done": false}', b'{"response": " from", "done": false}']
+    
+    class CutStream:
+        # The connection drops before Ollama sends the done line
+        status_code = 200
+        
+        def __enter__(self):
+            return self
+        
+        def __exit__(self, *exc):
+            return False
+        
+        def iter_lines(self):
+            return iter(lines)
+    
+    chunks = [(Chunk("chunk_0000", "Machine learning learns from data.", 0, 34), 0.9)]
+    cache = ResponseCache(str(tmp_path / "responses.db"))
+    llm = LLMResponseGenerator(logger=QALogger(str(tmp_path / "history.jsonl")), response_cache=cache)
+    monkeypatch.setattr(llm.session, "post", lambda *args, **kwargs: CutStream())
+    llm.generate_response("What is ML?", chunks, "test.txt", on_token=lambda token: None)
+    assert cache.get_stats()["entries"] == 0, "A truncated stream shouldn't be cached"
+    llm.close()
+    
+    with MockOllama(answer="") as mock:
+        llm = LLMResponseGenerator(base_url=mock.url, logger=QALogger(str(tmp_path / "history.jsonl")),
+                                   response_cache=cache)
+        llm.generate_response("What is ML?", chunks, "test.txt", on_token=lambda token: None)
+        llm.generate_response("What is ML?", chunks, "test.txt")
+        llm.close()
+    assert cache.get_stats()["entries"] == 0, "An empty answer shouldn't be cached"
+    assert mock.get_stats()["requests"] == 2
+    cache.close()
+
+
+def test_llm_prompt_fits_context_budget(tmp_path, monkeypatch):
+    prompts = []
+    
+    class FakeResponse:
+        status_code = 200
+        
+        def json(self):
+            return {"response": "Deep learning uses neural networks.", "eval_count": 5}
+    
+    def post(*args, **kwargs):
+        prompts.append(kwargs["json"]["prompt"])
+        return FakeResponse()
+    
+    filler = " ".join(f"Unrelated filler sentence number {i}." for i in range(100))
+    chunks = [
+        (Chunk("chunk_0000", "Deep learning uses neural networks. " + filler), 0.9),
+        (Chunk("chunk_0001", "Unrelated filler sentence number 0. Unrelated filler sentence number 1."), 0.8),
+        (Chunk("chunk_0002", "Machine learning learns from data."), 0.7),
+    ]
+    llm = LLMResponseGenerator(logger=QALogger(str(tmp_path / "history.jsonl")),
+                               context_packer=ContextPacker(max_tokens=120, max_chunk_tokens=60))
+    monkeypatch.setattr(llm.session, "post", post)
+    
+    response = llm.generate_response("What does deep learning use?", chunks, "test.txt")
+    
+    assert "Deep learning uses neural networks." in prompts[0], "The most relevant sentence should be kept"
+    assert response["context_tokens"] <= 120, "The context should fit the token budget"
+    assert [c["chunk_id"] for c in response["citations"]] == ["chunk_0000", "chunk_0002"], \
+        "A chunk already covered by a better one should be dropped from the prompt and citations"
+
+
+def test_llm_records_stage_timings(tmp_path, monkeypatch):
+    class FakeResponse:
+        status_code = 200
+        
+        def json(self):
+            return {"response": "ML learns from data.", "eval_count": 5, "load_duration": 2_000_000,
+                    "prompt_eval_duration": 30_000_000, "eval_duration": 120_000_000}
+    
+    llm = LLMResponseGenerator(logger=QALogger(str(tmp_path / "history.jsonl")))
+    monkeypatch.setattr(llm.session, "post", lambda *args, **kwargs: FakeResponse())
+    chunks = [(Chunk("chunk_0000", "Machine learning learns from data.", 0, 34), 0.9)]
+    
+    with tracing.start_trace() as trace:
+        tracing.record("encode_query", 4.0)
+        response = llm.generate_response("What is ML?", chunks, "test.txt")
+    
+    spans = response["spans"]
+    assert spans["ollama_load"] == 2.0 and spans["ollama_prompt_eval"] == 30.0 and spans["ollama_eval"] == 120.0, \
+        "Ollama's nanosecond durations should be recorded in milliseconds"
+    assert "http" in spans and "prompt_build" in spans
+    assert spans["encode_query"] == 4.0, "Generation should join the caller's trace"
+    assert trace.snapshot() == spans
+    
+    entry = json.loads((tmp_path / "history.jsonl").read_text().splitlines()[-1])
+    assert entry["spans"] == spans, "Stage timings should be logged with the interaction"
+    stages = llm.logger.get_stats()["stage_latency_ms"]
+    assert stages["ollama_eval"]["p50"] == pytest.approx(120, rel=0.01)
+
+
+def test_llm_against_mock_ollama(tmp_path):
+    chunks = [(Chunk("chunk_0000", "Machine learning learns from data.", 0, 34), 0.9)]
+    with MockOllama(answer="Machine learning learns from data.", token_delay_ms=5) as mock:
+        llm = LLMResponseGenerator(base_url=mock.url, logger=QALogger(str(tmp_path / "history.jsonl")))
+        response = llm.generate_response("What is ML?", chunks, "test.txt")
+        tokens = []
+        streamed = llm.generate_response("What is ML?", chunks, "test.txt", on_token=tokens.append)
+        llm.close()
+    
+    assert response["answer"] == "Machine learning learns from data."
+    assert response["tokens_used"] == 5
+    assert response["spans"]["ollama_eval"] >= 20, "Ollama's reported generation time should be recorded"
+    assert "".join(tokens) == streamed["answer"] and len(tokens) == 5
+    assert streamed["ttft_ms"] < streamed["latency_ms"]
+    assert "Machine learning learns from data." in mock.last_request["prompt"]
+
+
+def test_llm_retries_busy_ollama(tmp_path):
+    chunks = [(Chunk("chunk_0000", "Machine learning learns from data.", 0, 34), 0.9)]
+    with MockOllama() as mock:
+        mock.fail_next(1, status=503)
+        llm = LLMResponseGenerator(base_url=mock.url, logger=QALogger(str(tmp_path / "history.jsonl")),
+                                   max_retries=2)
+        response = llm.generate_response("What is ML?", chunks, "test.txt")
+        
+        mock.fail_next(1, status=500)
+        failed = llm.generate_response("What is ML?", chunks, "test.txt")
+        llm.close()
+    
+    assert not response["answer"].startswith("Error"), "A 503 should be retried"
+    assert failed["answer"] == "Error generating response: Ollama API error: 500", "A 500 should not be retried"
+    assert mock.get_stats()["requests"] == 3
+
+
+def test_llm_times_out_slow_ollama(tmp_path):
+    chunks = [(Chunk("chunk_0000", "Machine learning learns from data.", 0, 34), 0.9)]
+    with MockOllama(prompt_delay_ms=1000) as mock:
+        llm = LLMResponseGenerator(base_url=mock.url, logger=QALogger(str(tmp_path / "history.jsonl")),
+                                   timeout=0.1, max_retries=0)
+        response = llm.generate_response("What is ML?", chunks, "test.txt")
+        llm.close()
+    
+    assert response["answer"].startswith("Error generating response"), "A slow model should time out"
+    assert response["latency_ms"] < 1000
+
+
+def test_llm_does_not_resend_timed_out_generations(tmp_path):
+    chunks = [(Chunk("chunk_0000", "Machine learning learns from data.", 0, 34), 0.9)]
+    with MockOllama(prompt_delay_ms=1000) as mock:
+        # Default retry settings
+        llm = LLMResponseGenerator(base_url=mock.url, logger=QALogger(str(tmp_path / "history.jsonl")), timeout=0.1)
+        response = llm.generate_response("What is ML?", chunks, "test.txt")
+        llm.close()
+        stats = mock.get_stats()
+    
+    assert response["answer"].startswith("Error generating response")
+    assert stats["requests"] == 1, "A generation that timed out shouldn't be sent again"
+    assert stats["max_in_flight"] == 1
+
+
+def test_llm_concurrent_requests_share_the_pool(tmp_path):
+    chunks = [(Chunk("chunk_0000", "Machine learning learns from data.", 0, 34), 0.9)]
+    with MockOllama(prompt_delay_ms=100, max_concurrency=4) as mock:
+        llm = LLMResponseGenerator(base_url=mock.url, logger=QALogger(str(tmp_path / "history.jsonl")),
+                                   pool_size=4)
+        
+        async def ask_all():
+            return await asyncio.gather(*(llm.agenerate_response(f"Question {i}?", chunks, "test.txt")
+                                          for i in range(8)))
+        
+        start = time.perf_counter()
+        responses = asyncio.run(ask_all())
+        elapsed = time.perf_counter() - start
+        llm.close()
+    
+    assert all(not response["answer"].startswith("Error") for response in responses)
+    assert mock.get_stats()["max_in_flight"] == 4
+    assert elapsed < 0.6, "Eight 100ms requests four at a time should take about 200ms"
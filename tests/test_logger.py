@@ -1,6 +1,12 @@
 import pytest
 import json
 import os
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime
+from smartqa.history import HistoryStore
 from smartqa.logger import QALogger
 
 
@@ -99,4 +105,233 @@ def test_logger_empty_stats():
     
     assert stats["total_interactions"] == 0
     assert stats["total_tokens"] == 0
-    assert stats["avg_latency_ms"] == 0 
\ No newline at end of file
+    assert stats["avg_latency_ms"] == 0 
+
+def test_logger_ttft_stats(tmp_path):
+    logger = QALogger(str(tmp_path / "history.jsonl"))
+    
+    for ttft_ms in [None, 100.0, 300.0]:
+        logger.log_interaction(
+            query="test",
+            answer="test answer",
+            tokens_used=5,
+            latency_ms=1000,
+            citations=[],
+            input_file="test.txt",
+            ttft_ms=ttft_ms
+        )
+    
+    stats = logger.get_stats()
+    
+    assert stats["avg_ttft_ms"] == 200.0, "Average TTFT should only count streamed interactions"
+    assert stats["avg_latency_ms"] == 1000.0
+
+
+def log_test_interaction(logger, query="test"):
+    logger.log_interaction(
+        query=query,
+        answer="test answer",
+        tokens_used=5,
+        latency_ms=100,
+        citations=[],
+        input_file="test.txt"
+    )
+
+
+def read_queries(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line)["query"] for line in f]
+
+
+def test_buffered_logger_flushes_in_background(tmp_path):
+    logger = QALogger(str(tmp_path / "history.jsonl"), flush_interval=0.05)
+    
+    log_test_interaction(logger, "first")
+    assert not (tmp_path / "history.jsonl").exists(), "Entries should be buffered, not written on the request path"
+    
+    deadline = time.time() + 2
+    while not (tmp_path / "history.jsonl").exists() and time.time() < deadline:
+        time.sleep(0.01)
+    assert read_queries(tmp_path / "history.jsonl") == ["first"], "The background thread should flush the buffer"
+    
+    log_test_interaction(logger, "second")
+    logger.close()
+    assert read_queries(tmp_path / "history.jsonl") == ["first", "second"], "Closing should flush what is left"
+
+
+def test_buffered_logger_flushes_when_full(tmp_path):
+    logger = QALogger(str(tmp_path / "history.jsonl"), flush_interval=60, buffer_size=3)
+    
+    for i in range(3):
+        log_test_interaction(logger, f"q{i}")
+    
+    deadline = time.time() + 2
+    while not (tmp_path / "history.jsonl").exists() and time.time() < deadline:
+        time.sleep(0.01)
+    assert len(read_queries(tmp_path / "history.jsonl")) == 3
+    assert logger.get_stats()["total_interactions"] == 3
+    logger.close()
+
+
+@pytest.mark.parametrize("compress", [False, True])
+def test_logger_rotates_by_size(tmp_path, compress):
+    logger = QALogger(str(tmp_path / "history.jsonl"), max_bytes=600, compress=compress)
+    
+    for i in range(10):
+        log_test_interaction(logger, f"q{i}")
+    
+    segments = logger.segments()
+    assert len(segments) > 1, "The log should have been rotated"
+    assert segments[-1] == tmp_path / "history.jsonl"
+    assert all(path.stat().st_size <= 600 for path in segments if not compress or path.suffix != ".gz")
+    assert all(path.suffix == ".gz" for path in segments[:-1]) == compress
+    assert logger.get_stats()["total_interactions"] == 10, "Stats should cover every segment"
+    assert logger.get_stats()["log_segments"] == len(segments)
+
+
+def test_logger_rotates_by_age(tmp_path):
+    path = tmp_path / "history.jsonl"
+    logger = QALogger(str(path), rotate_interval=3600)
+    log_test_interaction(logger, "old")
+    
+    entry = json.loads(path.read_text(encoding="utf-8"))
+    entry["timestamp"] = datetime.fromtimestamp(time.time() - 7200).isoformat()
+    path.write_text(json.dumps(entry) + "\n", encoding="utf-8")
+    
+    log_test_interaction(logger, "new")
+    
+    assert read_queries(path) == ["new"], "Entries older than the interval should move to a segment"
+    assert [read_queries(segment) for segment in logger.segments()[:-1]] == [["old"]]
+
+
+def test_logger_imports_without_embedding_stack():
+    # Worker processes that only log shouldn't pay for importing torch and FAISS
+    script = "import sys, smartqa.logger; print(sorted({'faiss', 'sentence_transformers', 'torch'} & set(sys.modules)))"
+    result = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, timeout=300)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip() == "[]"
+
+
+def test_logger_concurrent_processes(tmp_path):
+    path = str(tmp_path / "history.jsonl")
+    script = (
+        "import sys\n"
+        "from smartqa.logger import QALogger\n"
+        "logger = QALogger(sys.argv[1], flush_interval=0.01, buffer_size=7, max_bytes=5000)\n"
+        "for i in range(50):\n"
+        "    logger.log_interaction(f'{sys.argv[2]}-{i}', 'answer', 1, 1.0, [], 'test.txt')\n"
+        "logger.close()\n"
+    )
+    processes = [subprocess.Popen([sys.executable, "-c", script, path, str(worker)]) for worker in range(4)]
+    for process in processes:
+        assert process.wait(timeout=300) == 0
+    
+    logger = QALogger(path)
+    queries = [query for segment in logger.segments() for query in read_queries(segment)]
+    assert sorted(queries) == sorted(f"{worker}-{i}" for worker in range(4) for i in range(50)), \
+        "Every entry should be written exactly once, whole, across rotations"
+
+
+def test_logger_readers_tolerate_compression(tmp_path, monkeypatch):
+    # Readers list segments without the writer's lock, so a segment may be gzipped
+    # and its original removed between listing and reading it; a pause after listing
+    # makes that likely
+    list_segments = QALogger.segments
+    
+    def slow_segments(self):
+        paths = list_segments(self)
+        time.sleep(0.002)
+        return paths
+    
+    monkeypatch.setattr(QALogger, "segments", slow_segments)
+    path = str(tmp_path / "history.jsonl")
+    writer = QALogger(path, max_bytes=1500, compress=True)
+    errors = []
+    done = threading.Event()
+    
+    def write():
+        try:
+            for i in range(300):
+                log_test_interaction(writer, f"q{i}")
+        finally:
+            done.set()
+    
+    def read(action):
+        while not done.is_set():
+            try:
+                action()
+            except Exception as e:
+                errors.append(e)
+                return
+    
+    store = HistoryStore(str(tmp_path / "history.db"))
+    readers = [lambda: QALogger(path).get_stats(), lambda: QALogger(path).get_stats(), lambda: store.import_log(path)]
+    threads = [threading.Thread(target=write)] + [threading.Thread(target=read, args=(action,)) for action in readers]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=120)
+    
+    assert errors == []
+    assert QALogger(path).get_stats()["total_interactions"] == 300
+    store.import_log(path)
+    assert len(store) == 300, "Every entry should be imported once"
+
+
+def scanned_offsets(logger):
+    starts = []
+    original = logger._scan
+    logger._scan = lambda path, start, aggregate: starts.append((path.name, start)) or original(path, start, aggregate)
+    return starts
+
+
+def test_logger_stats_are_incremental(tmp_path):
+    path = tmp_path / "history.jsonl"
+    logger = QALogger(str(path))
+    for i in range(5):
+        log_test_interaction(logger, f"q{i}")
+    assert logger.get_stats()["total_interactions"] == 5
+    
+    # Another process appends without keeping the checkpoint current
+    checkpoint = path.stat().st_size
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps({"query": "other", "tokens_used": 7, "latency_ms": 50}) + "\n")
+    log_test_interaction(logger, "q5")
+    
+    starts = scanned_offsets(logger)
+    stats = logger.get_stats()
+    assert starts == [("history.jsonl", checkpoint)], "Only the tail past the checkpoint should be read"
+    assert stats["total_interactions"] == 7
+    assert stats["total_tokens"] == 5 * 6 + 7
+    
+    log_test_interaction(logger, "q6")
+    starts.clear()
+    assert logger.get_stats()["total_interactions"] == 8
+    assert starts == [("history.jsonl", path.stat().st_size)], "Appends should keep the checkpoint current"
+
+
+def test_logger_stats_survive_rotation(tmp_path):
+    logger = QALogger(str(tmp_path / "history.jsonl"), max_bytes=800, compress=True)
+    for i in range(4):
+        log_test_interaction(logger, f"q{i}")
+    logger.get_stats()
+    for i in range(4, 20):
+        log_test_interaction(logger, f"q{i}")
+    
+    stats = logger.get_stats()
+    logger.checkpoint_file.unlink()
+    assert stats == logger.get_stats(), "Incremental stats should match a full rescan"
+    assert stats["total_interactions"] == 20
+
+
+def test_logger_stats_rebuild_when_log_replaced(tmp_path):
+    path = tmp_path / "history.jsonl"
+    logger = QALogger(str(path))
+    for i in range(3):
+        log_test_interaction(logger, f"q{i}")
+    assert logger.get_stats()["total_interactions"] == 3
+    
+    path.unlink()
+    log_test_interaction(logger, "fresh")
+    
+    assert logger.get_stats()["total_interactions"] == 1, "Stats should only count entries still on disk"
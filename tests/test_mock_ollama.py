@@ -0,0 +1,71 @@
+import json
+import threading
+import time
+import pytest
+import requests
+from smartqa.mock_ollama import DEFAULT_ANSWER, MockOllama
+
+
+def test_mock_ollama_generate():
+    with MockOllama(answer="Data teaches machines.") as mock:
+        result = requests.post(f"{mock.url}/api/generate", json={"model": "llama2", "prompt": "hi", "stream": False},
+                               timeout=5).json()
+        
+        assert result["response"] == "Data teaches machines."
+        assert result["done"] and result["eval_count"] == 3
+        assert {"load_duration", "prompt_eval_duration", "eval_duration"} <= set(result)
+        assert mock.last_request["prompt"] == "hi"
+        
+        assert requests.get(mock.url, timeout=5).text == "Ollama is running"
+        assert requests.post(f"{mock.url}/api/chat", json={}, timeout=5).status_code == 404
+
+
+def test_mock_ollama_streams_tokens_with_delay():
+    with MockOllama(prompt_delay_ms=50, token_delay_ms=20) as mock:
+        start = time.perf_counter()
+        arrivals = []
+        messages = []
+        with requests.post(f"{mock.url}/api/generate", json={"prompt": "hi"}, timeout=5, stream=True) as response:
+            for line in response.iter_lines():
+                if line:
+                    arrivals.append(time.perf_counter() - start)
+                    messages.append(json.loads(line))
+    
+    assert "".join(message["response"] for message in messages) == DEFAULT_ANSWER
+    assert messages[-1]["done"] and messages[-1]["eval_count"] == len(messages) - 1
+    assert arrivals[0] >= 0.05, "The first token should wait for the prompt delay"
+    assert arrivals[-1] - arrivals[0] >= 0.02 * (len(messages) - 2), "Tokens should be spaced by the token delay"
+
+
+def test_mock_ollama_injects_failures():
+    with MockOllama(failure_rate=0.5, seed=0) as mock:
+        mock.fail_next(2, status=503)
+        statuses = [requests.post(f"{mock.url}/api/generate", json={"stream": False}, timeout=5).status_code
+                    for _ in range(40)]
+    
+    assert statuses[:2] == [503, 503], "Planned failures should come first"
+    assert 5 < statuses.count(500) < 35, "About half the other requests should fail"
+    assert mock.get_stats()["failures"] == 40 - statuses.count(200)
+    
+    with pytest.raises(ValueError):
+        MockOllama(failure_rate=2)
+
+
+def test_mock_ollama_limits_concurrency():
+    with MockOllama(prompt_delay_ms=100, max_concurrency=2, max_queue=2) as mock:
+        statuses = []
+        
+        def post():
+            statuses.append(requests.post(f"{mock.url}/api/generate", json={"stream": False}, timeout=5).status_code)
+        
+        threads = [threading.Thread(target=post) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+            time.sleep(0.005)
+        for thread in threads:
+            thread.join()
+    
+    stats = mock.get_stats()
+    assert stats["max_in_flight"] == 2, "No more than max_concurrency requests should generate at once"
+    assert statuses.count(200) == 4 and statuses.count(503) == 4, "Requests past the queue should be turned away"
+    assert stats["rejected"] == 4
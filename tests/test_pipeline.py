@@ -0,0 +1,149 @@
+import pytest
+import asyncio
+import threading
+import time
+from smartqa.chunker import TextChunker
+from smartqa.embedder import Embedder
+from smartqa.retriever import Retriever
+from smartqa.pipeline import QAPipeline
+from smartqa.reranker import Reranker
+from smartqa import tracing
+
+
+class SlowLLM:
+
+    def __init__(self, delay=0.05):
+        self.delay = delay
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+    
+    def generate_response(self, query, relevant_chunks, input_file="unknown", on_token=None, index_fingerprint=None,
+                          query_embedding=None):
+        with self.lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(self.delay)
+        with self.lock:
+            self.in_flight -= 1
+        return {"answer": f"answer to {query}", "citations": [], "tokens_used": 1, "latency_ms": self.delay * 1000}
+    
+    async def agenerate_response(self, query, relevant_chunks, input_file="unknown", on_token=None, index_fingerprint=None,
+                                 query_embedding=None):
+        return await asyncio.to_thread(self.generate_response, query, relevant_chunks, input_file, on_token,
+                                       index_fingerprint, query_embedding)
+
+
+def create_retriever():
+    text = (
+        "Artificial intelligence is a branch of computer science.\n\n"
+        "Machine learning allows computers to learn from data.\n\n"
+        "Deep learning uses neural networks for complex tasks."
+    )
+    retriever = Retriever(Embedder())
+    retriever.add_chunks(TextChunker().create_chunks(text))
+    return retriever
+
+
+def test_pipeline_answer_many_keeps_order():
+    llm = SlowLLM()
+    pipeline = QAPipeline(create_retriever(), llm, k=2, concurrency=4)
+    questions = [f"question {i} about machine learning" for i in range(10)]
+    
+    completed = []
+    results = asyncio.run(pipeline.answer_many(questions, "test.txt", lambda index, result: completed.append(index)))
+    
+    assert [r["question"] for r in results] == questions, "Results should follow the input order"
+    assert all(r["response"]["answer"] == f"answer to {q}" for r, q in zip(results, questions))
+    assert all(len(r["search_results"]) == 2 for r in results), "Each question should carry its retrieval"
+    assert sorted(completed) == list(range(10)), "on_result should fire once per question"
+    
+    print("✅ Pipeline ordering test PASSED")
+
+
+def test_pipeline_bounds_concurrency():
+    llm = SlowLLM()
+    pipeline = QAPipeline(create_retriever(), llm, concurrency=3)
+    
+    start = time.time()
+    asyncio.run(pipeline.answer_many([f"question {i}" for i in range(9)]))
+    elapsed = time.time() - start
+    
+    assert llm.max_in_flight == 3, "At most `concurrency` generations should run at once"
+    assert elapsed < 9 * llm.delay, "Generations should overlap"
+
+
+def test_pipeline_batches_retrieval_independently_of_concurrency():
+    pipeline = QAPipeline(create_retriever(), SlowLLM(delay=0), concurrency=2, retrieval_batch_size=8)
+    batch_sizes = []
+    embed_queries = pipeline.retriever.embed_queries
+    pipeline.retriever.embed_queries = lambda queries: batch_sizes.append(len(queries)) or embed_queries(queries)
+    
+    results = asyncio.run(pipeline.answer_many([f"question {i}" for i in range(10)]))
+    
+    assert batch_sizes == [8, 2], "Retrieval batches shouldn't shrink to the number of LLM workers"
+    assert all(result is not None for result in results)
+    
+    print("✅ Pipeline concurrency test PASSED")
+
+
+def test_pipeline_single_answer():
+    pipeline = QAPipeline(create_retriever(), SlowLLM(delay=0), k=1)
+    result = pipeline.answer("What is deep learning?")
+    
+    assert len(result["search_results"]) == 1
+    assert result["response"]["answer"] == "answer to What is deep learning?"
+
+
+def test_pipeline_invalid_settings():
+    with pytest.raises(ValueError):
+        QAPipeline(None, None, concurrency=0)
+    with pytest.raises(ValueError):
+        QAPipeline(None, None, k=0)
+    with pytest.raises(ValueError):
+        QAPipeline(None, None, retrieval_batch_size=-1)
+
+
+def test_pipeline_reranks_wider_candidates():
+    reranker = Reranker(candidates=3, time_budget_ms=0)
+    pipeline = QAPipeline(create_retriever(), SlowLLM(delay=0), k=1, reranker=reranker)
+    
+    result = pipeline.answer("What do neural networks do in deep learning?")
+    
+    assert len(result["search_results"]) == 1, "The reranker should cut candidates down to k"
+    assert result["search_results"][0][0].text.startswith("Deep learning")
+    assert reranker.get_stats()["misses"] == 3, "All candidates should be scored"
+
+
+def test_pipeline_traces_each_question():
+    seen = {}
+    
+    class TracingLLM(SlowLLM):
+    
+        def generate_response(self, query, *args, **kwargs):
+            tracing.record("http", 1.0)
+            seen[query] = tracing.current_trace().snapshot()
+            return super().generate_response(query, *args, **kwargs)
+    
+    pipeline = QAPipeline(create_retriever(), TracingLLM(delay=0.01), k=2, concurrency=2)
+    batch_sizes = {}
+    embed_queries = pipeline.retriever.embed_queries
+    
+    def slow_embed_queries(queries):
+        # A fixed cost per batch on top of the real encoding
+        tracing.record("encode_query", 40.0)
+        batch_sizes.update((query, len(queries)) for query in queries)
+        return embed_queries(queries)
+    
+    pipeline.retriever.embed_queries = slow_embed_queries
+    questions = [f"question {i} about machine learning" for i in range(4)]
+    asyncio.run(pipeline.answer_many(questions))
+    pipeline.answer("What is deep learning?")
+    
+    assert set(seen) == set(questions) | {"What is deep learning?"}
+    assert max(batch_sizes.values()) > 1
+    for query, spans in seen.items():
+        assert spans["http"] == 1.0, "Each question should get its own trace"
+        assert "encode_query" in spans and "index_search" in spans, "Retrieval time should reach the LLM's trace"
+        assert spans["encode_query"] == pytest.approx(40.0 / batch_sizes[query], abs=2.0), \
+            "A batched question should be charged its share of the batch's retrieval"
@@ -0,0 +1,89 @@
+import pytest
+import time
+from smartqa.chunker import Chunk
+from smartqa.reranker import Reranker, create_reranker
+
+
+def candidates():
+    texts = [
+        "Artificial intelligence is a branch of computer science.",
+        "Machine learning allows computers to learn from data.",
+        "Deep learning uses neural networks for complex tasks.",
+        "Paris is the capital of France.",
+    ]
+    return [(Chunk(f"chunk_{i:04d}", text), 0.5 - i * 0.1) for i, text in enumerate(texts)]
+
+
+def count_predictions(reranker):
+    calls = []
+    original = reranker.model.predict
+    reranker.model.predict = lambda pairs, **kwargs: calls.append(len(pairs)) or original(pairs, **kwargs)
+    return calls
+
+
+def test_reranker_reorders_and_truncates():
+    reranker = Reranker(time_budget_ms=0)
+    results = candidates()
+    
+    reranked = reranker.rerank("What do deep neural networks do?", results, k=2)
+    
+    assert len(reranked) == 2, "Only the best k candidates should be kept"
+    assert reranked[0][0].id == "chunk_0002", "The cross-encoder should pick the most relevant chunk"
+    assert reranked[0][1] == results[2][1], "Retrieval scores should be kept"
+    assert reranker.rerank("anything", [], k=2) == []
+
+
+def test_reranker_caches_pair_scores():
+    reranker = Reranker(batch_size=3, time_budget_ms=0)
+    calls = count_predictions(reranker)
+    try:
+        first = reranker.rerank("What is machine learning?", candidates(), k=3)
+        second = reranker.rerank("What is machine learning?", candidates(), k=3)
+    finally:
+        del reranker.model.predict
+    
+    assert calls == [3, 1], "Candidates should be scored in batches, and only once"
+    assert [chunk.id for chunk, _ in first] == [chunk.id for chunk, _ in second]
+    stats = reranker.get_stats()
+    assert stats["hits"] == 4 and stats["misses"] == 4
+    assert stats["cached_scores"] == 4
+
+
+def test_reranker_cache_is_bounded():
+    reranker = Reranker(time_budget_ms=0, cache_size=2)
+    reranker.rerank("What is machine learning?", candidates(), k=3)
+    
+    assert len(reranker.scores) == 2
+
+
+def test_reranker_time_budget():
+    reranker = Reranker(batch_size=1, time_budget_ms=1)
+    original = reranker.model.predict
+    reranker.model.predict = lambda pairs, **kwargs: time.sleep(0.01) or original(pairs, **kwargs)
+    try:
+        reranked = reranker.rerank("What is machine learning?", candidates(), k=4)
+    finally:
+        del reranker.model.predict
+    
+    assert len(reranked) == 4, "Unscored candidates should still be returned"
+    assert [chunk.id for chunk, _ in reranked[1:]] == ["chunk_0001", "chunk_0002", "chunk_0003"], \
+        "Candidates left unscored should keep their retrieval order"
+    assert reranker.get_stats()["truncated"] == 3
+
+
+def test_reranker_batch_matches_single():
+    reranker = Reranker(time_budget_ms=0)
+    queries = ["What is machine learning?", "What is the capital of France?"]
+    
+    batch = reranker.rerank_batch(queries, [candidates(), candidates()], k=1)
+    
+    assert [row[0][0].id for row in batch] == [Reranker(time_budget_ms=0).rerank(q, candidates(), k=1)[0][0].id
+                                              for q in queries]
+
+
+def test_create_reranker(monkeypatch):
+    monkeypatch.delenv("RERANK_MODEL", raising=False)
+    assert create_reranker() is None, "Reranking should be off by default"
+    
+    with pytest.raises(ValueError):
+        Reranker(candidates=0)
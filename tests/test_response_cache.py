@@ -0,0 +1,69 @@
+import pytest
+import threading
+from smartqa.response_cache import ResponseCache
+
+
+def test_response_cache_persists_across_instances(tmp_path):
+    path = tmp_path / "responses.db"
+    key = ResponseCache.make_key("llama2", "prompt", {"temperature": 0.3})
+    
+    cache = ResponseCache(str(path))
+    assert cache.get(key) is None
+    cache.put(key, "llama2", {"response": "An answer.", "eval_count": 12})
+    cache.close()
+    
+    reopened = ResponseCache(str(path))
+    assert reopened.get(key) == {"response": "An answer.", "eval_count": 12}, "Responses should survive a restart"
+    assert reopened.get_stats()["hits"] == 1
+    reopened.close()
+
+
+def test_response_cache_key_is_deterministic():
+    key = ResponseCache.make_key("llama2", "prompt", {"temperature": 0.3, "num_predict": 100})
+    
+    assert key == ResponseCache.make_key("llama2", "prompt", {"num_predict": 100, "temperature": 0.3}), "Option order should not matter"
+    assert key != ResponseCache.make_key("mistral", "prompt", {"temperature": 0.3, "num_predict": 100})
+    assert key != ResponseCache.make_key("llama2", "prompt ", {"temperature": 0.3, "num_predict": 100})
+    assert key != ResponseCache.make_key("llama2", "prompt", {"temperature": 0.7, "num_predict": 100})
+
+
+def test_response_cache_evicts_least_recently_read(tmp_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("smartqa.response_cache.time.time", lambda: now[0])
+    
+    cache = ResponseCache(str(tmp_path / "responses.db"), max_entries=2)
+    for key in ["a", "b"]:
+        now[0] += 1
+        cache.put(key, "llama2", {"response": key})
+    
+    now[0] += 1
+    cache.get("a")
+    now[0] += 1
+    cache.put("c", "llama2", {"response": "c"})
+    
+    assert len(cache) == 2
+    assert cache.get("b") is None, "Least recently read response should be evicted"
+    assert cache.get("a") is not None and cache.get("c") is not None
+    cache.close()
+
+
+def test_response_cache_concurrent_writes(tmp_path):
+    cache = ResponseCache(str(tmp_path / "responses.db"))
+    
+    def write(worker):
+        for i in range(20):
+            cache.put(f"{worker}-{i}", "llama2", {"response": str(i)})
+    
+    threads = [threading.Thread(target=write, args=(worker,)) for worker in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    
+    assert len(cache) == 80
+    cache.close()
+
+
+def test_response_cache_invalid_size(tmp_path):
+    with pytest.raises(ValueError):
+        ResponseCache(str(tmp_path / "responses.db"), max_entries=0)
@@ -1,7 +1,12 @@
 import pytest
+import io
+import json
+import faiss
+import numpy as np
 from smartqa.chunker import TextChunker, Chunk
 from smartqa.embedder import Embedder
-from smartqa.retriever import Retriever
+from smartqa.retriever import Retriever, index_recall_report
+from smartqa.embedding_cache import EmbeddingCache
 
 
 def load_example_text():
@@ -176,4 +181,284 @@ def test_retriever_add_chunks():
     retriever.add_chunks(chunks)
     
     assert len(retriever.chunks) == len(chunks), "Should add all chunks"
-    assert retriever.index is not None, "Should create index when adding chunks" 
\ No newline at end of file
+    assert retriever.index is not None, "Should create index when adding chunks" 
+
+def test_retriever_save_and_load(tmp_path):
+    chunker = TextChunker()
+    chunks = chunker.create_chunks(load_example_text())
+    
+    embedder = Embedder()
+    retriever = Retriever(embedder)
+    retriever.add_chunks(chunks)
+    retriever.save(str(tmp_path), {"chunker": chunker.get_config()})
+    
+    assert Retriever.index_exists(str(tmp_path)), "Saved index should be detected"
+    assert Retriever.load_metadata(str(tmp_path))["chunker"] == chunker.get_config()
+    
+    loaded = Retriever.load(str(tmp_path), embedder)
+    
+    assert [c.id for c in loaded.chunks] == [c.id for c in retriever.chunks], "Chunks should round-trip"
+    assert loaded.index.ntotal == retriever.index.ntotal, "Index should hold the same vectors"
+    
+    original = retriever.search("machine learning", k=2)
+    restored = loaded.search("machine learning", k=2)
+    assert [c.id for c, _ in original] == [c.id for c, _ in restored], "Loaded index should return the same results"
+
+
+def test_retriever_uses_embedding_cache(tmp_path):
+    chunks = TextChunker().create_chunks(load_example_text())
+    embedder = Embedder()
+    cache = EmbeddingCache(str(tmp_path), embedder.model_name, embedder.dimension)
+    
+    Retriever(embedder, cache).add_chunks(chunks)
+    assert cache.get_stats()["misses"] == len(chunks), "First ingest should embed every chunk"
+    
+    retriever = Retriever(embedder, cache)
+    retriever.add_chunks(chunks)
+    assert cache.get_stats()["hits"] == len(chunks), "Re-ingesting the same text should be served from cache"
+    
+    results = retriever.search("machine learning", k=1)
+    assert len(results) == 1
+
+
+def test_retriever_add_chunks_stream():
+    chunker = TextChunker(chunk_size=200, chunk_overlap=20)
+    text = "\n\n".join(f"Paragraph {i} is about machine learning and data." for i in range(50))
+    
+    embedder = Embedder()
+    retriever = Retriever(embedder)
+    total = retriever.add_chunks_stream(chunker.iter_chunks(iter(text.splitlines(keepends=True))), batch_size=8)
+    
+    assert total == len(chunker.create_chunks(text)), "Every chunk should be indexed"
+    assert retriever.index.ntotal == total, "Index should grow batch by batch"
+    assert len(retriever.search("machine learning", k=3)) == 3
+
+
+@pytest.mark.parametrize("index_type", ["flat", "ivf", "hnsw", "ivfpq", "auto"])
+def test_retriever_index_types(index_type, monkeypatch):
+    text = "\n\n".join(f"Paragraph {i} covers topic {i % 7} in machine learning." for i in range(300))
+    chunks = TextChunker().create_chunks(text)
+    
+    embedder = Embedder()
+    retriever = Retriever(embedder, index_type=index_type, train_size=100)
+    retriever.add_chunks_stream(chunks, batch_size=64)
+    results = retriever.search("topic 3 in machine learning", k=5)
+    
+    assert retriever.index.ntotal == len(chunks), "All vectors should be indexed once built"
+    assert len(results) == 5, "Approximate indexes should still return k results"
+    assert all(isinstance(chunk, Chunk) for chunk, _ in results)
+    
+    if index_type == "auto":
+        assert isinstance(faiss.downcast_index(retriever.index.index), faiss.IndexFlatIP), "Small corpora stay exact"
+        
+        # Only a train_size sample is held back; past it "auto" builds and is upgraded as the corpus grows
+        for flat_limit, hnsw_limit, expected, early_search in [(100, 1000, faiss.IndexHNSW, False),
+                                                               (100, 200, faiss.IndexIVFPQ, False),
+                                                               (100, 200, faiss.IndexIVFPQ, True)]:
+            monkeypatch.setattr("smartqa.retriever.AUTO_FLAT_LIMIT", flat_limit)
+            monkeypatch.setattr("smartqa.retriever.AUTO_HNSW_LIMIT", hnsw_limit)
+            retriever = Retriever(embedder, index_type=index_type, train_size=100)
+            batches = iter(chunks[start:start + 64] for start in range(0, len(chunks), 64))
+            retriever.add_chunks(next(batches))
+            if early_search:
+                # Searched before the sample filled up, so built as a flat index from 64 vectors
+                retriever.search("topic 3", k=1)
+                assert faiss.try_extract_index_ivf(retriever.index) is None and not retriever._is_hnsw()
+            for batch in batches:
+                retriever.add_chunks(batch)
+                assert sum(len(ids) for ids, _ in retriever.pending) < 100, "At most a training sample is held back"
+            
+            index = faiss.downcast_index(retriever.index)
+            if isinstance(index, faiss.IndexIDMap2):
+                index = faiss.downcast_index(index.index)
+            assert isinstance(index, expected)
+            assert retriever.index.ntotal == len(chunks)
+            assert retriever.search(chunks[250].text, k=1)[0][0].id == chunks[250].id
+
+
+def test_retriever_rejects_unknown_index_type():
+    with pytest.raises(ValueError):
+        Retriever(Embedder(), index_type="annoy")
+
+
+def test_index_recall_report():
+    rng = np.random.default_rng(0)
+    embeddings = rng.standard_normal((2000, 32)).astype(np.float32)
+    queries = embeddings[:50]
+    
+    report = index_recall_report(embeddings, queries, k=5)
+    
+    assert [row["index_type"] for row in report] == ["flat", "ivf", "hnsw", "ivfpq"]
+    assert report[0]["recall_at_k"] == 1.0, "Flat index is the exact baseline"
+    for row in report:
+        assert 0.0 <= row["recall_at_k"] <= 1.0
+        assert row["avg_query_ms"] >= 0
+
+
+def test_retriever_search_batch_matches_search():
+    chunks = TextChunker().create_chunks(load_example_text())
+    
+    embedder = Embedder()
+    retriever = Retriever(embedder)
+    retriever.add_chunks(chunks)
+    
+    queries = ["machine learning", "neural networks", "computer science"]
+    batch_results = retriever.search_batch(queries, k=2)
+    
+    assert len(batch_results) == len(queries), "Should return one result list per query"
+    for query, results in zip(queries, batch_results):
+        single = retriever.search(query, k=2)
+        assert [c.id for c, _ in results] == [c.id for c, _ in single], f"Batch results differ for '{query}'"
+        for (_, batch_score), (_, single_score) in zip(results, single):
+            assert abs(batch_score - single_score) < 1e-4
+
+
+def test_retriever_search_batch_empty():
+    retriever = Retriever(Embedder())
+    
+    assert retriever.search_batch([], k=3) == []
+    assert retriever.search_batch(["anything"], k=3) == [[]], "Empty index should return an empty list per query"
+
+
+def test_retriever_scores_are_cosine_similarities():
+    chunks = TextChunker().create_chunks(load_example_text())
+    
+    embedder = Embedder()
+    retriever = Retriever(embedder)
+    retriever.add_chunks(chunks)
+    
+    for chunk, score in retriever.search("machine learning", k=3):
+        expected = float(embedder.encode_single(chunk.text)[0] @ embedder.encode_single("machine learning")[0])
+        assert -1.0 <= score <= 1.0, "Cosine similarity should be within [-1, 1]"
+        assert abs(score - expected) < 1e-4, "Score should equal the cosine similarity"
+
+
+def test_retriever_min_score_threshold():
+    chunks = TextChunker().create_chunks(load_example_text())
+    
+    embedder = Embedder()
+    retriever = Retriever(embedder)
+    retriever.add_chunks(chunks)
+    
+    all_results = retriever.search("machine learning", k=3)
+    cutoff = all_results[0][1]
+    
+    filtered = retriever.search("machine learning", k=3, min_score=cutoff)
+    assert len(filtered) >= 1, "Best match should survive a cutoff equal to its score"
+    assert all(score >= cutoff for _, score in filtered)
+    
+    strict = Retriever(embedder, min_score=1.01)
+    strict.add_chunks(chunks)
+    assert strict.search("machine learning", k=3) == [], "Nothing should pass an impossible threshold"
+
+
+def test_retriever_fingerprint(tmp_path):
+    chunks = TextChunker().create_chunks(load_example_text())
+    embedder = Embedder()
+    retriever = Retriever(embedder)
+    retriever.add_chunks(chunks[:2])
+    partial = retriever.fingerprint
+    
+    retriever.add_chunks(chunks[2:])
+    assert retriever.fingerprint != partial, "Adding chunks should change the fingerprint"
+    
+    retriever.save(str(tmp_path))
+    loaded = Retriever.load(str(tmp_path), embedder)
+    assert loaded.fingerprint == retriever.fingerprint, "Fingerprint should survive save and load"
+
+
+@pytest.mark.parametrize("index_type", ["flat", "ivf", "hnsw", "ivfpq"])
+def test_retriever_update_chunks(index_type):
+    paragraphs = [f"Paragraph {i} covers topic {i % 7} in machine learning." for i in range(200)]
+    chunker = TextChunker()
+    embedder = Embedder()
+    retriever = Retriever(embedder, index_type=index_type, train_size=100)
+    retriever.add_chunks(chunker.create_chunks("\n\n".join(paragraphs)))
+    retriever.build_index()
+    
+    paragraphs[10] = "Paragraph ten now explains reinforcement learning with rewards."
+    del paragraphs[50]
+    encoded = []
+    original = embedder.encode_texts
+    embedder.encode_texts = lambda texts: encoded.extend(texts) or original(texts)
+    try:
+        stats = retriever.update_chunks(chunker.iter_chunks(io.StringIO("\n\n".join(paragraphs))))
+    finally:
+        del embedder.encode_texts
+    
+    assert stats == {"added": 1, "removed": 2, "unchanged": 198}, "Only the changed paragraph should be new"
+    assert encoded == [paragraphs[10]], "Only new chunks should be embedded"
+    assert [chunk.text for chunk in retriever.chunks] == paragraphs, "Chunks should follow the new document"
+    assert [chunk.id for chunk in retriever.chunks][:3] == ["chunk_0000", "chunk_0001", "chunk_0002"]
+    
+    results = retriever.search("reinforcement learning with rewards", k=3)
+    assert results[0][0].text == paragraphs[10], "Updated text should be searchable"
+    found = {chunk.text for row in retriever.search_batch(paragraphs[49:52], k=200) for chunk, _ in row}
+    assert "Paragraph 50 covers topic 1 in machine learning." not in found, "Removed chunks should not be returned"
+
+
+def test_retriever_remove_chunks_and_save(tmp_path):
+    chunks = TextChunker().create_chunks(load_example_text())
+    embedder = Embedder()
+    retriever = Retriever(embedder, index_type="hnsw")
+    retriever.add_chunks(chunks)
+    
+    assert retriever.remove_chunks([chunks[1].id]) == 1
+    assert [chunk.id for chunk in retriever.chunks] == [chunks[0].id, chunks[2].id]
+    assert all(chunk.id != chunks[1].id for chunk, _ in retriever.search(chunks[1].text, k=3))
+    
+    retriever.save(str(tmp_path))
+    loaded = Retriever.load(str(tmp_path), embedder)
+    assert loaded.index.ntotal == 2, "Removed vectors should not be saved"
+    assert loaded.search(chunks[2].text, k=1)[0][0].id == chunks[2].id
+    
+    loaded.add_chunks([Chunk("chunk_0003", "Robotics combines hardware and software.")])
+    assert loaded.search("Robotics combines hardware and software.", k=1)[0][0].id == "chunk_0003"
+
+
+def test_retriever_loads_index_without_vector_ids(tmp_path):
+    chunks = TextChunker().create_chunks(load_example_text())
+    embedder = Embedder()
+    retriever = Retriever(embedder)
+    retriever.add_chunks(chunks)
+    retriever.save(str(tmp_path))
+    
+    # Layout written before vector ids existed: a bare flat index and plain chunk rows
+    legacy = faiss.IndexFlatIP(embedder.dimension)
+    legacy.add(embedder.encode_texts([chunk.text for chunk in chunks]))
+    faiss.write_index(legacy, str(tmp_path / "index.faiss"))
+    with open(tmp_path / "chunks.jsonl", "w", encoding="utf-8") as f:
+        for chunk in chunks:
+            f.write(json.dumps(chunk.to_dict()) + "\n")
+    
+    loaded = Retriever.load(str(tmp_path), embedder)
+    assert loaded.search(chunks[1].text, k=1)[0][0].id == chunks[1].id
+    assert loaded.remove_chunks([chunks[0].id]) == 1
+    assert loaded.index.ntotal == len(chunks) - 1
+
+
+@pytest.mark.parametrize("fusion", ["rrf", "weighted"])
+def test_retriever_hybrid_search_finds_identifiers(fusion, tmp_path):
+    paragraphs = [f"Error code ERR_{400 + i} means request {i} failed on the server." for i in range(50)]
+    chunks = TextChunker().create_chunks("\n\n".join(paragraphs))
+    embedder = Embedder()
+    retriever = Retriever(embedder, fusion=fusion)
+    retriever.add_chunks(chunks)
+    
+    results = retriever.search("What does ERR_417 mean?", k=3)
+    assert results[0][0].text == paragraphs[17], "Keyword matches should lift exact identifiers"
+    assert [len(row) for row in retriever.search_batch(["ERR_417", "ERR_420"], k=3)] == [3, 3]
+    
+    retriever.remove_chunks([results[0][0].id])
+    assert all(chunk.text != paragraphs[17] for chunk, _ in retriever.search("ERR_417", k=3))
+    
+    retriever.save(str(tmp_path))
+    loaded = Retriever.load(str(tmp_path), embedder, fusion=fusion)
+    assert loaded.search("ERR_433", k=1)[0][0].text == paragraphs[33], "Keyword index should be rebuilt on load"
+
+
+def test_retriever_rejects_unknown_fusion():
+    with pytest.raises(ValueError):
+        Retriever(Embedder(), fusion="max")
+    with pytest.raises(ValueError):
+        Retriever(Embedder(), fusion="weighted", lexical_weight=1.5)
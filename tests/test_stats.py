@@ -0,0 +1,67 @@
+import pytest
+import numpy as np
+from smartqa.stats import LatencySketch, StatsAggregate
+
+
+def test_latency_sketch_quantiles_within_accuracy():
+    values = np.random.default_rng(0).lognormal(mean=6, sigma=1, size=10_000)
+    sketch = LatencySketch(relative_accuracy=0.01)
+    for value in values:
+        sketch.add(float(value))
+    
+    for q in (0.5, 0.95, 0.99):
+        exact = float(np.quantile(values, q, method="lower"))
+        assert abs(sketch.quantile(q) - exact) <= 0.011 * exact, f"p{int(q * 100)} should be within 1%"
+    assert len(sketch.buckets) < 1000, "The sketch should stay small"
+
+
+def test_latency_sketch_edge_cases():
+    sketch = LatencySketch()
+    assert sketch.quantile(0.5) is None
+    
+    sketch.add(0)
+    sketch.add(0)
+    sketch.add(100)
+    assert sketch.quantile(0.5) == 0.0
+    assert sketch.quantile(1.0) == pytest.approx(100, rel=0.01)
+    
+    with pytest.raises(ValueError):
+        LatencySketch(relative_accuracy=0)
+
+
+def test_stats_aggregate_round_trip():
+    aggregate = StatsAggregate()
+    aggregate.add({"tokens_used": 10, "latency_ms": 500, "cost_usd": 0.01})
+    aggregate.add({"tokens_used": 20, "latency_ms": 1500, "ttft_ms": 200, "cache_hit": True})
+    aggregate.add({"tokens_used": 0, "latency_ms": 2, "cache_hit": False})
+    
+    restored = StatsAggregate.from_dict(aggregate.to_dict())
+    
+    assert restored.summary() == aggregate.summary()
+    summary = aggregate.summary()
+    assert summary["total_interactions"] == 3 and summary["total_tokens"] == 30
+    assert summary["avg_ttft_ms"] == 200.0
+    assert summary["answer_cache_hit_rate"] == 0.5
+    assert summary["latency_p50_ms"] == pytest.approx(500, rel=0.01)
+
+
+def test_stats_aggregate_stage_latency():
+    aggregate = StatsAggregate()
+    for i in range(100):
+        aggregate.add({"tokens_used": 1, "latency_ms": 100 + i,
+                       "spans": {"http": 80.0 + i, "encode_query": 5.0, "custom": 1.0}})
+    aggregate.add({"tokens_used": 1, "latency_ms": 50})
+    
+    stages = aggregate.summary()["stage_latency_ms"]
+    assert list(stages) == ["encode_query", "http", "custom"], "Stages should follow the pipeline order"
+    assert stages["http"]["count"] == 100, "Entries without spans should not count towards a stage"
+    assert stages["http"]["p50"] == pytest.approx(129, rel=0.01)
+    assert stages["http"]["p99"] == pytest.approx(178, rel=0.01)
+    assert stages["encode_query"]["p95"] == pytest.approx(5, rel=0.01)
+    
+    assert StatsAggregate.from_dict(aggregate.to_dict()).summary() == aggregate.summary()
+    
+    # Checkpoints from before stage tracing still load
+    data = aggregate.to_dict()
+    del data["stages"]
+    assert StatsAggregate.from_dict(data).summary()["stage_latency_ms"] == {}
@@ -0,0 +1,56 @@
+import threading
+from smartqa import tracing
+
+
+def test_spans_accumulate_in_trace():
+    with tracing.start_trace() as trace:
+        with tracing.span("encode_query"):
+            pass
+        with tracing.span("encode_query"):
+            pass
+        tracing.record("ollama_eval", 12.5)
+        tracing.record("ollama_eval", 2.5)
+    
+    spans = trace.snapshot()
+    assert set(spans) == {"encode_query", "ollama_eval"}
+    assert spans["ollama_eval"] == 15.0, "A stage entered twice should add up"
+    assert tracing.current_trace() is None, "The trace should end with its block"
+
+
+def test_spans_without_trace_are_noops():
+    with tracing.span("http"):
+        pass
+    tracing.record("http", 5)
+    
+    assert tracing.current_trace() is None
+
+
+def test_ensure_trace_joins_outer_trace():
+    with tracing.start_trace() as outer:
+        with tracing.ensure_trace() as inner:
+            tracing.record("rerank", 3)
+    
+    assert inner is outer, "An inner call should report into the caller's trace"
+    assert outer.snapshot() == {"rerank": 3}
+    
+    with tracing.ensure_trace() as trace:
+        tracing.record("rerank", 1)
+    assert trace.snapshot() == {"rerank": 1}, "Without a caller's trace a new one should be started"
+
+
+def test_traced_gives_each_call_its_own_trace():
+    traces = []
+    
+    @tracing.traced
+    def handle(ms):
+        tracing.record("http", ms)
+        traces.append(tracing.current_trace())
+    
+    threads = [threading.Thread(target=handle, args=(ms,)) for ms in (1, 2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    handle(3)
+    
+    assert sorted(trace.snapshot()["http"] for trace in traces) == [1, 2, 3]
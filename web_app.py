@@ -1,12 +1,19 @@
 import streamlit as st
+import hashlib
 import tempfile
 import os
 from pathlib import Path
+from smartqa import tracing
 from smartqa.chunker import TextChunker
 from smartqa.embedder import Embedder
+from smartqa.answer_cache import create_answer_cache
+from smartqa.embedding_cache import create_embedding_cache
+from smartqa.history import create_history_store
 from smartqa.retriever import Retriever
 from smartqa.llm import LLMResponseGenerator
-from smartqa.logger import QALogger
+from smartqa.logger import create_logger
+from smartqa.reranker import create_reranker
+from smartqa.response_cache import create_response_cache
 
 
 def setup_page():
@@ -36,43 +43,77 @@ def upload_document():
             tmp_file_path = tmp_file.name
         
         st.success(f"✅ Document uploaded: {uploaded_file.name}")
-        return tmp_file_path, uploaded_file.name
+        return tmp_file_path, uploaded_file.name, hashlib.sha256(uploaded_file.getvalue()).hexdigest()
     
-    return None, None
+    return None, None, None
 
 
-def process_document(file_path, file_name):
+@st.cache_resource(show_spinner=False)
+def get_embedder():
+    # Loaded and warmed once per server process, shared by every session and rerun
+    embedder = Embedder()
+    embedder.warm_up()
+    return embedder
+
+
+@st.cache_resource(show_spinner=False)
+def get_llm():
+    # Shared so every question reuses the pooled Ollama connections and the answer cache
+    return LLMResponseGenerator(logger=create_logger(), answer_cache=create_answer_cache(),
+                                response_cache=create_response_cache())
+
+
+@st.cache_resource(show_spinner=False)
+def get_history():
+    # SQLite index over the interaction log, shared across reruns
+    return create_history_store()
+
+
+@st.cache_resource(show_spinner=False)
+def get_reranker():
+    # None unless $RERANK_MODEL is set
+    return create_reranker()
+
+
+@st.cache_resource(show_spinner=False, max_entries=8)
+def build_retriever(file_digest, _file_path):
+    # Keyed by content so reruns and re-uploads of the same document skip re-embedding;
+    # the ingestion stage timings are kept with it
+    chunker = TextChunker()
+    embedder = get_embedder()
+    retriever = Retriever(embedder, create_embedding_cache(embedder))
+    with tracing.start_trace() as trace, open(_file_path, 'r', encoding='utf-8') as f:
+        retriever.add_chunks_stream(chunker.iter_chunks(f))
+    return retriever, trace.snapshot()
+
+
+def process_document(file_path, file_name, file_digest):
     with st.spinner("🔧 Processing document..."):
-        with open(file_path, 'r', encoding='utf-8') as f:
-            text = f.read()
-        
-        with st.spinner("📄 Creating chunks..."):
-            chunker = TextChunker()
-            chunks = chunker.create_chunks(text)
-        
-        with st.spinner("🧠 Creating embeddings..."):
-            embedder = Embedder()
-            retriever = Retriever(embedder)
-            retriever.add_chunks(chunks)
+        with st.spinner("🧠 Creating chunks and embeddings..."):
+            retriever, spans = build_retriever(file_digest, file_path)
         
+        chunks = retriever.chunks
         st.success(f"✅ Document processed! Created {len(chunks)} chunks")
+        if spans:
+            with st.expander("🧭 Ingestion Stage Timings"):
+                st.dataframe([{"stage": stage, "ms": ms} for stage, ms in spans.items()], use_container_width=True)
         
-        return retriever, text, chunks
+        return retriever, os.path.getsize(file_path), chunks
 
 
-def display_document_info(text, chunks):
+def display_document_info(file_size, chunks):
     st.subheader("📊 Document Information")
     
     col1, col2, col3 = st.columns(3)
     
     with col1:
-        st.metric("Characters", len(text))
+        st.metric("File Size", f"{file_size:,} bytes")
     
     with col2:
         st.metric("Chunks", len(chunks))
     
     with col3:
-        avg_chunk_size = len(text) // len(chunks) if chunks else 0
+        avg_chunk_size = sum(len(chunk.text) for chunk in chunks) // len(chunks) if chunks else 0
         st.metric("Avg Chunk Size", f"{avg_chunk_size} chars")
     
     with st.expander("🔍 View Document Chunks"):
@@ -82,6 +123,7 @@ def display_document_info(text, chunks):
             st.divider()
 
 
+@tracing.traced
 def ask_question(retriever, file_name):
     st.header("❓ Ask Questions")
     
@@ -93,25 +135,39 @@ def ask_question(retriever, file_name):
     if st.button("🤖 Ask", type="primary"):
         if question:
             with st.spinner("🔍 Searching for relevant information..."):
-                search_results = retriever.search(question, k=3)
+                query_embedding = retriever.embed_queries([question])
+                reranker = get_reranker()
+                k = max(3, reranker.candidates) if reranker else 3
+                search_results = retriever.search_vectors(query_embedding, k=k, queries=[question])[0]
+                if reranker and search_results:
+                    search_results = reranker.rerank(question, search_results, 3)
                 
                 if not search_results:
                     st.error("❌ No relevant information found")
                     return
                 
-                with st.spinner("🤖 Generating answer..."):
-                    llm = LLMResponseGenerator()
-                    response = llm.generate_response(question, search_results, file_name)
-                
                 st.subheader("📝 Answer")
-                st.write(response["answer"])
+                placeholder = st.empty()
+                streamed = []
                 
-                col1, col2, col3 = st.columns(3)
+                def on_token(token):
+                    streamed.append(token)
+                    placeholder.markdown("".join(streamed) + "▌")
+                
+                llm = get_llm()
+                response = llm.generate_response(question, search_results, file_name, on_token, retriever.fingerprint,
+                                                 query_embedding[0])
+                placeholder.write(response["answer"])
+                
+                col1, col2, col3, col4 = st.columns(4)
                 with col1:
                     st.metric("Tokens Used", response["tokens_used"])
                 with col2:
-                    st.metric("Response Time", f"{response.get('latency_ms', 0):.0f}ms")
+                    ttft_ms = response.get("ttft_ms")
+                    st.metric("First Token", f"{ttft_ms:.0f}ms" if ttft_ms is not None else "n/a")
                 with col3:
+                    st.metric("Response Time", f"{response.get('latency_ms', 0):.0f}ms")
+                with col4:
                     st.metric("Citations", len(response["citations"]))
                 
                 if response["citations"]:
@@ -122,6 +178,11 @@ def ask_question(retriever, file_name):
                             st.markdown(f"**Relevance Score:** {citation['relevance_score']:.3f}")
                             st.markdown("**Text:**")
                             st.text(citation['text'])
+                
+                if response.get("spans"):
+                    with st.expander("🧭 Stage Timings"):
+                        st.dataframe([{"stage": stage, "ms": ms} for stage, ms in response["spans"].items()],
+                                     use_container_width=True)
         else:
             st.warning("⚠️ Please enter a question")
 
@@ -129,7 +190,8 @@ def ask_question(retriever, file_name):
 def show_statistics():
     st.header("📊 System Statistics")
     
-    logger = QALogger()
+    # The shared generator's logger, so answers still in its write buffer are counted
+    logger = get_llm().logger
     stats = logger.get_stats()
     
     col1, col2, col3, col4 = st.columns(4)
@@ -147,37 +209,51 @@ def show_statistics():
         st.metric("Avg Latency", f"{stats['avg_latency_ms']:.0f}ms")
     
     if stats["total_interactions"] > 0:
-        st.subheader("🕒 Recent Interactions")
-        
+        history = get_history()
         try:
-            with open(logger.log_file, 'r', encoding='utf-8') as f:
-                lines = f.readlines()
-                recent_entries = lines[-5:][::-1]
-            
-            for line in recent_entries:
-                if line.strip():
-                    import json
-                    entry = json.loads(line)
-                    
-                    with st.expander(f"Q: {entry['query'][:50]}..."):
-                        st.markdown(f"**Question:** {entry['query']}")
-                        st.markdown(f"**Answer:** {entry['answer']}")
-                        st.markdown(f"**Tokens:** {entry['tokens_used']} | **Time:** {entry['latency_ms']:.0f}ms")
-                        st.markdown(f"**File:** {entry['input_file']} | **Model:** {entry['model_name']}")
-                        st.markdown(f"**Date:** {entry['timestamp']}")
+            # Only what was logged since the last rerun is imported
+            history.import_log(logger)
+            recent_entries = history.recent(5)
+            by_model = history.aggregate("model")
         except Exception as e:
-            st.error(f"Error reading log file: {e}")
+            st.error(f"Error reading history: {e}")
+            return
+        
+        st.subheader("🕒 Recent Interactions")
+        for entry in recent_entries:
+            with st.expander(f"Q: {entry['query'][:50]}..."):
+                st.markdown(f"**Question:** {entry['query']}")
+                st.markdown(f"**Answer:** {entry['answer']}")
+                st.markdown(f"**Tokens:** {entry['tokens_used']} | **Time:** {entry['latency_ms']:.0f}ms")
+                st.markdown(f"**File:** {entry['input_file']} | **Model:** {entry['model_name']}")
+                st.markdown(f"**Date:** {entry['timestamp']}")
+        
+        st.subheader("🧠 By Model")
+        st.dataframe(by_model, use_container_width=True)
+
+        if stats.get("latency_p50_ms") is not None:
+            st.subheader("⏱️ Latency Breakdown")
+            st.markdown(f"**End to end p50 / p95 / p99:** {stats['latency_p50_ms']:.0f}ms / "
+                        f"{stats['latency_p95_ms']:.0f}ms / {stats['latency_p99_ms']:.0f}ms")
+            if stats.get("stage_latency_ms"):
+                st.dataframe(
+                    [{"stage": stage, "calls": timing["count"], "p50 ms": timing["p50"], "p95 ms": timing["p95"],
+                      "p99 ms": timing["p99"]} for stage, timing in stats["stage_latency_ms"].items()],
+                    use_container_width=True
+                )
 
 
 def main():
     setup_page()
     
-    file_path, file_name = upload_document()
+    get_embedder()
+    
+    file_path, file_name, file_digest = upload_document()
     
     if file_path:
-        retriever, text, chunks = process_document(file_path, file_name)
+        retriever, file_size, chunks = process_document(file_path, file_name, file_digest)
         
-        display_document_info(text, chunks)
+        display_document_info(file_size, chunks)
         
         ask_question(retriever, file_name)
         